@@ -0,0 +1,423 @@
+"""
+길드 매니저 성능 측정 스크립트
+
+사용법:
+    python bench_guild.py imports     # 로그인 화면까지의 import 시간 예산 확인
+    python bench_guild.py grid        # 일일 기록 표 만들기/변경 비교/바뀐 칸 저장 시간 (멤버 수별)
+    python bench_guild.py suite       # 가상 길드를 만들어 주요 경로 전체 측정 (로컬 저장소 / Firestore 에뮬레이터)
+
+suite 결과는 --save 로 JSON에 저장하고, 다음 실행에서 --compare 로 비교할 수 있습니다.
+    python bench_guild.py suite --backend sqlite --save before.json
+    python bench_guild.py suite --backend sqlite --compare before.json
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python bench_guild.py suite --backend emulator
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(BASE_DIR, "game_guild.py")
+
+# OCR 측정에 쓰는 저장소 동봉 스크린샷
+SCREENSHOTS = [os.path.join(BASE_DIR, "test용 사진.png"), os.path.join(BASE_DIR, "test용 사진(편집본).png")]
+
+# 로그인 화면(game_guild.py 최상단 import)이 넘으면 안 되는 시간 예산 (초)
+IMPORT_BUDGET_SEC = 2.0
+
+# 로그인 화면에서는 불러오면 안 되는 무거운 라이브러리 (plotly 본체는 streamlit이 직접 불러옴)
+HEAVY_MODULES = ["easyocr", "torch", "cv2", "pandas", "plotly.express"]
+
+
+def top_level_imports(path=APP_FILE):
+    # game_guild.py 최상단(함수 밖)의 import 문만 뽑아내기
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def measure_imports(path=APP_FILE):
+    """
+    새 파이썬 프로세스에서 최상단 import만 실행해서 걸린 시간과 불러온 무거운 모듈을 측정
+    (이미 import된 모듈 캐시의 영향을 받지 않도록 매번 새 프로세스 사용)
+    """
+    code = "\n".join([
+        "import json, sys, time",
+        "_start = time.perf_counter()",
+        *top_level_imports(path),
+        "_elapsed = time.perf_counter() - _start",
+        f"_heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]",
+        "print(json.dumps({'seconds': _elapsed, 'heavy_modules': _heavy}))",
+    ])
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def bench_imports(args):
+    runs = [measure_imports() for _ in range(args.repeat)]
+    best = min(run["seconds"] for run in runs)
+    heavy = runs[0]["heavy_modules"]
+
+    print(f"{'항목':<24}{'값':>12}")
+    print(f"{'import 시간 (최소)':<24}{best:>11.3f}s")
+    print(f"{'예산':<24}{args.budget:>11.3f}s")
+    print(f"{'무거운 모듈':<24}{', '.join(heavy) or '-':>12}")
+
+    ok = best <= args.budget and not heavy
+    print("✅ 예산 통과" if ok else "❌ 예산 초과")
+    return 0 if ok else 1
+
+
+def make_roster(n_members, seed=0):
+    # 가상의 길드원 명단 (연합/통합 길드처럼 수백 명도 가능)
+    import pandas as pd
+    rng = random.Random(seed)
+    roles = ["길드장"] + ["부길드장"] * 3 + ["정예"] * 4
+    rows = []
+    for i in range(n_members):
+        rows.append({
+            "id": f"mem{i:05d}",
+            "name": f"길드원{i:05d}",
+            "cp": round(rng.uniform(1, 500), 1),
+            "role": roles[i] if i < len(roles) else "일반",
+        })
+    return pd.DataFrame(rows)
+
+
+def make_daily_record(roster, fill_ratio=0.8, seed=0):
+    # 명단 중 일부(fill_ratio)만 기록이 있는 하루치 daily_records 문서
+    rng = random.Random(seed)
+    record = {}
+    for mem_id in roster["id"]:
+        if rng.random() > fill_ratio:
+            continue
+        record[mem_id] = {
+            "don_basic": rng.randint(0, 10), "don_inter": rng.randint(0, 5),
+            "don_adv": rng.randint(0, 5), "don_item": rng.randint(0, 10),
+            "sage_dmg": round(rng.uniform(0, 80), 1), "sage_kill": rng.randint(0, 20),
+        }
+    return record
+
+
+def make_donation_scan(roster, scan_ratio=0.5, seed=0):
+    # 기부 스캔 결과 {닉네임: {'basic', 'inter', 'adv', 'item'}}
+    rng = random.Random(seed)
+    names = list(roster["name"])
+    return {
+        name: {"basic": rng.randint(0, 4), "inter": rng.randint(0, 2), "adv": rng.randint(0, 2), "item": 0}
+        for name in rng.sample(names, int(len(names) * scan_ratio))
+    }
+
+
+def time_call(func, *args, repeat=5, setup=None):
+    # 가장 빠른 실행 시간 (초)
+    return min(time_runs(func, *args, repeat=repeat, setup=setup))
+
+
+def time_runs(func, *args, repeat=5, setup=None):
+    # 매 실행 시간 목록 (초), setup은 실행마다 시간을 재기 전에 부름 (저장한 값 되돌리기 등)
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func(*args)
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+# --- suite: 가상 길드 생성 + 주요 경로 측정 ---
+def open_store(args, work_dir):
+    from guild_store import FirestoreStore, MemoryStore, SQLiteStore
+    if args.backend == "memory":
+        return MemoryStore()
+    if args.backend == "sqlite":
+        return SQLiteStore(args.db or os.path.join(work_dir, "bench.db"))
+    # Firestore 에뮬레이터 (실제 프로젝트에 쓰지 않도록 에뮬레이터 주소가 있어야만 실행)
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST 를 먼저 지정하세요. (예: localhost:8080)")
+    from google.cloud import firestore as gcloud_firestore
+    return FirestoreStore(gcloud_firestore.Client(project=args.project))
+
+
+def populate_guild(store, guild_id, n_members, days, today, seed=0):
+    """
+    저장소에 가상 길드 만들기: 길드 문서 + 명단(n_members명, 직책 정원 포함) + 최근 days일 기록(+집계)
+    + 최근 days일 동안 매일 길드원 10%의 전투력 수정 (전투력 기록)
+    반환: 저장된 명단 DataFrame
+    """
+    import pandas as pd
+    import game_guild
+
+    store.create_guild(guild_id, {"name": f"벤치 길드 {guild_id}", "password": "bench"})
+    fields = make_roster(n_members, seed)[["name", "cp", "role"]].to_dict("records")
+    # Firestore 트랜잭션 한 번에 500건까지라 나눠서 저장 (멤버 문서 + 전투력 기록 문서)
+    chunk = game_guild.ROSTER_IMPORT_CHUNK
+    first_day = datetime.combine(today - timedelta(days=days), datetime.min.time())
+    for start in range(0, len(fields), chunk):
+        store.write_members(guild_id, upserts=[(None, f) for f in fields[start:start + chunk]],
+                            role_limits=game_guild.ROLE_LIMITS, now=first_day)
+    roster = pd.DataFrame(store.list_members(guild_id)).sort_values("name", ignore_index=True)
+
+    rng = random.Random(seed)
+    cps = dict(zip(roster["id"], roster["cp"]))
+    for offset in range(days - 1, -1, -1):
+        picked = rng.sample(sorted(cps), max(n_members // 10, 1))
+        for mem_id in picked:
+            cps[mem_id] = round(cps[mem_id] + rng.uniform(0, 2), 1)
+        store.write_members(guild_id, upserts=[(mem_id, {"cp": cps[mem_id]}) for mem_id in picked],
+                            now=first_day + timedelta(days=days - offset, hours=12))
+    roster = pd.DataFrame(store.list_members(guild_id)).sort_values("name", ignore_index=True)
+
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        rollups = {
+            doc_id: {"period": period, "label": label, "start": start.strftime("%Y-%m-%d")}
+            for period, doc_id, label, start in game_guild.rollup_periods(day)
+        }
+        store.save_daily(guild_id, day.strftime("%Y-%m-%d"), make_daily_record(roster, seed=seed + offset), rollups)
+    return roster
+
+
+def ocr_rows(repeat):
+    """
+    동봉 스크린샷으로 run_ocr_scan (기부/현자 두 모드) 측정
+    OCR 결과 캐시를 매번 비워서 실제 인식 시간을 잽니다. 모델을 불러올 수 없으면 전처리만 측정.
+    """
+    import io
+    import game_guild
+    from ocr_worker import preprocess_for_ocr
+
+    os.environ.pop("GUILD_OCR_CACHE_DIR", None)
+    images = [(os.path.basename(p), open(p, "rb").read()) for p in SCREENSHOTS if os.path.exists(p)]
+    try:
+        game_guild.load_ocr_reader()
+        reader_error = None
+    except Exception as e:
+        reader_error = e
+
+    rows = []
+    for mode in ("donation", "sage"):
+        for name, image_bytes in images:
+            runs = time_runs(preprocess_for_ocr, image_bytes, mode, repeat=repeat)
+            rows.append((f"ocr.{mode}.전처리", name, runs))
+            if reader_error is not None:
+                continue
+
+            def scan():
+                game_guild.get_ocr_cache.clear()
+                return game_guild.run_ocr_scan(io.BytesIO(image_bytes), mode)
+            rows.append((f"ocr.{mode}.run_ocr_scan", name, time_runs(scan, repeat=repeat)))
+    if reader_error is not None:
+        print(f"⚠️ OCR 모델을 불러오지 못해 run_ocr_scan 은 건너뜀: {reader_error}")
+    return rows
+
+
+def bench_suite(args):
+    # 임시 SQLite 파일과 보관함은 측정이 끝나면(실패해도) 지움
+    with tempfile.TemporaryDirectory(prefix="guild_bench_") as work_dir:
+        return run_suite(args, work_dir)
+
+
+def run_suite(args, work_dir):
+    import game_guild
+    from guild_archive import GuildArchive
+
+    store = open_store(args, work_dir)
+    # 헬퍼 함수들이 앱 설정(GUILD_STORE) 대신 벤치용 저장소를 쓰도록 교체
+    game_guild.get_store = lambda: store
+    today = date.today()
+
+    rows = []
+    for n in args.members:
+        guild_id = f"bench_{n}_{int(time.time())}"
+        start = time.perf_counter()
+        roster = populate_guild(store, guild_id, n, args.days, today)
+        print(f"가상 길드 {guild_id}: 멤버 {n}명, {args.days}일 기록 생성 ({time.perf_counter() - start:.1f}s)")
+        size = f"{n}명"
+
+        # 캐시된 헬퍼는 매번 캐시를 비우고 저장소까지 가는 시간을 잽니다
+        def list_members():
+            game_guild.fetch_guild_members.clear(guild_id)
+            return game_guild.fetch_guild_members(guild_id)
+        rows.append(("get_guild_members", size, time_runs(list_members, repeat=args.repeat)))
+
+        date_str = today.strftime("%Y-%m-%d")
+        daily = store.get_daily(guild_id, date_str)
+        scanned = make_donation_scan(roster)
+        rows.append(("grid.build", size, time_runs(
+            game_guild.build_record_grid, roster, daily, scanned, "donation", repeat=args.repeat)))
+        grid = game_guild.build_record_grid(roster, daily, scanned, "donation")
+
+        # 바뀐 칸만 골라서 저장 (스캔 결과로 채운 칸만 쓰고, 불러온 값으로 충돌 체크)
+        rows.append(("grid.diff", size, time_runs(game_guild.diff_record_grid, daily, grid, repeat=args.repeat)))
+
+        _, base = game_guild.diff_record_grid(daily, grid)
+        restore = {mem_id: {f: v or 0 for f, v in fields.items()} for mem_id, fields in base.items()}
+
+        def save_dirty():
+            changes, base = game_guild.diff_record_grid(store.get_daily(guild_id, date_str), grid)
+            game_guild.save_daily_data(guild_id, date_str, changes, base=base)
+        # 두 번째 실행부터 바뀐 칸이 없어지지 않도록 매번 불러온 값으로 되돌린 뒤 측정
+        rows.append(("grid.save_dirty", size, time_runs(
+            save_dirty, repeat=args.repeat, setup=lambda: game_guild.save_daily_data(guild_id, date_str, restore))))
+
+        # 분석 그래프: 주간/월간 집계 문서 (슬라이더 최대 기간)
+        for period, count in (("week", 52), ("month", 12)):
+            def rollups():
+                game_guild.fetch_rollups.clear()
+                return game_guild.fetch_rollups(guild_id, period, count, today)
+            rows.append((f"fetch_rollups.{period}{count}", size, time_runs(rollups, repeat=args.repeat)))
+
+        # 기간 기록: 날짜 문서 ID 범위 조회 한 번 (기간 지정 분석의 짧은 기간)
+        for days in args.periods:
+            start_date = today - timedelta(days=days - 1)
+
+            def period_records():
+                game_guild.fetch_period_records.clear()
+                return game_guild.fetch_period_records(guild_id, start_date, today)
+            rows.append((f"fetch_period_records.{days}d", size, time_runs(period_records, repeat=args.repeat)))
+
+        # 기간 지정 분석(긴 기간): 한 번 동기화한 월별 Parquet 보관함에서 기간 조회
+        archive = GuildArchive(os.path.join(work_dir, "archive"))
+        archive.sync(store, guild_id, today, full=True)
+        for days in args.periods:
+            start_date = today - timedelta(days=days - 1)
+            rows.append((f"archive.query.{days}d", size, time_runs(
+                archive.query, guild_id, start_date, today, repeat=args.repeat)))
+
+        # 활동 점수: 저장된 상태 문서 하나로 오늘 기준 지표 계산 (기록 기간과 무관)
+        activity = store.get_activity(guild_id)
+        rows.append(("activity_table", size, time_runs(
+            game_guild.activity_table, roster, activity, today, repeat=args.repeat)))
+
+        # 전투력 성장 그래프: 변화량 문서 1개 + 지금 명단 합계로 기간별 합계 계산 (기록 기간과 무관)
+        for resolution, count, _ in game_guild.CP_GROWTH_RESOLUTIONS.values():
+            def cp_growth():
+                game_guild.fetch_cp_growth.clear()
+                return game_guild.cp_growth_frame(guild_id, roster, resolution, count, today)
+            rows.append((f"cp_growth.{resolution}", size, time_runs(cp_growth, repeat=args.repeat)))
+
+        def member_cp_history():
+            game_guild.fetch_member_cp_history.clear()
+            months = game_guild.recent_buckets('month', game_guild.CP_HISTORY_MONTHS, today)
+            return game_guild.fetch_member_cp_history(guild_id, roster["id"].iloc[0], months[0], months[-1], None)
+        rows.append(("cp_history.member", size, time_runs(member_cp_history, repeat=args.repeat)))
+
+        # 명단이 바뀌므로 마지막에 측정 (매번 새 '일반' 멤버 등록)
+        counter = iter(range(args.repeat))
+        rows.append(("add_update_member", size, time_runs(
+            lambda: game_guild.add_update_member(guild_id, f"신규{next(counter)}", 100, "일반"), repeat=args.repeat)))
+
+    # 길드 간 랭킹: 저장소의 모든 길드로 요약을 새로 집계하는 시간 (요약 문서 캐시 없이)
+    from guild_leaderboard import build_leaderboard
+    week_label = next(label for period, _, label, _ in game_guild.rollup_periods(today) if period == "week")
+    rows.append(("leaderboard.build", f"{len(store.list_guilds())}개 길드",
+                 time_runs(build_leaderboard, store, week_label, repeat=args.repeat)))
+
+    if not args.skip_ocr:
+        rows.extend(ocr_rows(args.repeat))
+
+    results = [
+        {"name": name, "size": size, "median_ms": statistics.median(runs) * 1000,
+         "min_ms": min(runs) * 1000, "runs": len(runs)}
+        for name, size, runs in rows
+    ]
+    print_results(results, load_results(args.compare) if args.compare else None)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"backend": args.backend, "created": datetime.now().isoformat(timespec="seconds"),
+                       "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"결과 저장: {args.save}")
+    return 0
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    return {(r["name"], r["size"]): r for r in saved["results"]}
+
+
+def print_results(results, previous=None):
+    header = f"{'항목':<34}{'크기':>20}{'중앙값(ms)':>12}{'최소(ms)':>12}"
+    if previous is not None:
+        header += f"{'이전(ms)':>12}{'변화':>10}"
+    print(header)
+    for r in results:
+        line = f"{r['name']:<34}{r['size']:>20}{r['median_ms']:>12.2f}{r['min_ms']:>12.2f}"
+        if previous is not None:
+            old = previous.get((r["name"], r["size"]))
+            if old:
+                line += f"{old['median_ms']:>12.2f}{r['median_ms'] / old['median_ms']:>9.2f}x"
+            else:
+                line += f"{'-':>12}{'-':>10}"
+        print(line)
+
+
+def bench_grid(args):
+    import game_guild
+    from guild_store import MemoryStore
+
+    date_str = date.today().strftime("%Y-%m-%d")
+    print(f"{'멤버 수':>8}{'표 만들기(ms)':>16}{'변경 비교(ms)':>16}{'칸 저장(ms)':>16}{'멤버당(us)':>14}")
+    for n in args.sizes:
+        roster = make_roster(n)
+        record = make_daily_record(roster)
+        scanned = make_donation_scan(roster)
+        build = time_call(game_guild.build_record_grid, roster, record, scanned, "donation", repeat=args.repeat)
+        grid = game_guild.build_record_grid(roster, record, scanned, "donation")
+        diff = time_call(game_guild.diff_record_grid, record, grid, repeat=args.repeat)
+
+        # 바뀐 칸만 메모리 저장소에 저장 (매번 불러온 값으로 되돌린 뒤 측정)
+        store = MemoryStore()
+        store.save_daily("bench", date_str, record, {})
+        changes, base = game_guild.diff_record_grid(record, grid)
+        restore = {mem_id: {f: v or 0 for f, v in fields.items()} for mem_id, fields in base.items()}
+        save = time_call(store.save_daily, "bench", date_str, changes, {}, base, repeat=args.repeat,
+                         setup=lambda: store.save_daily("bench", date_str, restore, {}))
+        per_member = (build + diff + save) / n * 1e6
+        print(f"{n:>8}{build * 1000:>16.2f}{diff * 1000:>16.2f}{save * 1000:>16.2f}{per_member:>14.1f}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="길드 매니저 성능 측정")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_imports = sub.add_parser("imports", help="로그인 화면 import 시간 예산 확인")
+    p_imports.add_argument("--budget", type=float, default=IMPORT_BUDGET_SEC)
+    p_imports.add_argument("--repeat", type=int, default=3)
+    p_imports.set_defaults(func=bench_imports)
+
+    p_grid = sub.add_parser("grid", help="일일 기록 표 만들기/변경 비교/바뀐 칸 저장 시간")
+    p_grid.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 300, 1000])
+    p_grid.add_argument("--repeat", type=int, default=5)
+    p_grid.set_defaults(func=bench_grid)
+
+    p_suite = sub.add_parser("suite", help="가상 길드를 만들어 주요 경로 전체 측정")
+    p_suite.add_argument("--backend", choices=["memory", "sqlite", "emulator"], default="sqlite")
+    p_suite.add_argument("--db", help="sqlite 파일 경로 (기본: 임시 폴더)")
+    p_suite.add_argument("--project", default="guild-bench", help="에뮬레이터 프로젝트 ID")
+    p_suite.add_argument("--members", type=int, nargs="+", default=[30, 300])
+    p_suite.add_argument("--days", type=int, default=365, help="생성할 일일 기록 일수")
+    p_suite.add_argument("--periods", type=int, nargs="+", default=[7, 30, 365], help="기간 기록/보관함 조회 기간 (일)")
+    p_suite.add_argument("--repeat", type=int, default=5)
+    p_suite.add_argument("--skip-ocr", action="store_true")
+    p_suite.add_argument("--save", help="결과를 JSON으로 저장")
+    p_suite.add_argument("--compare", help="이전 --save 결과와 비교")
+    p_suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,30 +1,49 @@
 import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
-import pandas as pd
-import plotly.express as px
 import json
+import os
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 import time
 from datetime import datetime, timedelta
-import easyocr
 import re
+from guild_store import (
+    FirestoreStore, MemoryStore, SQLiteStore, MemberNotFound, RoleQuotaExceeded, RECORD_FIELDS, apply_role_moves, to_native,
+)
+from guild_metrics import current_meter, logger as metrics_logger, metered, rerun_scope, timed, worker_scope
+from guild_archive import GuildArchive
+from guild_live import LiveHub
+from guild_leaderboard import LEADERBOARD_COLUMNS, is_stale, leaderboard_doc_id, refresh_leaderboard
+from guild_activity import ACTIVITY_HALF_LIFE_DAYS, build_activity, member_activity
+from guild_cp_history import downsample_points, growth_series, member_points, recent_buckets
+from ocr_worker import OCR_PRESETS, OcrPool, QueueFull, recognize_pages, usable_cpus
+
+# 무거운 라이브러리(pandas, easyocr/torch, opencv)는 쓰는 함수 안에서 import 합니다.
+# 로그인 화면은 이것들 없이 바로 뜨고, OCR 모델은 로그인 후 백그라운드에서 미리 준비됩니다.
 
 # --- 1. 페이지 설정 및 디자인 ---
-st.set_page_config(
-    page_title="이세계 판타지 라이프 - 길드 매니저",
-    page_icon="⚔️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# (화면 설정/DB 연결/세션 초기화는 앱으로 실행될 때만 합니다.
+#  bench_guild.py 처럼 헬퍼 함수만 import 해서 쓸 때는 아무 화면도 그리지 않도록)
+def setup_page():
+    st.set_page_config(
+        page_title="이세계 판타지 라이프 - 길드 매니저",
+        page_icon="⚔️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
 
-# 커스텀 CSS (게임 분위기)
-st.markdown("""
-    <style>
-    .main {background-color: #0e1117;}
-    h1, h2, h3 {color: #ffaa00;}
-    .stMetric {background-color: #262730; padding: 10px; border-radius: 5px; border: 1px solid #444;}
-    </style>
-    """, unsafe_allow_html=True)
+    # 커스텀 CSS (게임 분위기)
+    st.markdown("""
+        <style>
+        .main {background-color: #0e1117;}
+        h1, h2, h3 {color: #ffaa00;}
+        .stMetric {background-color: #262730; padding: 10px; border-radius: 5px; border: 1px solid #444;}
+        </style>
+        """, unsafe_allow_html=True)
 
 # --- 2. 하이브리드 Firebase 초기화 (핵심 기능) ---
 @st.cache_resource
@@ -58,174 +77,824 @@ def init_firestore():
         st.error(f"🔥 Firebase 연결 오류: {e}")
         st.stop()
 
-db = init_firestore()
+# [새로 추가] 저장소 선택 (헬퍼 함수들은 DB를 직접 부르지 않고 이 저장소만 사용)
+# 환경변수 GUILD_STORE:
+#   firestore (기본값)  - 실제 서비스
+#   memory              - 인증 정보 없이 개발/테스트 (재시작하면 사라짐)
+#   sqlite[:파일경로]    - 로컬 파일 (기본 guild.db)
+@st.cache_resource
+def get_store():
+    backend, _, option = os.environ.get("GUILD_STORE", "firestore").partition(":")
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore(option or "guild.db")
+    return FirestoreStore(init_firestore())
+
+# [새로 추가] 길드별 실시간 공유 사본 (guild_live.py)
+# 같은 길드를 여러 운영진이 보고 있어도 명단/오늘 기록 감시는 서버에 하나만 열고,
+# 세션들은 DB 대신 이 사본을 읽습니다. (GUILD_LIVE=0 이면 끄고 캐시된 DB 읽기만 사용)
+LIVE_POLL_SECONDS = 5
+
+@st.cache_resource
+def get_live_hub():
+    if os.environ.get("GUILD_LIVE") == "0":
+        return None
+    return LiveHub(get_store(), idle_seconds=LIVE_POLL_SECONDS * 12)
+
+def live_session_id():
+    # 세션마다 고정된 ID (공유 사본을 누가 보고 있는지 세는 용도)
+    if 'live_session_id' not in st.session_state:
+        st.session_state['live_session_id'] = uuid.uuid4().hex
+    return st.session_state['live_session_id']
 
 # --- 3. 세션 상태 관리 ---
-if 'is_logged_in' not in st.session_state:
-    st.session_state['is_logged_in'] = False
-if 'guild_name' not in st.session_state:
-    st.session_state['guild_name'] = ""
-if 'guild_id' not in st.session_state:
-    st.session_state['guild_id'] = ""
+def init_session_state():
+    if 'is_logged_in' not in st.session_state:
+        st.session_state['is_logged_in'] = False
+    if 'guild_name' not in st.session_state:
+        st.session_state['guild_name'] = ""
+    if 'guild_id' not in st.session_state:
+        st.session_state['guild_id'] = ""
 
 # --- 4. 헬퍼 함수 (DB CRUD & OCR) ---
+# 길드원 명단은 실시간 공유 사본이 있으면 그것을 쓰고(DB 읽기 없음),
+# 없으면 길드 ID별로 캐싱한 DB 읽기를 씁니다. (한 번의 rerun에서 대시보드/일일기록/정원체크가
+# 모두 같은 명단을 쓰므로 DB 읽기는 최대 1번)
+# 명단이 바뀌는 곳(등록/수정/삭제/일괄 저장)에서는 invalidate_guild_members()로 즉시 비웁니다.
 def get_guild_members(guild_id):
-    docs = db.collection('guilds').document(guild_id).collection('members').stream()
-    data = []
-    for doc in docs:
-        d = doc.to_dict()
-        d['id'] = doc.id
-        data.append(d)
-    return pd.DataFrame(data)
+    import pandas as pd
+    hub = get_live_hub()
+    members = hub.members(guild_id) if hub is not None else None
+    if members is not None:
+        return pd.DataFrame(members)
+    return fetch_guild_members(guild_id)
+
+@st.cache_data(ttl=60, show_spinner=False)
+@timed("fetch_guild_members")
+def fetch_guild_members(guild_id):
+    import pandas as pd
+    return pd.DataFrame(get_store().list_members(guild_id))
+
+def invalidate_guild_members(guild_id):
+    # 해당 길드의 명단 캐시만 비우기 (다른 길드 캐시는 유지)
+    fetch_guild_members.clear(guild_id)
 
+@contextmanager
+def live_write(guild_id, kind):
+    """
+    이 세션이 명단('members') 또는 오늘 기록('daily')을 저장하는 구간
+    저장 전에 공유 사본에 알려 두어, 감시로 들어오는 변경을 이 세션의 것으로 보게 함
+    (저장 직후 DB를 읽고, 자기 저장 때문에 앱 전체를 다시 그리지 않음). 저장이 실패하면 취소합니다.
+    """
+    hub = get_live_hub()
+    if hub is None:
+        yield
+        return
+    hub.expect_change(guild_id, kind, live_session_id())
+    try:
+        yield
+    except BaseException:
+        hub.cancel_change(guild_id, kind)
+        raise
 
 
 # --- 헬퍼 함수: OCR 분석 (스마트 패턴 매칭 버전) ---
 @st.cache_resource
+@timed("load_ocr_reader")
 def load_ocr_reader():
     import easyocr
     return easyocr.Reader(['ko', 'en'], gpu=False) 
 
-def run_ocr_scan(image_file, scan_mode):
+def _warm_up_ocr_reader():
     try:
-        reader = load_ocr_reader()
-        image_bytes = image_file.read()
+        load_ocr_reader()
+        print("✅ OCR 모델 준비 완료")
+    except Exception as e:
+        print(f"⚠️ OCR 모델 미리 불러오기 실패 (분석 버튼을 누를 때 다시 시도): {e}")
+
+# [새로 추가] OCR 작업자 프로세스 풀 (ocr_worker.py)
+# 스캔은 서버 밖 작업자 프로세스에서 돌리고, 화면은 작업을 넣은 뒤 1초마다 상태만 확인합니다.
+# 환경변수 GUILD_OCR_WORKERS: 작업자 수 (기본 1 / 0이면 예전처럼 서버 안에서 실행)
+# 작업자마다 OCR 모델을 따로 불러오므로 작업자 1개당 메모리 1GB 정도를 더 씁니다.
+# 메모리가 넉넉한 서버에서만 늘리세요. (이 프로세스가 쓸 수 있는 코어 수보다 많이는 띄우지 않음)
+OCR_POLL_SECONDS = 1
+
+@st.cache_resource
+def get_ocr_pool():
+    workers = int(os.environ.get("GUILD_OCR_WORKERS", 1))
+    if workers <= 0:
+        return None
+    return OcrPool(min(workers, usable_cpus()))
+
+@st.cache_resource
+def start_ocr_warmup():
+    """
+    로그인 후 OCR 모델(한/영)을 미리 불러오기 (서버 프로세스당 1번)
+    작업자 풀이 있으면 작업자들을 미리 띄우고, 없으면 백그라운드 스레드에서 서버 안에 불러옵니다.
+    (준비 중에 분석 버튼을 누르면 같은 로딩을 기다렸다가 이어서 씁니다)
+    """
+    pool = get_ocr_pool()
+    if pool is not None:
+        pool.warm_up()
+        return None
+    thread = threading.Thread(target=_warm_up_ocr_reader, name="ocr-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# [새로 추가] OCR 결과 캐시
+# 같은 스크린샷을 다시 올리거나 분석 버튼을 또 눌러도 EasyOCR을 다시 돌리지 않도록,
+# (이미지 내용 해시 + 모드 + 전처리 설정)을 키로 인식 글자와 분석 결과를 저장합니다.
+# 환경변수 GUILD_OCR_CACHE_DIR 를 지정하면 디스크에도 저장되어 서버 재시작 후에도 유지됩니다.
+OCR_CACHE_VERSION = 1  # 분석 로직이 바뀌면 올려서 예전 캐시 무효화
+
+class OcrResultCache:
+    def __init__(self, max_entries=128, cache_dir=None, max_disk_entries=2000):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes, scan_mode):
+        settings = json.dumps(
+            {"v": OCR_CACHE_VERSION, "mode": scan_mode, "preset": OCR_PRESETS.get(scan_mode)},
+            sort_keys=True
+        )
+        return hashlib.sha256(image_bytes + settings.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)  # 최근 사용 순서 갱신 (LRU)
+                return self._entries[key]
+
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(self._path(key))  # 디스크도 최근 사용 순으로 정리되도록
+        except (OSError, ValueError):
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def put(self, key, text, result):
+        entry = {"text": text, "result": list(result)}
+        self._remember(key, entry)
+        if self.cache_dir:
+            try:
+                with open(self._path(key), "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                self._trim_disk()
+            except OSError:
+                pass  # 디스크 저장 실패는 무시 (메모리 캐시는 유지)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # 가장 오래 안 쓴 항목부터 제거
+
+    def _trim_disk(self):
+        files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+@st.cache_resource
+def get_ocr_cache():
+    return OcrResultCache(cache_dir=os.environ.get("GUILD_OCR_CACHE_DIR"))
+
+# 정규표현식: "(시간) (닉네임) 님이 (무슨) 기부를" 패턴을 찾습니다.
+# \s* 는 띄어쓰기가 있든 없든 상관없다는 뜻입니다. (시간은 인식 안 될 수도 있어서 선택)
+DONATION_PATTERN = re.compile(r'(?:(\d{1,2}:\d{2})\s*)?(\S+)\s*님이\s*(\S+)\s*기부')
+
+def parse_donation_lines(full_text):
+    """
+    OCR 글에서 기부 내역 줄을 화면 순서대로 [(시간, 닉네임, 기부종류), ...] 로 추출
+    """
+    entries = []
+    for time_str, raw_name, donation_type in DONATION_PATTERN.findall(full_text):
+        # 닉네임 정제 (혹시 앞에 이상한 기호가 붙었으면 제거)
+        nickname = raw_name.strip()
+
+        # 가끔 시간(00:02)이 닉네임으로 잡히는 경우 제외
+        if ":" in nickname or nickname.isdigit():
+            continue
+        entries.append((time_str, nickname, donation_type))
+    return entries
+
+def count_donations(entries):
+    # 기부 내역 줄 목록 -> {닉네임: {'basic', 'inter', 'adv', 'item'}} 횟수 집계
+    donation_counts = {}
+    for _, nickname, donation_type in entries:
+        if nickname not in donation_counts:
+            donation_counts[nickname] = {'basic':0, 'inter':0, 'adv':0, 'item':0}
+        
+        # 횟수는 기본 1회로 가정 (스크린샷에 보통 1회씩 나오므로)
+        # 만약 "4회" 같은 걸 인식하려면 더 복잡해지지만, 일단 기본 로직 적용
+        add_val = 1
+        
+        if "초급" in donation_type: donation_counts[nickname]['basic'] += add_val
+        elif "중급" in donation_type: donation_counts[nickname]['inter'] += add_val
+        elif "고급" in donation_type: donation_counts[nickname]['adv'] += add_val
+        elif "아이템" in donation_type: donation_counts[nickname]['item'] += add_val
+    return donation_counts
+
+def _overlap_length(head, tail):
+    # head의 끝부분과 tail의 앞부분이 겹치는 최대 줄 수
+    for k in range(min(len(head), len(tail)), 0, -1):
+        if head[-k:] == tail[:k]:
+            return k
+    return 0
+
+def merge_scrolled_pages(pages):
+    """
+    스크롤하며 찍은 여러 장의 기부 내역을 하나로 합치기
+    같은 줄이 여러 번 나오는 것은 정상이므로(같은 시간에 같은 기부 반복),
+    한 장 안에서는 중복 제거하지 않고 '앞 장의 끝 = 다음 장의 처음'으로 겹친 부분만 뺍니다.
+    업로드 순서가 거꾸로여도 되도록 양쪽 방향 모두 확인합니다.
+    """
+    merged = []
+    for page in pages:
+        if not merged:
+            merged = list(page)
+            continue
+        forward = _overlap_length(merged, page)    # 위 -> 아래로 스크롤한 순서
+        backward = _overlap_length(page, merged)   # 아래 -> 위로 스크롤한 순서
+        if forward >= backward:
+            merged = merged + list(page[forward:])
+        else:
+            merged = list(page[:len(page) - backward]) + merged
+    return merged
+
+def parse_scan_text(full_text, scan_mode):
+    """
+    OCR로 읽은 글을 모드별로 분석 -> (결과종류, 데이터, 메시지)
+    """
+    # ---------------------------------------------------------
+    # MODE 1: 기부 내역 분석
+    # ---------------------------------------------------------
+    if scan_mode == "donation":
+        # 긴 글에서 패턴에 맞는 모든 부분을 찾습니다.
+        entries = parse_donation_lines(full_text)
         
-        # detail=0은 글자만 리스트로 줍니다.
-        result = reader.readtext(image_bytes, detail=0)
+        if not entries:
+            # "기부"나 "님이"가 있는데 인식을 못 한 건지, 아예 엉뚱한 사진인지 확인
+            if "기부" in full_text:
+                 return "error", {}, "기부 글자는 보이지만 패턴을 못 찾았습니다. 인식 결과를 확인해주세요."
+            return "error", {}, "기부 내역을 찾지 못했습니다. 올바른 스크린샷인지 확인해주세요."
+
+        return "donation", count_donations(entries), "기부 내역 분석 완료"
+
+    # ---------------------------------------------------------
+    # MODE 2: 현자 도전 분석
+    # ---------------------------------------------------------
+    elif scan_mode == "sage":
+        found_dmg = 0.0
+        found_kill = 0
         
-        # [핵심 변경] 리스트를 공백으로 이어 붙여서 '하나의 긴 글'로 만듭니다.
-        full_text = " ".join(result)
+        # 현자 로직은 숫자 찾기 (기존 유지)
+        numbers = re.findall(r"[\d]+[.,]?[\d]*", full_text)
         
-        # 디버깅을 위해 화면에 인식된 글자를 몰래 보여줍니다 (문제 해결 후 주석 처리 가능)
-        st.write("🔍 [OCR 인식 결과]:", full_text)
-
-        # ---------------------------------------------------------
-        # MODE 1: 기부 내역 분석
-        # ---------------------------------------------------------
-        if scan_mode == "donation":
-            donation_counts = {}
-            import re
-            
-            # 정규표현식: "(닉네임) 님이 (무슨) 기부를" 패턴을 찾습니다.
-            # \s* 는 띄어쓰기가 있든 없든 상관없다는 뜻입니다.
-            pattern = re.compile(r'(\S+)\s*님이\s*(\S+)\s*기부')
-            
-            # 긴 글에서 패턴에 맞는 모든 부분을 찾습니다.
-            matches = pattern.findall(full_text)
-            
-            if not matches:
-                # "기부"나 "님이"가 있는데 인식을 못 한 건지, 아예 엉뚱한 사진인지 확인
-                if "기부" in full_text:
-                     return "error", {}, "기부 글자는 보이지만 패턴을 못 찾았습니다. 인식 결과를 확인해주세요."
-                return "error", {}, "기부 내역을 찾지 못했습니다. 올바른 스크린샷인지 확인해주세요."
-
-            for match in matches:
-                # match[0]: 닉네임, match[1]: 기부 종류(초급/중급/고급 등)
-                raw_name = match[0]
-                donation_type = match[1]
-                
-                # 닉네임 정제 (혹시 앞에 이상한 기호가 붙었으면 제거)
-                nickname = raw_name.strip()
-                
-                # 가끔 시간(00:02)이 닉네임으로 잡히는 경우 제외
-                if ":" in nickname or nickname.isdigit():
-                    continue
+        for num in numbers:
+            clean_num = num.replace(',', '')
+            try:
+                val = float(clean_num)
+                # 40.2억 -> 40.2로 인식됨. 현자 피해량은 보통 소수점 포함
+                if val > found_dmg and ('.' in num or val > 1000): found_dmg = val
+                if val > found_kill and '.' not in num and val < 100: found_kill = int(val)
+            except: continue
+        
+        if found_dmg == 0:
+             return "error", {}, "피해량을 찾지 못했습니다. 인식 결과를 확인해주세요."
 
-                if nickname not in donation_counts:
-                    donation_counts[nickname] = {'basic':0, 'inter':0, 'adv':0, 'item':0}
-                
-                # 횟수는 기본 1회로 가정 (스크린샷에 보통 1회씩 나오므로)
-                # 만약 "4회" 같은 걸 인식하려면 더 복잡해지지만, 일단 기본 로직 적용
-                add_val = 1
-                
-                if "초급" in donation_type: donation_counts[nickname]['basic'] += add_val
-                elif "중급" in donation_type: donation_counts[nickname]['inter'] += add_val
-                elif "고급" in donation_type: donation_counts[nickname]['adv'] += add_val
-                elif "아이템" in donation_type: donation_counts[nickname]['item'] += add_val
-            
-            return "donation", donation_counts, "기부 내역 분석 완료"
-
-        # ---------------------------------------------------------
-        # MODE 2: 현자 도전 분석
-        # ---------------------------------------------------------
-        elif scan_mode == "sage":
-            found_dmg = 0.0
-            found_kill = 0
-            
-            # 현자 로직은 숫자 찾기 (기존 유지)
-            import re
-            numbers = re.findall(r"[\d]+[.,]?[\d]*", full_text)
-            
-            for num in numbers:
-                clean_num = num.replace(',', '')
-                try:
-                    val = float(clean_num)
-                    # 40.2억 -> 40.2로 인식됨. 현자 피해량은 보통 소수점 포함
-                    if val > found_dmg and ('.' in num or val > 1000): found_dmg = val
-                    if val > found_kill and '.' not in num and val < 100: found_kill = int(val)
-                except: continue
-            
-            if found_dmg == 0:
-                 return "error", {}, "피해량을 찾지 못했습니다. 인식 결과를 확인해주세요."
-
-            return "sage", {"dmg": found_dmg, "kill": found_kill}, "현자 도전 분석 완료"
-            
+        return "sage", {"dmg": found_dmg, "kill": found_kill}, "현자 도전 분석 완료"
+
+    return "error", {}, f"알 수 없는 분석 모드: {scan_mode}"
+
+# [새로 추가] 스캔 작업: 시작(start_scan) -> 상태 확인(poll_scan)
+# 캐시에 있는 장은 바로 쓰고 나머지만 작업자 풀에 넣습니다. 결과 분석(기부 줄 합치기 등)은 서버에서 합니다.
+def start_scan(image_files, scan_mode):
+    """스크린샷 업로드 파일 목록으로 스캔 시작 -> 작업 정보 dict (poll_scan에 넘김, 세션에 저장 가능)"""
+    pages = [image_file.read() for image_file in image_files]
+    cache = get_ocr_cache()
+    keys = [cache.make_key(image_bytes, scan_mode) for image_bytes in pages]
+    texts = [(cache.get(key) or {}).get("text") for key in keys]
+    missing = [i for i, text in enumerate(texts) if text is None]
+    job = {'mode': scan_mode, 'keys': keys, 'texts': texts, 'missing': missing, 'job_id': None, 'new_texts': []}
+    if missing:
+        todo = [pages[i] for i in missing]
+        pool = get_ocr_pool()
+        if pool is None:
+            job['new_texts'] = recognize_pages(todo, scan_mode, load_ocr_reader())  # 서버 안에서 바로 실행
+        else:
+            job['job_id'] = pool.submit(todo, scan_mode)  # 대기열이 가득 차면 QueueFull
+    return job
+
+def poll_scan(job):
+    """
+    진행 중이면 작업자 풀 상태 {'state': 'queued' | 'running', ...}
+    끝났으면 {'state': 'done', 'result': (결과종류, 데이터, 메시지), 'texts': [인식 글자, ...]}
+    """
+    new_texts = job['new_texts']
+    if job['job_id'] is not None:
+        pool = get_ocr_pool()
+        status = pool.poll(job['job_id'])
+        if status['state'] in ('queued', 'running'):
+            return status
+        pool.forget(job['job_id'])
+        if status['state'] != 'done':
+            error = status.get('error', "작업을 찾지 못했습니다. 다시 분석해주세요.")
+            return {'state': 'done', 'result': ("error", {}, f"오류 발생: {error}"), 'texts': []}
+        new_texts = status['texts']
+
+    texts = list(job['texts'])
+    cache = get_ocr_cache()
+    for i, text in zip(job['missing'], new_texts):
+        texts[i] = text
+        if text is not None:
+            cache.put(job['keys'][i], text, parse_scan_text(text, job['mode']))
+    texts = [text for text in texts if text is not None]  # 읽지 못한 이미지 제외
+    return {'state': 'done', 'result': finish_scan(texts, job['mode']), 'texts': texts}
+
+def finish_scan(texts, scan_mode):
+    # 장별 인식 글자 -> (결과종류, 데이터, 메시지) (기부 내역은 여러 장의 겹치는 줄을 한 번만 집계)
+    if not texts:
+        return "error", {}, "이미지를 읽지 못했습니다. png/jpg 파일인지 확인해주세요."
+    if scan_mode != "donation" or len(texts) == 1:
+        return parse_scan_text(texts[0], scan_mode)
+    pages = [parse_donation_lines(text) for text in texts]
+    entries = merge_scrolled_pages(pages)
+    if not entries:
+        return "error", {}, "기부 내역을 찾지 못했습니다. 올바른 스크린샷인지 확인해주세요."
+    return "donation", count_donations(entries), f"기부 내역 분석 완료 ({len(pages)}장, {len(entries)}건)"
+
+def run_scan(image_files, scan_mode):
+    # 스캔을 시작하고 끝날 때까지 기다리기 (화면 없이 쓸 때: 벤치마크 등)
+    try:
+        job = start_scan(image_files, scan_mode)
+        if job['job_id'] is not None:
+            get_ocr_pool().wait(job['job_id'])
+        return poll_scan(job)['result']
     except Exception as e:
         return "error", {}, f"오류 발생: {e}"
-    
-    
-    
+
+@timed("run_donation_scan")
+def run_donation_scan(image_files):
+    # 기부 내역 스크린샷 여러 장을 한 번에 분석 (반환 형식은 run_ocr_scan과 같음)
+    return run_scan(image_files, "donation")
+
+@timed("run_ocr_scan")
+def run_ocr_scan(image_file, scan_mode):
+    return run_scan([image_file], scan_mode)
+
+
+# [새로 추가] OCR 닉네임 -> 길드원 퍼지 매칭
+# EasyOCR이 한글 자모를 빠뜨리거나 바꾸고(쨘->쟌), 기호를 붙이거나 없애는(♡, .) 경우가 많아서
+# 닉네임을 자모 단위로 풀어 비교합니다. 자모 2-gram 역색인으로 후보를 먼저 좁히고,
+# 후보만 편집거리로 점수(0~1)를 매겨서 명단이 커져도 조회 1번이 1ms 이내입니다.
+MATCH_CONFIDENT = 0.8   # 이 점수 이상이면 자동 입력 (확인 표시 없음)
+MATCH_MINIMUM = 0.5     # 이 점수 미만이면 매칭 실패로 따로 알려줌
+MATCH_AMBIGUOUS = 0.7   # 기호만 다른 길드원이 여럿일 때의 최고 점수 (자동 입력하지 않고 확인 표시)
+
+_CHO = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_JUNG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+_JONG = " ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ"
+
+def decompose_jamo(text):
+    # "카인♡" -> "ㅋㅏㅇㅣㄴ" (한글은 자모로, 영문/숫자는 소문자로, 나머지 기호는 제거)
+    out = []
+    for ch in str(text):
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            out.append(_CHO[code // 588])
+            out.append(_JUNG[(code % 588) // 28])
+            if code % 28:
+                out.append(_JONG[code % 28])
+        elif ch.isalnum():
+            out.append(ch.lower())
+    return "".join(out)
+
+def _edit_distance(a, b):
+    # 레벤슈타인 편집거리 (한 줄씩만 유지)
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+def _raw_key(name):
+    return str(name).strip().casefold()
+
+def _bigrams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)} or {key}
+
+class NameIndex:
+    def __init__(self, names, max_candidates=5):
+        self.names = list(names)
+        self.keys = [decompose_jamo(name) for name in self.names]
+        self.max_candidates = max_candidates
+        self._raw = {}      # 원래 닉네임(앞뒤 공백 제거, 대소문자 무시) -> 번호
+        self._exact = {}    # 자모 키 -> [번호, ...] ("카인"과 "카인♡"은 같은 키)
+        self._postings = {}
+        for i, key in enumerate(self.keys):
+            self._raw.setdefault(_raw_key(self.names[i]), i)
+            self._exact.setdefault(key, []).append(i)
+            for gram in _bigrams(key):
+                self._postings.setdefault(gram, []).append(i)
+
+    def match(self, ocr_name):
+        """
+        OCR 닉네임과 가장 비슷한 길드원 -> (길드원 닉네임, 점수 0~1), 명단이 비었으면 (None, 0.0)
+        """
+        raw = _raw_key(ocr_name)
+        if raw in self._raw:
+            return self.names[self._raw[raw]], 1.0
+        key = decompose_jamo(ocr_name)
+        if key in self._exact:
+            same_key = self._exact[key]
+            if len(same_key) == 1:
+                return self.names[same_key[0]], 1.0
+            # 기호만 다른 길드원이 여럿: 원래 닉네임끼리 편집거리로 고르고, 확인 표시가 뜨도록 점수를 낮춤
+            best_i = min(same_key, key=lambda i: _edit_distance(raw, _raw_key(self.names[i])))
+            target = _raw_key(self.names[best_i])
+            score = 1 - _edit_distance(raw, target) / max(len(raw), len(target), 1)
+            return self.names[best_i], max(min(score, MATCH_AMBIGUOUS), MATCH_MINIMUM)
+        if not key or not self.names:
+            return None, 0.0
+
+        # 자모 2-gram이 많이 겹치는 순으로 후보 추리기 (하나도 안 겹치면 전체가 후보)
+        hits = {}
+        for gram in _bigrams(key):
+            for i in self._postings.get(gram, ()):
+                hits[i] = hits.get(i, 0) + 1
+        candidates = sorted(hits, key=hits.get, reverse=True)[:self.max_candidates] or range(len(self.names))
+
+        best_i, best_score = None, 0.0
+        for i in candidates:
+            target = self.keys[i]
+            score = 1 - _edit_distance(key, target) / max(len(key), len(target), 1)
+            if score > best_score:
+                best_i, best_score = i, score
+        return (self.names[best_i] if best_i is not None else None), best_score
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def get_name_index(guild_id, names):
+    # 길드별 명단 색인 (names는 튜플, 명단이 바뀌면 키가 달라져서 새로 만듦)
+    return NameIndex(names)
+
+def resolve_scanned_names(scanned, name_index):
+    """
+    기부 스캔 결과의 OCR 닉네임을 길드원 닉네임으로 바꾸기
+    반환: (길드원 닉네임별 합산 결과, {길드원 닉네임: (OCR 닉네임, 점수)}, [매칭 실패 OCR 닉네임])
+    같은 사람이 여러 표기로 잡히면 횟수를 합칩니다.
+    """
+    resolved = {}
+    matches = {}
+    unmatched = []
+    for ocr_name, counts in scanned.items():
+        member_name, score = name_index.match(ocr_name)
+        if member_name is None or score < MATCH_MINIMUM:
+            unmatched.append(ocr_name)
+            continue
+        total = resolved.setdefault(member_name, {k: 0 for k in counts})
+        for k, v in counts.items():
+            total[k] = total.get(k, 0) + v
+        # 여러 표기가 합쳐지면 가장 낮은 점수를 기준으로 표시
+        if member_name not in matches or score < matches[member_name][1]:
+            matches[member_name] = (ocr_name, score)
+    return resolved, matches, unmatched
+
+# 직책별 제한 인원
+ROLE_LIMITS = {
+    "길드장": 1,
+    "부길드장": 3,
+    "정예": 4
+}
+
+def _quota_error(role):
+    return f"⚠️ '{role}' 정원 초과입니다. (최대 {ROLE_LIMITS[role]}명)"
+
+# 수정하려던 길드원을 다른 운영진이 그 사이 삭제한 경우 (저장소가 다시 만들지 않고 저장을 취소함)
+MEMBER_GONE_ERROR = "⚠️ 다른 운영진이 삭제한 길드원이 있어 저장하지 않았습니다. 명단을 새로 불러왔으니 다시 수정해주세요."
+
+@timed("add_update_member")
 def add_update_member(guild_id, name, cp, role, doc_id=None):
-    # 1. 현재 길드원 목록을 가져와서 인원 수 체크
-    current_members = get_guild_members(guild_id)
-    
-    # 제한 인원 설정
-    limits = {
-        "길드장": 1,
-        "부길드장": 3,
-        "정예": 4
-    }
-    
-    # 신규 등록이거나, 역할을 변경하는 경우 인원 제한 체크
-    if role in limits:
-        # 해당 직책을 가진 사람 수 계산
-        if not current_members.empty and 'role' in current_members.columns:
-            count = len(current_members[current_members['role'] == role])
-            
-            # 수정(Update)일 경우, 자기 자신은 카운트에서 제외해야 함 (이미 그 직책인 경우)
-            if doc_id:
-                existing_user = current_members[current_members['id'] == doc_id]
-                if not existing_user.empty and existing_user.iloc[0].get('role') == role:
-                    count -= 1
-            
-            # 제한 확인
-            if count >= limits[role]:
-                return False, f"⚠️ '{role}' 정원 초과입니다. (최대 {limits[role]}명)"
-
-    # 2. DB 저장/수정 로직
-    collection_ref = db.collection('guilds').document(guild_id).collection('members')
-    
     # 직책이 없으면 '일반'으로 저장
     final_role = role if role and role != "(선택 안 함)" else "일반"
-    
+
     data = {
         'name': name,
         'cp': int(cp),
         'role': final_role,  # 'job' 대신 'role' 사용
-        'updated_at': firestore.SERVER_TIMESTAMP
     }
-    
-    if doc_id:
-        collection_ref.document(doc_id).update(data)
-        return True, "수정 완료"
-    else:
-        # 이름 중복 체크 (선택 사항)
-        collection_ref.add(data)
-        return True, "등록 완료"
 
+    # 정원 체크 + 저장 + 카운터 갱신은 저장소가 한 번에(원자적으로) 처리
+    # (두 운영진이 동시에 마지막 자리를 배정해도 한 명만 성공합니다)
+    try:
+        with live_write(guild_id, 'members'):
+            get_store().write_members(guild_id, upserts=[(doc_id, data)], role_limits=ROLE_LIMITS)
+    except RoleQuotaExceeded as e:
+        return False, _quota_error(e.role)
+    except MemberNotFound:
+        invalidate_guild_members(guild_id)
+        return False, MEMBER_GONE_ERROR
+    invalidate_guild_members(guild_id)
+    return True, "수정 완료" if doc_id else "등록 완료"
+
+@timed("delete_member")
 def delete_member(guild_id, doc_id):
-    db.collection('guilds').document(guild_id).collection('members').document(doc_id).delete()
+    # 삭제와 직책 카운터 감소를 함께 처리
+    with live_write(guild_id, 'members'):
+        get_store().write_members(guild_id, deletes=[doc_id])
+    invalidate_guild_members(guild_id)
+
+def diff_member_edits(original_df, edited_df, fields=('name', 'cp', 'role')):
+    """
+    멤버 편집표(edited_df)를 불러온 명단(original_df)과 비교해서
+    {멤버ID: {바뀐 필드만}} 형태로 반환 (안 건드린 행은 제외)
+    """
+    fields = [f for f in fields if f in edited_df.columns]
+    original = original_df.set_index('id').reindex(columns=fields)
+    edited = edited_df.set_index('id')[fields]
+    original = original.reindex(edited.index)
+
+    # 값이 같거나 둘 다 비어있으면(NaN) 변경 없음
+    same = (edited == original) | (edited.isna() & original.isna())
+    changed = ~same
+
+    changes = {}
+    for mem_id in edited.index[changed.any(axis=1)]:
+        cols = changed.columns[changed.loc[mem_id]]
+        changes[mem_id] = {col: to_native(edited.at[mem_id, col]) for col in cols}
+    return changes
+
+# 한 번에 커밋할 멤버 수 (Firestore 트랜잭션/batch 500건 제한 이내:
+# 멤버 문서 + 전투력 기록 문서 = 멤버당 최대 2건, 길드 문서와 성장 그래프 문서 몇 건)
+ROSTER_IMPORT_CHUNK = 240
+
+def demotions_first(upserts):
+    # 직책을 내리는 멤버를 먼저 저장해야 묶음이 나뉘어도 중간에 정원을 넘지 않음
+    return sorted(upserts, key=lambda u: (u[1].get('role') in ROLE_LIMITS, 'role' not in u[1]))
+
+def write_member_chunks(guild_id, upserts):
+    """
+    [(멤버ID 또는 None, 필드)]를 ROSTER_IMPORT_CHUNK 건씩 묶어서 저장 -> (저장한 멤버 수, 오류 메시지 또는 None)
+    묶음마다 트랜잭션이 따로이므로 오류가 나면 앞 묶음까지는 저장되어 있습니다.
+    """
+    saved = 0
+    try:
+        for start in range(0, len(upserts), ROSTER_IMPORT_CHUNK):
+            chunk = upserts[start:start + ROSTER_IMPORT_CHUNK]
+            with live_write(guild_id, 'members'):
+                get_store().write_members(guild_id, upserts=chunk, role_limits=ROLE_LIMITS)
+            saved += len(chunk)
+    except RoleQuotaExceeded as e:
+        # 다른 운영진이 그 사이 직책을 바꾼 경우
+        error = _quota_error(e.role)
+    except MemberNotFound:
+        error = MEMBER_GONE_ERROR
+    else:
+        error = None
+    finally:
+        # 실패해도 앞 묶음은 저장됐을 수 있고, 편집표는 예전 명단 기준이므로 새로 불러오게 함
+        invalidate_guild_members(guild_id)
+    if error and saved:
+        error = f"{error} ({saved}명까지 저장됨)"
+    return saved, error
+
+@timed("save_member_edits")
+def save_member_edits(guild_id, original_df, edited_df):
+    """
+    바뀐 멤버의 바뀐 필드만 저장 -> (성공 여부, 메시지), 바뀐 것이 없으면 (None, 메시지) (저장하지 않음)
+    직책/전투력 변경이 섞여 있으면 정원 체크, 카운터 갱신, 전투력 기록까지 트랜잭션으로,
+    아니면 batch로 커밋합니다. (전투력 열을 통째로 붙여넣어도 넘지 않도록 ROSTER_IMPORT_CHUNK 명씩)
+    """
+    changes = diff_member_edits(original_df, edited_df)
+    if not changes:
+        return None, "변경된 내용이 없습니다."
+
+    _, error = write_member_chunks(guild_id, demotions_first(changes.items()))
+    if error:
+        return False, error
+    return True, f"✅ {len(changes)}명의 수정사항이 저장되었습니다!"
+
+# [새로 추가] 엑셀/CSV 명단 일괄 등록
+# 길드 투력표(xlsx)나 csv를 한 줄씩 읽어서, 이미 있는 닉네임은 전투력/직책만 고치고 없는 닉네임은 새로 등록합니다.
+# 직책 정원은 파일 전체를 반영한 최종 인원으로 메모리에서 먼저 검사하고, 저장은 여러 건씩 묶어서 합니다.
+ROSTER_COLUMNS = {
+    'name': ("닉네임", "이름", "name"),
+    'cp': ("전투력", "투력", "cp"),
+    'role': ("직책", "role"),
+}
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+def _xlsx_first_sheet(zf):
+    # workbook.xml 에서 첫 번째 시트의 파일 경로 찾기
+    import xml.etree.ElementTree as ET
+    try:
+        workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+        rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        rel_id = next(workbook.iter(_XLSX_NS + 'sheet')).get(_XLSX_REL_NS + 'id')
+        target = next(r.get('Target') for r in rels if r.get('Id') == rel_id)
+        return target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+    except (KeyError, StopIteration, ET.ParseError):
+        return 'xl/worksheets/sheet1.xml'
+
+def _xlsx_column(ref):
+    # "C12" -> 2 (0부터 시작하는 열 번호)
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - ord('A') + 1
+    return index - 1
+
+def iter_xlsx_rows(data):
+    """
+    xlsx 첫 번째 시트를 한 줄씩 [값, ...] 으로 읽기 (zip 안의 시트 XML을 스트리밍)
+    openpyxl 없이 동작하고, 모바일 앱이 만든 스타일 정보가 깨진 파일(길드 투력표)도 읽을 수 있습니다.
+    """
+    import io
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        shared = []
+        if 'xl/sharedStrings.xml' in zf.namelist():
+            with zf.open('xl/sharedStrings.xml') as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag == _XLSX_NS + 'si':
+                        shared.append("".join(t.text or "" for t in el.iter(_XLSX_NS + 't')))
+                        el.clear()
+
+        with zf.open(_xlsx_first_sheet(zf)) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag != _XLSX_NS + 'row':
+                    continue
+                row = {}
+                for cell in el.iter(_XLSX_NS + 'c'):
+                    col = _xlsx_column(cell.get('r')) if cell.get('r') else len(row)
+                    kind = cell.get('t')
+                    v = cell.find(_XLSX_NS + 'v')
+                    if kind == 'inlineStr':
+                        value = "".join(t.text or "" for t in cell.iter(_XLSX_NS + 't'))
+                    elif v is None or v.text is None:
+                        value = None
+                    elif kind == 's':
+                        value = shared[int(v.text)]
+                    elif kind in ('str', 'e', 'b'):
+                        value = v.text
+                    else:
+                        value = float(v.text)
+                    row[col] = value
+                el.clear()  # 읽은 줄은 바로 버려서 큰 파일도 메모리를 적게 씀
+                yield [row.get(i) for i in range(max(row) + 1)] if row else []
+
+def iter_csv_rows(data):
+    # csv 한 줄씩 (엑셀에서 저장한 csv는 cp949인 경우가 많아서 utf-8 실패 시 cp949로)
+    import csv
+    import io
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp949")
+    yield from csv.reader(io.StringIO(text))
+
+def _cell_text(value):
+    # 셀 값 -> 문자열 (숫자 닉네임 1234.0 -> "1234")
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def parse_roster_file(file_name, data):
+    """
+    명단 파일 -> ([{'name', 'cp', 'role'(직책 열이 있을 때만)}, ...], [경고 메시지])
+    첫 줄(제목 줄)에서 닉네임/전투력/직책 열을 찾습니다. ("전투력 순위" 같은 순위 열은 제외)
+    "이름(길드)" 열이면 닉네임 뒤의 "(소속 길드)"를 떼어냅니다.
+    """
+    rows_iter = iter_csv_rows(data) if file_name.lower().endswith(".csv") else iter_xlsx_rows(data)
+    header = next((row for row in rows_iter if any(_cell_text(v) for v in row)), None)
+    if header is None:
+        return [], ["빈 파일입니다."]
+
+    titles = [_cell_text(v).lower() for v in header]
+    columns = {}
+    for key, keywords in ROSTER_COLUMNS.items():
+        for i, title in enumerate(titles):
+            if any(k in title for k in keywords) and "순위" not in title:
+                columns[key] = i
+                break
+    if 'name' not in columns or 'cp' not in columns:
+        return [], ["닉네임(이름) / 전투력 열을 찾을 수 없습니다. 첫 줄에 열 제목을 넣어주세요."]
+    strip_suffix = "(" in titles[columns['name']]
+
+    role_options = list(ROLE_LIMITS) + ["일반"]
+    rows_by_name = {}
+    warnings = []
+    for line, row in enumerate(rows_iter, start=2):
+        cell = lambda key: row[columns[key]] if key in columns and columns[key] < len(row) else None
+        name = _cell_text(cell('name'))
+        if strip_suffix:
+            name = re.sub(r'\s*\([^()]*\)$', '', name)
+        if not name:
+            continue
+
+        try:
+            cp = round(float(str(cell('cp')).replace(",", "")), 1)
+        except ValueError:
+            warnings.append(f"{line}행 {name}: 전투력 '{_cell_text(cell('cp'))}'을(를) 읽을 수 없어 건너뜁니다.")
+            continue
+
+        item = {'name': name, 'cp': cp}
+        role = _cell_text(cell('role'))
+        if role:
+            if role not in role_options:
+                warnings.append(f"{line}행 {name}: 알 수 없는 직책 '{role}' -> 직책은 그대로 둡니다.")
+            else:
+                item['role'] = role
+        if name in rows_by_name:
+            warnings.append(f"{line}행 {name}: 닉네임이 중복되어 마지막 줄 값을 씁니다.")
+        rows_by_name[name] = item
+    return list(rows_by_name.values()), warnings
+
+def plan_roster_import(members_df, rows):
+    """
+    가져올 명단을 현재 명단과 닉네임으로 맞춰보기 (DB 읽기 없음)
+    반환: {'upserts': [(멤버ID 또는 None, 바뀐 필드)], 'new', 'updated', 'unchanged', 'error'}
+    직책 정원은 파일 전체를 반영한 최종 인원으로 검사 ('error'에 초과 메시지)
+    """
+    existing = {}
+    if not members_df.empty:
+        for mem_id, name, cp, role in members_df.reindex(columns=['id', 'name', 'cp', 'role']).itertuples(index=False):
+            existing.setdefault(name, (mem_id, to_native(cp), to_native(role)))
+
+    upserts = []
+    moves = []
+    unchanged = 0
+    for item in rows:
+        if item['name'] not in existing:
+            role = item.get('role', "일반")
+            upserts.append((None, {'name': item['name'], 'cp': item['cp'], 'role': role}))
+            moves.append((None, role))
+            continue
+
+        mem_id, old_cp, old_role = existing[item['name']]
+        fields = {}
+        if item['cp'] != old_cp:
+            fields['cp'] = item['cp']
+        if 'role' in item and item['role'] != old_role:
+            fields['role'] = item['role']
+            moves.append((old_role, item['role']))
+        if fields:
+            upserts.append((mem_id, fields))
+        else:
+            unchanged += 1
+
+    counts = {}
+    if not members_df.empty and 'role' in members_df:
+        counts = members_df['role'].value_counts().to_dict()
+    _, exceeded = apply_role_moves(counts, moves, ROLE_LIMITS)
+
+    upserts = demotions_first(upserts)
+    new = sum(1 for mem_id, _ in upserts if mem_id is None)
+    return {
+        'upserts': upserts,
+        'new': new,
+        'updated': len(upserts) - new,
+        'unchanged': unchanged,
+        'error': _quota_error(exceeded) if exceeded else None,
+    }
+
+@timed("import_roster")
+def import_roster(guild_id, plan):
+    # plan_roster_import 결과를 ROSTER_IMPORT_CHUNK 건씩 묶어서 저장 -> (성공 여부, 메시지)
+    _, error = write_member_chunks(guild_id, plan['upserts'])
+    if error:
+        return False, error
+    return True, f"✅ 신규 {plan['new']}명, 수정 {plan['updated']}명 저장 완료!"
 
 # 간단한 OCR 시뮬레이션 함수 (실제 OCR 라이브러리 연동 위치)
 # EasyOCR 등을 사용할 경우 여기에 구현
@@ -235,39 +904,382 @@ def simulate_ocr_process(uploaded_file):
     return 15000000, "OCR_User_01" # 가상의 인식된 투력과 이름 반환
 
 # [새로 추가] 날짜별 데이터 가져오기
+# 오늘 기록은 실시간 공유 사본에서, 그 외 날짜는 캐싱한 DB 읽기로 (저장 시 즉시 비움)
 def get_daily_data(guild_id, date_str):
-    doc_ref = db.collection('guilds').document(guild_id).collection('daily_records').document(date_str)
-    doc = doc_ref.get()
-    if doc.exists:
-        return doc.to_dict()
-    return {}
+    hub = get_live_hub()
+    record = hub.daily(guild_id, date_str) if hub is not None else None
+    if record is not None:
+        return record
+    return fetch_daily_data(guild_id, date_str)
+
+@st.cache_data(ttl=60, show_spinner=False)
+@timed("fetch_daily_data")
+def fetch_daily_data(guild_id, date_str):
+    return get_store().get_daily(guild_id, date_str)
+
+# [새로 추가] 주간/월간 집계(rollup) 문서
+# guilds/{id}/rollups/week_2024-W05, month_2024-03 문서에 멤버별 합계를 미리 쌓아둡니다.
+# 그래프는 기간 길이와 상관없이 집계 문서 몇 개만 읽으면 됩니다.
+def rollup_periods(day):
+    # 해당 날짜가 속한 (단위, 문서ID, 라벨, 시작일) 목록
+    iso_year, iso_week, _ = day.isocalendar()
+    week_label = f"{iso_year}-W{iso_week:02d}"
+    month_label = day.strftime("%Y-%m")
+    return [
+        ('week', f"week_{week_label}", week_label, day - timedelta(days=day.weekday())),
+        ('month', f"month_{month_label}", month_label, day.replace(day=1)),
+    ]
+
+def recent_rollup_ids(period, count, today):
+    # 오늘이 속한 주/월부터 거슬러 올라가며 최근 count개의 집계 문서ID
+    ids = []
+    day = today
+    for _ in range(count):
+        ids.append(next(doc_id for p, doc_id, _, _ in rollup_periods(day) if p == period))
+        if period == 'week':
+            day -= timedelta(days=7)
+        else:
+            day = day.replace(day=1) - timedelta(days=1)
+    return ids[::-1]
 
 # [새로 추가] 날짜별 데이터 저장하기
-def save_daily_data(guild_id, date_str, data_dict):
-    doc_ref = db.collection('guilds').document(guild_id).collection('daily_records').document(date_str)
-    doc_ref.set(data_dict, merge=True)
+@timed("save_daily_data")
+def save_daily_data(guild_id, date_str, data_dict, base=None):
+    """
+    data_dict: 저장할 칸 {멤버ID: {필드: 값}} (diff_record_grid로 바뀐 칸만 주면 그 칸만 고침)
+    base: 그 칸들을 불러왔을 때의 값 -> 그 사이 다른 운영진이 고친 칸은 덮어쓰지 않고 충돌로 돌려줌
+    반환: 충돌 칸 {멤버ID: {필드: 지금 저장된 값}}
+    """
+    day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    rollups = {
+        doc_id: {'period': period, 'label': label, 'start': start.strftime("%Y-%m-%d")}
+        for period, doc_id, label, start in rollup_periods(day)
+    }
+
+    # 기존 기록과의 차이만큼만 집계 문서에 더하기 (같은 날짜를 다시 저장해도 중복 합산 X)
+    with live_write(guild_id, 'daily'):
+        conflicts = get_store().save_daily(guild_id, date_str, data_dict, rollups, base=base)
+    # 저장 즉시 캐시 비우기 (다음 화면에 바로 반영)
+    fetch_daily_data.clear(guild_id, date_str)
+    fetch_period_records.clear()
+    fetch_rollups.clear()
+    fetch_activity.clear(guild_id)
+    # 보관함에 이미 들어간 달이면 다음 동기화 때 다시 받도록 표시
+    get_archive().mark_dirty(guild_id, date_str)
+    sync_archive.clear(guild_id)
+    return conflicts
+
+# [새로 추가] 일일 기록 표 <-> 저장용 dict 변환 (pandas 벡터 연산, 멤버 수가 늘어도 거의 일정한 시간)
+# 스캔 결과 키 -> 기록 필드
+SCAN_FIELD_MAP = {'basic': 'don_basic', 'inter': 'don_inter', 'adv': 'don_adv', 'item': 'don_item'}
+# 기록 필드 -> 화면 이름 (저장 충돌 안내용)
+RECORD_FIELD_LABELS = {
+    'don_basic': "기부(초급)", 'don_inter': "기부(중급)", 'don_adv': "기부(고급)",
+    'don_item': "기부(템)", 'sage_dmg': "피해량(억)", 'sage_kill': "격퇴",
+}
+
+def build_record_grid(members_df, daily_record, scanned=None, mode=None, matches=None):
+    """
+    명단 + 해당 날짜 기록(+ 기부 스캔 결과)을 합쳐서 일일 기록 표(DataFrame)를 만들기
+    컬럼: id, name, don_basic, don_inter, don_adv, don_item, sage_dmg, sage_kill
+    matches({길드원 닉네임: (OCR 닉네임, 점수)})를 주면 스캔 매칭 표시 컬럼 'scan_match' 추가
+    """
+    import numpy as np
+    import pandas as pd
+
+    ids = members_df['id'].to_numpy()
+    names = members_df['name'].to_numpy()
+
+    # {멤버ID: {필드: 값}} -> 명단 순서의 (멤버 수 x 필드 수) 배열, 기록이 없는 칸은 0
+    record_frame = pd.DataFrame.from_dict(daily_record or {}, orient='index')
+    values = record_frame.reindex(index=ids, columns=RECORD_FIELDS).to_numpy(dtype='float64', na_value=0.0)
+
+    # 자동 입력 로직 (기부): 닉네임이 같은 멤버에게 스캔된 횟수(0보다 큰 값만) 덮어쓰기
+    if mode == "donation" and scanned:
+        scan_frame = pd.DataFrame.from_dict(scanned, orient='index')
+        scan = scan_frame.reindex(index=names, columns=list(SCAN_FIELD_MAP)).to_numpy(dtype='float64', na_value=0.0)
+        donation_cols = [RECORD_FIELDS.index(field) for field in SCAN_FIELD_MAP.values()]
+        values[:, donation_cols] = np.where(scan > 0, scan, values[:, donation_cols])
+
+    # 피해량은 소수, 나머지는 정수 컬럼
+    columns = {'id': ids, 'name': names}
+    for i, field in enumerate(RECORD_FIELDS):
+        columns[field] = values[:, i] if field == 'sage_dmg' else values[:, i].astype('int64')
+    grid = pd.DataFrame(columns)
+
+    if matches is not None:
+        grid['scan_match'] = grid['name'].map(lambda name: _match_label(matches.get(name))).fillna("")
+    return grid
+
+def _match_label(match):
+    # 표에 보여줄 스캔 매칭 상태 (확신이 낮으면 ⚠️ 로 확인 요청)
+    if match is None:
+        return ""
+    ocr_name, score = match
+    if score >= MATCH_CONFIDENT:
+        return f"✅ {ocr_name}" if score < 1.0 else "✅"
+    return f"⚠️ {ocr_name}? ({score:.0%})"
+
+def diff_record_grid(daily_record, edited_record):
+    """
+    불러온 기록과 표를 비교해서 바뀐 칸만 골라내기 (스캔 자동 입력 + 직접 고친 칸)
+    -> (바뀐 칸 {멤버ID: {필드: 새 값}}, 그 칸의 불러온 값 {멤버ID: {필드: 값 또는 None}})
+    기록이 없던 칸을 0 그대로 두면 바뀐 것으로 보지 않습니다.
+    """
+    import numpy as np
+    import pandas as pd
+
+    ids = edited_record['id'].tolist()
+    loaded = pd.DataFrame.from_dict(daily_record or {}, orient='index').reindex(index=ids, columns=RECORD_FIELDS)
+    old = loaded.to_numpy(dtype='float64', na_value=0.0)
+    new = edited_record[RECORD_FIELDS].to_numpy(dtype='float64', na_value=0.0)
+
+    columns = [edited_record[field].tolist() for field in RECORD_FIELDS]
+    changes, base = {}, {}
+    for row, col in zip(*np.nonzero(old != new)):
+        mem_id, field = ids[row], RECORD_FIELDS[col]
+        changes.setdefault(mem_id, {})[field] = to_native(columns[col][row]) or 0
+        base.setdefault(mem_id, {})[field] = (daily_record or {}).get(mem_id, {}).get(field)
+    return changes, base
+
+# [새로 추가] 최근 N주/N개월 집계 가져오기 (그래프용, 문서 N개를 한 번에 읽음)
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_rollups")
+def fetch_rollups(guild_id, period, count, today):
+    import pandas as pd
+    rows = []
+    for doc_id, rollup in get_store().get_rollups(guild_id, recent_rollup_ids(period, count, today)):
+        for mem_id, totals in rollup.get('members', {}).items():
+            row = {'label': rollup.get('label', doc_id), 'member_id': mem_id}
+            row.update(totals)
+            rows.append(row)
+
+    rollup_df = pd.DataFrame(rows)
+    if not rollup_df.empty:
+        rollup_df = rollup_df.reindex(columns=['label', 'member_id'] + RECORD_FIELDS).fillna(0)
+    return rollup_df
+
+# 다시 만들기는 기록 전체를 읽는 동안 다른 운영진이 기록을 저장하면 결과를 버리고 처음부터 다시 읽음
+REBUILD_ATTEMPTS = 3
+REBUILD_BUSY_MESSAGE = "⚠️ 다른 운영진이 기록을 저장하는 중이라 다시 만들지 못했습니다. 잠시 후 다시 시도해주세요."
+
+@timed("rebuild_rollups")
+def rebuild_rollups(guild_id):
+    """
+    기존 일일 기록 전체로 집계 문서를 다시 만들기 (집계 기능 도입 전 기록 반영용)
+    기록이 없어진 기간의 집계 문서는 지우고, 다시 만들기를 마친 시각을 길드 문서(rollups_built_at)에 남깁니다.
+    (이 표시가 생길 때까지 분석 화면이 다시 만들기를 권함)
+    반환: 만든 집계 문서 수, 읽는 동안 계속 다른 저장이 끼어들어 끝내지 못하면 None
+    """
+    store = get_store()
+    for _ in range(REBUILD_ATTEMPTS):
+        # 읽기 전에 표시를 남겨서, 그 사이 저장된 기록을 빠뜨린 결과는 저장소가 거절하게 함
+        token = store.begin_rebuild(guild_id, 'rollups')
+        rollups = build_rollups(store.list_daily(guild_id))
+        if store.replace_rollups(guild_id, rollups, token):
+            fetch_rollups.clear()
+            fetch_rollups_built.clear(guild_id)
+            return len(rollups)
+    return None
+
+def build_rollups(daily_docs):
+    """[(날짜, 기록), ...] -> {집계 문서ID: {'period', 'label', 'start', 'members'}}"""
+    import pandas as pd
+    rows = []
+    for date_str, record in daily_docs:
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        for mem_id, fields in record.items():
+            for period, doc_id, label, start in rollup_periods(day):
+                row = {'doc_id': doc_id, 'period': period, 'label': label,
+                       'start': start.strftime("%Y-%m-%d"), 'member_id': mem_id}
+                row.update({f: fields.get(f, 0) for f in RECORD_FIELDS})
+                rows.append(row)
+
+    rollups = {}
+    if rows:
+        totals = (pd.DataFrame(rows)
+                  .groupby(['doc_id', 'period', 'label', 'start', 'member_id'])[RECORD_FIELDS]
+                  .sum())
+        for (doc_id, period, label, start), group in totals.groupby(level=[0, 1, 2, 3]):
+            members = {
+                mem_id: {f: to_native(v) for f, v in fields.items()}
+                for mem_id, fields in group.droplevel([0, 1, 2, 3]).to_dict('index').items()
+            }
+            rollups[doc_id] = {'period': period, 'label': label, 'start': start, 'members': members}
+    return rollups
+
+# [새로 추가] 기존 기록이 집계에 모두 들어갔는지 (길드 문서의 rollups_built_at)
+# 집계 기능 도입 전에 만든 길드는 이 표시가 없으므로, 기록이 일부만 집계돼 있어도 알 수 있음
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_rollups_built")
+def fetch_rollups_built(guild_id):
+    return (get_store().get_guild(guild_id) or {}).get('rollups_built_at')
+
+# [새로 추가] 활동 점수 (guild_activity.py)
+# 기록을 저장할 때마다 저장소가 활동 상태 문서(stats/activity)를 같이 고치므로,
+# 화면에서는 그 문서 1개만 읽고 오늘 기준 지표를 계산합니다. (지난 기록을 다시 읽지 않음)
+INACTIVE_WARNING_DAYS = 3  # 이 날 수 이상 활동이 없으면 미활동 경고
+
+@st.cache_data(ttl=60, show_spinner=False)
+@timed("fetch_activity")
+def fetch_activity(guild_id):
+    return get_store().get_activity(guild_id)
+
+@timed("activity_table")
+def activity_table(members_df, state, today):
+    """길드원별 활동 지표 표 (이름, 직책, 점수 0~100, 연속 활동일, 마지막 활동일, 미활동 일수, 최근 30일 활동)"""
+    import pandas as pd
+    stats = member_activity(state, members_df['id'].tolist(), today)
+    table = pd.DataFrame.from_dict(stats, orient='index').reindex(members_df['id'].tolist())
+    table.insert(0, 'name', members_df['name'].tolist())
+    table.insert(1, 'role', members_df['role'].tolist() if 'role' in members_df.columns else None)
+    return table.reset_index(names='id')
+
+@timed("rebuild_activity")
+def rebuild_activity(guild_id):
+    """
+    기존 일일 기록 전체로 활동 점수 상태를 다시 만들기 (활동 점수 도입 전 기록 반영용)
+    반환: 점수를 만든 길드원 수, 읽는 동안 계속 다른 저장이 끼어들어 끝내지 못하면 None
+    """
+    store = get_store()
+    for _ in range(REBUILD_ATTEMPTS):
+        token = store.begin_rebuild(guild_id, 'activity')
+        state = build_activity(store.list_daily(guild_id))
+        if store.replace_activity(guild_id, state, token):
+            fetch_activity.clear(guild_id)
+            return len(state.get('members', {}))
+    return None
 
 # [새로 추가] 특정 기간 동안의 모든 기록 가져오기 (그래프용)
+# 날짜 문서 ID("YYYY-MM-DD") 범위 조회 한 번으로 기간 전체를 가져옵니다. (하루씩 읽지 않음)
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_period_records")
 def fetch_period_records(guild_id, start_date, end_date):
-    # start_date부터 end_date까지 하루씩 반복하며 데이터 수집
+    import pandas as pd
+    period_docs = get_store().get_daily_range(
+        guild_id, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    )
+
     period_data = []
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        daily_doc = db.collection('guilds').document(guild_id).collection('daily_records').document(date_str).get()
-        
-        if daily_doc.exists:
-            records = daily_doc.to_dict()
-            for mem_id, data in records.items():
-                # 그래프 그리기 편하게 데이터 구조 변경 (Flatten)
-                row = {'date': current_date, 'member_id': mem_id}
-                row.update(data) # 기존 데이터(기부 내역, 현자 내역) 합치기
-                period_data.append(row)
-                
-        current_date += timedelta(days=1)
-    
+    for date_str, records in period_docs:
+        try:
+            record_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            continue  # 날짜 형식이 아닌 문서는 무시
+
+        for mem_id, data in records.items():
+            # 그래프 그리기 편하게 데이터 구조 변경 (Flatten)
+            row = {'date': record_date, 'member_id': mem_id}
+            row.update(data) # 기존 데이터(기부 내역, 현자 내역) 합치기
+            period_data.append(row)
+
     return pd.DataFrame(period_data)
 
+# 기간 지정 분석에서 이 일수 이하는 DB 범위 조회(fetch_period_records), 더 길면 보관함
+PERIOD_RECORDS_MAX_DAYS = 62
+
+# [새로 추가] 기록 보관함 (월별 Parquet 파일, guild_archive.py)
+# 긴 기간(시즌 전체, 1년) 분석은 DB 대신 보관함을 pandas로 조회합니다.
+# 환경변수 GUILD_ARCHIVE_DIR 로 위치 지정 (기본: archive 폴더)
+@st.cache_resource
+def get_archive():
+    return GuildArchive(os.environ.get("GUILD_ARCHIVE_DIR", "archive"))
+
+# 보관함 증분 동기화 (길드별로 10분에 최대 1번, 기록 저장 시에는 바로 다시 동기화)
+@st.cache_data(ttl=600, show_spinner="기록 보관함 업데이트 중...")
+@timed("sync_archive")
+def sync_archive(guild_id, today=None, full=False):
+    return get_archive().sync(get_store(), guild_id, today or datetime.now().date(), full=full)
+
+def load_custom_period(guild_id, start_date, end_date):
+    """
+    기간 기록을 읽어서 그래프용 집계 -> (DataFrame[label, member_id, 기록 필드], 단위 이름)
+    짧은 기간(PERIOD_RECORDS_MAX_DAYS 이하)은 DB 범위 조회 한 번으로 방금 저장한 기록까지, 긴 기간은 보관함에서 읽습니다.
+    기간이 길수록 묶는 단위를 키웁니다. (2개월 이하: 일, 1년 이하: 주, 그 이상: 월)
+    """
+    import pandas as pd
+    span = (end_date - start_date).days
+    if span <= PERIOD_RECORDS_MAX_DAYS:
+        records = fetch_period_records(guild_id, start_date, end_date)
+        if not records.empty:
+            records = records.reindex(columns=['date', 'member_id'] + RECORD_FIELDS)
+            records[RECORD_FIELDS] = records[RECORD_FIELDS].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+            records['date'] = pd.to_datetime(records['date'])
+    else:
+        sync_archive(guild_id)
+        records = get_archive().query(guild_id, start_date, end_date)
+    if records.empty:
+        return pd.DataFrame(), "일"
+
+    if span <= PERIOD_RECORDS_MAX_DAYS:
+        labels, unit_label = records['date'].dt.strftime("%Y-%m-%d"), "일"
+    elif span <= 366:
+        iso = records['date'].dt.isocalendar()
+        labels, unit_label = iso['year'].astype(str) + "-W" + iso['week'].astype(str).str.zfill(2), "주"
+    else:
+        labels, unit_label = records['date'].dt.strftime("%Y-%m"), "월"
+
+    period_df = (records.assign(label=labels)
+                 .groupby(['label', 'member_id'], as_index=False)[RECORD_FIELDS].sum())
+    return period_df, unit_label
+
+# [새로 추가] 길드 간 랭킹 (guild_leaderboard.py)
+# 모든 길드를 훑어 만든 요약 문서(leaderboards/week_...)는 30분마다 랭킹 구역에서 다시 만들고,
+# 세션들은 그 요약을 5분 동안 캐시해서 씁니다. (보통 rerun 당 DB 읽기 0건, 캐시가 비면 1건)
+# 첫 화면 미리 읽기는 저장된 요약만 읽으므로 다시 만들기를 기다리지 않습니다.
+LEADERBOARD_REFRESH_MINUTES = 30
+LEADERBOARD_TOP = 20
+LEADERBOARD_METRICS = {
+    "총 전투력": "cp_total",
+    "평균 전투력": "cp_avg",
+    "주간 기부": "donations",
+    "주간 현자 피해량": "sage_dmg",
+}
+
+def leaderboard_week_label(week, today):
+    # "이번 주" / "지난 주" -> 주간 집계 라벨 (예: 2024-W05)
+    day = today if week == "이번 주" else today - timedelta(days=7)
+    return next(label for period, _, label, _ in rollup_periods(day) if period == 'week')
+
+# 첫 화면에서는 미리 읽기 스레드가 부르므로 스피너 없이 (스피너는 실행 스레드에서만 그릴 수 있음)
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_leaderboard")
+def fetch_leaderboard(week_label):
+    # 저장된 요약 문서만 읽음 (없으면 None)
+    return get_store().get_leaderboard(leaderboard_doc_id(week_label))
+
+# [새로 추가] 전투력 성장 기록 (guild_cp_history.py)
+# 명단을 저장할 때 저장소가 멤버별 월간 기록과 일/주/월 단위 변화량을 같이 쌓아 둡니다.
+# 대시보드 그래프는 고른 단위의 변화량 문서 1개만 읽고, 지금 명단 합계에서 거꾸로 기간별 합계를 계산합니다.
+CP_GROWTH_RESOLUTIONS = {  # 화면 이름: (단위, 보여줄 기간 수, 기간 이름)
+    "일간": ('day', 30, "일"),
+    "주간": ('week', 26, "주"),
+    "월간": ('month', 24, "개월"),
+}
+CP_HISTORY_MONTHS = 12  # 길드원별 기록에서 읽을 최근 개월 수
+
+# 캐시 키에 지금 명단 값(인원/합계, 멤버 전투력)을 넣어서, 명단이 바뀌면 새로 읽음
+# (명단과 전투력 기록은 같은 트랜잭션으로 저장되므로 새 명단과 옛 기록이 섞이지 않음)
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_cp_growth")
+def fetch_cp_growth(guild_id, resolution, roster_key):
+    return get_store().get_cp_series(guild_id, resolution)
+
+@st.cache_data(ttl=300, show_spinner=False)
+@timed("fetch_member_cp_history")
+def fetch_member_cp_history(guild_id, mem_id, start_month, end_month, current_cp):
+    return member_points(get_store().get_cp_history(guild_id, mem_id, start_month, end_month))
+
+def cp_growth_frame(guild_id, members_df, resolution, count, today):
+    """기간별 길드 전투력 합계/인원 DataFrame[label, cp_total, members] (오래된 기간부터)"""
+    import pandas as pd
+    cp_total = float(members_df['cp'].sum()) if 'cp' in members_df.columns else 0.0
+    series = fetch_cp_growth(guild_id, resolution, (len(members_df), round(cp_total, 1)))
+    return pd.DataFrame(growth_series(series, cp_total, len(members_df), recent_buckets(resolution, count, today)))
+
 # --- 5. 로그인 및 길드 생성 화면 (사이드바) ---
 def login_ui():
     st.sidebar.title("🛡️ 이세계 길드 관리자")
@@ -285,11 +1297,9 @@ def login_ui():
             if not input_guild_id or not input_password:
                 st.error("ID와 비밀번호를 입력해주세요.")
             else:
-                guild_ref = db.collection('guilds').document(input_guild_id)
-                guild_doc = guild_ref.get()
+                data = get_store().get_guild(input_guild_id)
                 
-                if guild_doc.exists:
-                    data = guild_doc.to_dict()
+                if data is not None:
                     real_pw = data.get('password', '') # DB에 저장된 비번 가져오기
                     
                     if real_pw == input_password:
@@ -313,27 +1323,708 @@ def login_ui():
         
         if st.button("길드 만들기", key="btn_create"):
             if new_guild_id and new_guild_name and new_password:
-                # 1. 중복 체크
-                doc_ref = db.collection('guilds').document(new_guild_id)
-                if doc_ref.get().exists:
+                # 중복 체크 + 저장 (이미 있는 ID면 False)
+                # 새 길드는 다시 집계할 지난 기록이 없으므로 처음부터 집계 완료로 표시
+                created = get_store().create_guild(new_guild_id, {
+                    'name': new_guild_name,
+                    'password': new_password,
+                    'rollups_built_at': datetime.now().isoformat(timespec='seconds'),
+                    'role_counts': {},
+                    'cp_total': 0,
+                    'member_count': 0,
+                })
+                if not created:
                     st.error("이미 사용 중인 길드 ID입니다. 다른 ID를 써주세요.")
                 else:
-                    # 2. DB에 저장
-                    doc_ref.set({
-                        'name': new_guild_name,
-                        'password': new_password,
-                        'created_at': firestore.SERVER_TIMESTAMP
-                    })
+                    # 활동 점수도 다시 만들 지난 기록이 없으므로 빈 상태를 built로 저장
+                    get_store().put_activity(new_guild_id, build_activity([]))
                     st.success(f"🎉 '{new_guild_name}' 생성 완료! [로그인] 탭에서 접속하세요.")
             else:
                 st.warning("모든 칸을 입력해주세요.")
 
 def logout():
+    hub = get_live_hub()
+    if hub is not None:
+        hub.release(st.session_state['guild_id'], live_session_id())
     st.session_state['is_logged_in'] = False
     st.session_state['guild_id'] = ""
     st.rerun()
 
-# --- 6. 메인 애플리케이션 로직 ---
+# --- 6. 메인 애플리케이션 화면 (구역별 fragment) ---
+# 각 구역은 @st.fragment 로 분리되어, 그 안의 위젯을 건드리면 해당 구역만 다시 실행됩니다.
+# (예: 일일 기록 표의 한 칸을 고쳐도 대시보드/멤버 명단/분석 그래프는 다시 읽지 않음)
+# 명단처럼 여러 구역이 같이 쓰는 데이터는 캐시된 헬퍼를 각자 호출합니다.
+# 각 구역은 @metered 로 읽기/쓰기 수와 시간을 따로 집계합니다. (단독 rerun이면 그 자체가 한 번의 실행)
+
+# [새로 추가] 실행별 사용량 기록 (디버그 패널용, 세션마다 최근 20번)
+RERUN_HISTORY_SIZE = 20
+
+def remember_rerun_metrics(summary):
+    history = st.session_state.setdefault('rerun_metrics', [])
+    history.append(summary)
+    del history[:-RERUN_HISTORY_SIZE]
+
+def debug_enabled():
+    # 환경변수 GUILD_DEBUG=1 또는 주소 뒤에 ?debug=1 을 붙이면 디버그 패널 표시
+    return os.environ.get("GUILD_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+def debug_panel():
+    """
+    디버그 패널 (사이드바 자리에 그림): 이번 실행(지금까지)의 문서 읽기/쓰기, 구역별/함수별 시간, 최근 실행 기록
+    fragment 단독 rerun은 사이드바를 다시 그리지 않으므로 다음 전체 실행 때 '최근 실행'에 보입니다.
+    """
+    meter = current_meter()
+    with st.expander("🔧 디버그: 읽기/쓰기 계측", expanded=True):
+        if meter is not None:
+            summary = meter.summary()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("읽기", summary['reads'])
+            c2.metric("쓰기", summary['writes'])
+            c3.metric("시간(ms)", f"{summary['ms']:.0f}")
+            if summary['sections']:
+                st.caption("구역별")
+                st.dataframe([{'구역': name, **s} for name, s in summary['sections'].items()], hide_index=True)
+            if summary['calls']:
+                st.caption("함수별 (캐시 없이 실제 실행된 것만)")
+                st.dataframe([{'함수': name, **c} for name, c in summary['calls'].items()], hide_index=True)
+
+        history = st.session_state.get('rerun_metrics', [])
+        if history:
+            st.caption("최근 실행")
+            st.dataframe(
+                [{'실행': h['label'], 'reads': h['reads'], 'writes': h['writes'], 'ms': h['ms']} for h in reversed(history)],
+                hide_index=True
+            )
+
+@st.fragment
+@metered("대시보드", on_finish=remember_rerun_metrics)
+def dashboard_section(guild_id):
+    # 데이터: 길드원 명단 + 전투력 변화량 문서 1개 (+ 길드원을 고르면 그 멤버의 월간 기록)
+    st.header("길드 현황판")
+    df = get_guild_members(guild_id)
+    if not df.empty:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("총 길드원", f"{len(df)}명")
+        total_cp = df['cp'].sum()
+        col2.metric("총 전투력", f"{total_cp:,.0f}억")
+        avg_cp = total_cp / len(df)
+        col3.metric("평균 전투력", f"{avg_cp:,.1f}억")
+        st.divider()
+        if 'role' in df.columns:
+            role_counts = df['role'].value_counts().reset_index()
+            role_counts.columns = ['직책', '인원']
+            st.bar_chart(role_counts.set_index('직책'))
+        st.divider()
+        cp_growth_chart(guild_id, df)
+    else:
+        st.info("아직 등록된 길드원이 없습니다.")
+
+def cp_growth_chart(guild_id, members_df):
+    # 대시보드: 길드 전투력 성장 그래프 + 길드원별 전투력 기록 (둘 다 고른 단위로 줄인 값)
+    import pandas as pd
+    st.subheader("📈 전투력 성장")
+    res_label = st.radio("단위", list(CP_GROWTH_RESOLUTIONS), index=1, horizontal=True, key="cp_growth_resolution")
+    resolution, count, unit = CP_GROWTH_RESOLUTIONS[res_label]
+    today = datetime.now().date()
+
+    growth = cp_growth_frame(guild_id, members_df, resolution, count, today)
+    # 변화량은 길드원이 있던 첫 기간부터 (기간 중에 만든 길드면 0명인 기간은 빼고 비교)
+    started = growth[growth['members'] > 0]
+    first, last = (started if not started.empty else growth).iloc[0], growth.iloc[-1]
+    first_avg = first['cp_total'] / first['members'] if first['members'] else 0.0
+    last_avg = last['cp_total'] / last['members'] if last['members'] else 0.0
+    col1, col2 = st.columns(2)
+    col1.metric(f"총 전투력 (최근 {count}{unit})", f"{last['cp_total']:,.0f}억",
+                f"{last['cp_total'] - first['cp_total']:+,.1f}억")
+    col2.metric(f"평균 전투력 (최근 {count}{unit})", f"{last_avg:,.1f}억", f"{last_avg - first_avg:+,.1f}억")
+    st.line_chart(growth.rename(columns={'label': '기간', 'cp_total': '총 전투력'}), x='기간', y='총 전투력')
+    st.caption("전투력 기록은 이 기능을 쓰기 시작한 뒤 저장한 전투력부터 쌓입니다.")
+
+    with st.expander("길드원별 전투력 기록"):
+        names = dict(zip(members_df['id'], members_df['name']))
+        mem_id = st.selectbox("길드원", list(names), index=None, format_func=names.get,
+                              placeholder="길드원을 선택하세요", key="cp_history_member")
+        if mem_id is None or mem_id not in names:
+            return
+        current_cp = to_native(members_df.loc[members_df['id'] == mem_id, 'cp'].iloc[0])
+        months = recent_buckets('month', CP_HISTORY_MONTHS, today)
+        points = fetch_member_cp_history(guild_id, mem_id, months[0], months[-1], current_cp)
+        if not points:
+            st.info("아직 전투력 기록이 없습니다. 전투력을 수정하면 그때부터 쌓입니다.")
+            return
+        history = pd.DataFrame(downsample_points(points, resolution), columns=['기간', '전투력'])
+        st.line_chart(history, x='기간', y='전투력')
+        st.caption(f"최근 {CP_HISTORY_MONTHS}개월 기록 {len(points)}건 · {res_label} 단위로 기간마다 마지막 값")
+
+@st.fragment
+@metered("활동 점수", on_finish=remember_rerun_metrics)
+def activity_section(guild_id):
+    # 데이터: 활동 점수 상태 문서 1개 + 길드원 명단
+    st.header("🔥 길드원 활동 점수")
+    members_df = get_guild_members(guild_id)
+    if members_df.empty:
+        return
+    state = fetch_activity(guild_id)
+    # built 표시가 없으면 점수가 일부 쌓여 있어도 도입 전 기록이 빠져 있으므로 다시 만들기를 권함
+    if not state.get('built'):
+        st.warning("활동 점수 기능 이전의 기록이 아직 점수에 들어가지 않았습니다. 한 번 만들어 주세요.")
+        if st.button("🔄 기존 기록으로 활동 점수 만들기"):
+            with st.spinner("계산 중..."):
+                rebuilt = rebuild_activity(guild_id)
+            if rebuilt is None:
+                st.warning(REBUILD_BUSY_MESSAGE)
+            else:
+                st.toast(f"길드원 {rebuilt}명의 활동 점수 생성 완료", icon="🔥")
+                st.rerun()
+    if not state.get('members'):
+        st.info("아직 활동 점수가 없습니다. 일일 기록을 저장하면 자동으로 쌓입니다.")
+        return
+
+    table = activity_table(members_df, state, datetime.now().date())
+    warn_days = st.slider("미활동 경고 기준 (일)", min_value=1, max_value=14, value=INACTIVE_WARNING_DAYS,
+                          key="inactive_warning_days")
+    inactive = table[table['inactive_days'].isna() | (table['inactive_days'] >= warn_days)]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("최근 7일 활동", f"{int((table['inactive_days'] < 7).sum())}명")
+    col2.metric(f"{warn_days}일 이상 미활동", f"{len(inactive)}명")
+    col3.metric("평균 활동 점수", f"{table['score'].mean():.0f}점")
+
+    columns = {
+        'name': '닉네임', 'role': '직책', 'score': '활동 점수', 'streak': '연속 활동',
+        'last_active': '마지막 활동', 'inactive_days': '미활동(일)', 'recent_active': '최근 30일',
+    }
+    column_config = {'활동 점수': st.column_config.ProgressColumn(min_value=0, max_value=100, format="%.0f")}
+    if not inactive.empty:
+        st.warning(f"⚠️ {warn_days}일 이상 활동이 없는 길드원 {len(inactive)}명")
+        st.dataframe(
+            inactive.sort_values('inactive_days', ascending=False, na_position='first')[list(columns)].rename(columns=columns),
+            hide_index=True, column_config=column_config,
+        )
+    with st.expander("전체 길드원 활동 점수"):
+        st.dataframe(
+            table.sort_values('score', ascending=False)[list(columns)].rename(columns=columns),
+            hide_index=True, column_config=column_config,
+        )
+    st.caption(f"활동 점수: 기록이 있는 날마다 1점, {ACTIVITY_HALF_LIFE_DAYS}일마다 절반으로 줄어듦 (매일 활동하면 100점)")
+
+@st.fragment
+@metered("랭킹", on_finish=remember_rerun_metrics)
+def leaderboard_section(guild_id):
+    # 데이터: 길드 간 랭킹 요약 문서 (모든 길드 공용, 캐시됨)
+    st.header("🏆 길드 랭킹")
+    col_week, col_metric = st.columns(2)
+    week = col_week.radio("주간", ["이번 주", "지난 주"], horizontal=True, key="leaderboard_week")
+    metric_label = col_metric.selectbox("순위 기준", list(LEADERBOARD_METRICS), key="leaderboard_metric")
+
+    import pandas as pd
+    week_label = leaderboard_week_label(week, datetime.now().date())
+    summary = fetch_leaderboard(week_label)
+    max_age = timedelta(minutes=LEADERBOARD_REFRESH_MINUTES)
+    if is_stale(summary, max_age):
+        # 다른 세션이 만드는 중이면 끝날 때까지 기다렸다가 그 결과를 씀
+        with st.spinner("길드 랭킹 집계 중..."):
+            summary = refresh_leaderboard(get_store(), week_label, max_age)
+        fetch_leaderboard.clear(week_label)
+
+    board = pd.DataFrame(summary['guilds'], columns=LEADERBOARD_COLUMNS)
+    computed_at = summary['computed_at']
+    if board.empty:
+        st.info("아직 랭킹을 만들 길드가 없습니다.")
+        return
+
+    column = LEADERBOARD_METRICS[metric_label]
+    board = board.sort_values(column, ascending=False, ignore_index=True)
+    board.insert(0, 'rank', range(1, len(board) + 1))
+    mine = board[board['guild_id'] == guild_id]
+    if not mine.empty:
+        st.metric(f"우리 길드 순위 ({metric_label})", f"{int(mine['rank'].iloc[0])}위 / {len(board)}개 길드")
+
+    st.dataframe(
+        board.head(LEADERBOARD_TOP)[['rank', 'name', 'members', 'cp_total', 'cp_avg', 'donations', 'sage_dmg']]
+        .rename(columns={'rank': '순위', 'name': '길드', 'members': '인원', 'cp_total': '총 전투력',
+                         'cp_avg': '평균 전투력', 'donations': '주간 기부', 'sage_dmg': '주간 현자 피해량'}),
+        hide_index=True,
+        column_config={'평균 전투력': st.column_config.NumberColumn(format="%.1f")},
+    )
+    computed = datetime.fromisoformat(computed_at).astimezone().strftime("%m-%d %H:%M")
+    st.caption(f"{week_label} 기준 · 집계 시각 {computed} · {LEADERBOARD_REFRESH_MINUTES}분마다 갱신")
+
+@st.fragment
+@metered("멤버 관리", on_finish=remember_rerun_metrics)
+def member_editor_section(guild_id):
+    # 데이터: 길드원 명단 (저장/등록/삭제 후에는 대시보드도 바뀌므로 앱 전체 rerun)
+    df = get_guild_members(guild_id)
+    st.header("👥 길드원 명부 관리")
+
+    # 1. 신규 등록 (접기/펼치기)
+    with st.expander("➕ 신규 멤버 등록하기 (클릭)", expanded=False):
+        with st.form("add_member_form"):
+            c1, c2, c3 = st.columns(3)
+            new_name = c1.text_input("닉네임")
+            new_cp = c2.number_input("전투력 (단위: 억)", min_value=0.0, step=0.1, format="%.1f") 
+            role_options = ["(선택 안 함)", "길드장", "부길드장", "정예"]
+            new_role = c3.selectbox("직책", role_options)
+
+            if st.form_submit_button("신규 등록"):
+                if new_name:
+                    success, msg = add_update_member(guild_id, new_name, new_cp, new_role)
+                    if success:
+                        st.success(f"{new_name} 등록 완료!")
+                        time.sleep(0.5)
+                        st.rerun()
+                    else:
+                        st.error(msg)
+                else:
+                    st.warning("닉네임을 입력하세요.")
+
+    # [새로 추가] 엑셀/CSV 명단 일괄 등록
+    with st.expander("📥 엑셀/CSV 명단 한 번에 등록", expanded=False):
+        st.caption("첫 줄에 닉네임(이름)·전투력 열 제목이 있어야 합니다. (직책 열은 선택) "
+                   "이미 있는 닉네임은 새로 만들지 않고 전투력/직책만 수정합니다.")
+        roster_file = st.file_uploader("투력표 파일", type=["xlsx", "csv"], key="roster_upload")
+        if roster_file is not None:
+            rows, warnings = parse_roster_file(roster_file.name, roster_file.getvalue())
+            plan = plan_roster_import(df, rows)
+            st.write(f"신규 **{plan['new']}**명 / 수정 **{plan['updated']}**명 / 변경 없음 {plan['unchanged']}명")
+            for warning in warnings[:10]:
+                st.warning(warning)
+            if len(warnings) > 10:
+                st.caption(f"… 경고 {len(warnings) - 10}건 더 있음")
+
+            if plan['error']:
+                st.error(plan['error'])
+            elif plan['upserts'] and st.button("📥 일괄 저장", type="primary", key="btn_roster_import"):
+                with st.spinner("명단 저장 중..."):
+                    success, msg = import_roster(guild_id, plan)
+                if success:
+                    st.success(msg)
+                    time.sleep(1)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
+    st.divider()
+
+    # 2. 조회 및 빠른 수정 (핵심 기능!)
+    st.subheader("📋 멤버 목록 (엑셀처럼 수정 가능)")
+
+    if not df.empty:
+        st.info("💡 닉네임, 전투력, 직책을 더블클릭해서 수정한 뒤, 아래 [저장] 버튼을 꼭 눌러주세요!")
+
+        # 데이터 에디터 (수정 모드)
+        edited_df = st.data_editor(
+            df[['name', 'cp', 'role', 'id']],
+            column_config={
+                "name": "닉네임",
+                "cp": st.column_config.NumberColumn("전투력 (억)", format="%.1f억", min_value=0.0),
+                "role": st.column_config.SelectboxColumn("직책", options=["길드장", "부길드장", "정예", "일반"], required=False),
+                "id": st.column_config.TextColumn("ID (시스템용)", disabled=True) # ID는 수정 불가
+            },
+            hide_index=True,
+            use_container_width=True,
+            num_rows="fixed", # 행 추가/삭제는 위아래 별도 버튼으로 관리
+            key="member_editor"
+        )
+
+        # [핵심] 수정사항 일괄 저장 버튼
+        col_save, col_del = st.columns([1, 1])
+
+        with col_save:
+            if st.button("💾 수정사항 저장", type="primary", use_container_width=True):
+                with st.spinner("데이터베이스 업데이트 중..."):
+                    # 불러온 명단과 비교해서 바뀐 칸만 한 번에(batch) 저장
+                    success, msg = save_member_edits(guild_id, df, edited_df)
+                if success is None:
+                    st.info(msg)  # 저장한 것이 없으므로 다시 불러올 필요도 없음
+                elif success:
+                    st.success(msg)
+                    time.sleep(1)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
+        # 3. 삭제 기능
+        with col_del:
+            with st.popover("🗑️ 멤버 삭제하기", use_container_width=True):
+                st.write("삭제할 멤버를 선택하세요 (복구 불가)")
+                del_target = st.selectbox("삭제 대상", df['name'].tolist(), key="del_select")
+
+                if st.button("🚨 영구 삭제", type="primary"):
+                    mem_id = df[df['name'] == del_target]['id'].values[0]
+                    delete_member(guild_id, mem_id)
+                    st.warning(f"{del_target} 님이 삭제되었습니다.")
+                    time.sleep(1)
+                    st.rerun()
+    else:
+        st.info("등록된 길드원이 없습니다. 위에서 등록해주세요.")
+
+@st.fragment
+@metered("일일 기록", on_finish=remember_rerun_metrics)
+def daily_record_section(guild_id):
+    # 데이터: 길드원 명단 + 선택한 날짜의 기록 + 스캔 결과(세션)
+    st.header("📝 일일 활동 기록")
+
+    col_date, col_upload = st.columns([1, 2])
+    selected_date = col_date.date_input("날짜 선택", datetime.now(), key="daily_date")
+    date_str = selected_date.strftime("%Y-%m-%d")
+
+    # 스캔 데이터 세션 초기화
+    if 'scan_data' not in st.session_state: st.session_state['scan_data'] = {}
+    if 'scan_mode' not in st.session_state: st.session_state['scan_mode'] = None
+
+    # 날짜 선택 옆(오른쪽) 공간에 업로드 기능을 넣습니다.
+    with col_upload:
+        st.info("👇 스크린샷 종류에 맞는 탭을 선택해주세요.")
+        
+        # 여기서 작은 탭 2개를 또 만듭니다.
+        sub_tab1, sub_tab2 = st.tabs(["💰 기부 내역", "🔥 현자 도전"])
+
+        # [작은 탭 1] 기부 내역 올리는 곳
+        with sub_tab1:
+            # 하루치 기부 내역은 한 화면에 안 들어가므로 스크롤하며 찍은 여러 장을 한 번에 올립니다.
+            uploaded_dons = st.file_uploader("기부 스샷 (여러 장 선택 가능)", type=['png', 'jpg'], key="up_don", accept_multiple_files=True)
+            if uploaded_dons and st.button("기부 분석", key="btn_don", type="primary"):
+                queue_scan(uploaded_dons, "donation")
+
+        # [작은 탭 2] 현자 도전 올리는 곳
+        with sub_tab2:
+            uploaded_sage = st.file_uploader("현자 스샷", type=['png', 'jpg'], key="up_sage")
+            if uploaded_sage and st.button("현자 분석", key="btn_sage", type="primary"):
+                queue_scan([uploaded_sage], "sage")
+
+        # 작업자 풀에서 분석 중이면 1초마다 상태 확인, 끝나면 결과 표시
+        if st.session_state.get('ocr_job'):
+            ocr_job_status()
+        show_scan_result()
+
+    # 1. 데이터 입력 표 (Data Editor)
+    members_df = get_guild_members(guild_id)
+    if members_df.empty:
+        st.warning("먼저 [멤버 관리] 탭에서 길드원을 등록해주세요.")
+    else:
+        # 표를 고치는 동안에는 처음 불러온 기록을 고정해서 씀 (저장할 때 바뀐 칸/충돌 판단 기준)
+        # 고친 칸이 없으면 매번 최신 기록으로 바꿉니다.
+        loaded = st.session_state.get('daily_base')
+        if loaded is None or loaded['date'] != date_str or not has_unsaved_edits((daily_editor_key(),)):
+            loaded = {'date': date_str, 'record': get_daily_data(guild_id, date_str)}
+            st.session_state['daily_base'] = loaded
+        daily_record = loaded['record']
+        # 스캔 데이터 준비
+        scanned = st.session_state['scan_data']
+        mode = st.session_state['scan_mode']
+        matches, unmatched = None, []
+        if mode == "donation":
+            # OCR 닉네임을 명단 닉네임에 퍼지 매칭 (자모 누락/기호 오인식 보정)
+            name_index = get_name_index(guild_id, tuple(members_df['name'].astype(str)))
+            scanned, matches, unmatched = resolve_scanned_names(scanned, name_index)
+        record_df = build_record_grid(members_df, daily_record, scanned, mode, matches)
+
+        # 안내 메시지
+        if mode == "sage":
+            st.info(f"💡 현자 스캔 결과: 피해량 **{scanned['dmg']}억** / 격퇴 **{scanned['kill']}회** (해당하는 멤버에게 입력해주세요)")
+        elif mode == "donation":
+            st.info("💡 기부 내역이 닉네임에 맞춰 자동으로 입력되었습니다. (맞는지 확인 후 저장하세요)")
+            if any(score < MATCH_CONFIDENT for _, score in matches.values()):
+                st.warning("⚠️ 표시된 멤버는 닉네임이 정확히 일치하지 않아 추정으로 입력되었습니다. 꼭 확인해주세요.")
+            if unmatched:
+                st.warning(f"❓ 명단에서 찾지 못한 닉네임: {', '.join(unmatched)} (직접 입력해주세요)")
+
+        # 표 출력
+        edited_record = st.data_editor(
+            record_df,
+            column_config={
+                "id": None,
+                "name": st.column_config.TextColumn("닉네임", disabled=True),
+                "don_basic": st.column_config.NumberColumn("기부(초급)", min_value=0, max_value=10, step=1),
+                "don_inter": st.column_config.NumberColumn("기부(중급)", min_value=0, max_value=5, step=1),
+                "don_adv": st.column_config.NumberColumn("기부(고급)", min_value=0, max_value=5, step=1),
+                "don_item": st.column_config.NumberColumn("기부(템)", min_value=0, max_value=10, step=1),
+                "sage_dmg": st.column_config.NumberColumn("🔥 피해량(억)", format="%.1f"),
+                "sage_kill": st.column_config.NumberColumn("☠️ 격퇴", step=1),
+                "scan_match": st.column_config.TextColumn("스캔 매칭", disabled=True),
+            },
+            hide_index=True,
+            use_container_width=True,
+            height=500,
+            key=daily_editor_key()
+        )
+
+        if st.button("💾 기록 저장", type="primary", use_container_width=True):
+            # 불러온 기록과 달라진 칸만 저장 (다른 운영진이 같은 날짜에 입력한 칸은 건드리지 않음)
+            changes, base = diff_record_grid(daily_record, edited_record)
+            if not changes:
+                st.toast("바뀐 칸이 없습니다.", icon="ℹ️")
+            else:
+                conflicts = save_daily_data(guild_id, date_str, changes, base=base)
+                saved = sum(len(f) for f in changes.values()) - sum(len(f) for f in conflicts.values())
+                st.session_state['daily_saved'] = f"✅ {date_str} 기록 저장 완료! ({saved}칸)"
+                if conflicts:
+                    st.session_state['daily_conflicts'] = {
+                        'date': date_str,
+                        'theirs': conflicts,
+                        'mine': {m: {f: changes[m][f] for f in fields} for m, fields in conflicts.items()},
+                    }
+                # 고친 내용을 비우고 저장된 기록(다른 운영진 입력 포함)으로 표를 다시 그림
+                st.session_state['daily_base'] = None
+                st.session_state['daily_editor_rev'] = st.session_state.get('daily_editor_rev', 0) + 1
+                st.rerun()
+
+        if st.session_state.get('daily_saved'):
+            st.success(st.session_state.pop('daily_saved'))
+        daily_conflict_notice(guild_id, date_str, members_df)
+
+# [새로 추가] OCR 스캔 작업 넣기/상태 확인 (분석은 작업자 프로세스에서, 화면은 기다리지 않음)
+def queue_scan(image_files, scan_mode):
+    try:
+        with st.spinner("분석 준비 중..."):
+            job = start_scan(image_files, scan_mode)
+            status = poll_scan(job)
+    except QueueFull:
+        st.warning("⏳ 지금 분석을 기다리는 스캔이 많습니다. 잠시 후 다시 눌러주세요.")
+        return
+    except Exception as e:
+        st.error(f"오류 발생: {e}")
+        return
+    if status['state'] == 'done':
+        apply_scan_result(scan_mode, status)  # 캐시에 있었거나 서버 안에서 바로 끝남
+    else:
+        st.session_state['ocr_job'] = job
+
+@st.fragment(run_every=OCR_POLL_SECONDS)
+def ocr_job_status():
+    job = st.session_state.get('ocr_job')
+    if not job:
+        return
+    status = poll_scan(job)
+    if status['state'] == 'queued':
+        st.info(f"⏳ 분석 대기 중... (앞에 {status['ahead']}건)")
+    elif status['state'] == 'running':
+        st.info(f"🔄 분석 중... ({status['elapsed']:.0f}초)")
+    else:
+        st.session_state['ocr_job'] = None
+        apply_scan_result(job['mode'], status)
+        st.rerun(scope="app")  # 결과를 일일 기록 표에 채우기
+
+def apply_scan_result(scan_mode, status):
+    rtype, rdata, rmsg = status['result']
+    st.session_state['scan_result'] = {'type': rtype, 'data': rdata, 'message': rmsg, 'texts': status['texts']}
+    if rtype == scan_mode:
+        st.session_state['scan_mode'] = rtype
+        st.session_state['scan_data'] = rdata
+
+def show_scan_result():
+    # 분석이 끝난 직후 한 번만 표시
+    result = st.session_state.pop('scan_result', None)
+    if not result:
+        return
+    for text in result['texts']:
+        st.write("🔍 [OCR 인식 결과]:", text)
+    if result['type'] == "donation":
+        st.success(f"성공! {result['message']} - {len(result['data'])}명 발견")
+        st.json(result['data'])
+    elif result['type'] == "sage":
+        st.success(f"피해량: {result['data']['dmg']}")
+    else:
+        st.error(result['message'])
+
+def daily_editor_key():
+    # 저장할 때마다 키를 바꿔서 표의 고친 내용을 비움
+    return f"daily_editor_{st.session_state.get('daily_editor_rev', 0)}"
+
+def daily_conflict_notice(guild_id, date_str, members_df):
+    # 내가 고치는 사이 다른 운영진이 먼저 저장한 칸: 저장하지 않고 어느 값을 쓸지 물어봄
+    pending = st.session_state.get('daily_conflicts')
+    if not pending or pending['date'] != date_str:
+        return
+    names = dict(zip(members_df['id'], members_df['name']))
+    st.warning("⚠️ 다른 운영진이 먼저 고친 칸이 있어 저장하지 않았습니다. 어느 값을 쓸지 골라주세요.")
+    st.dataframe(
+        [{'닉네임': names.get(mem_id, mem_id), '항목': RECORD_FIELD_LABELS.get(field, field),
+          '저장된 값': theirs, '내 값': pending['mine'][mem_id][field]}
+         for mem_id, fields in pending['theirs'].items() for field, theirs in fields.items()],
+        hide_index=True,
+    )
+    col_mine, col_theirs = st.columns(2)
+    if col_mine.button("내 값으로 덮어쓰기", key="btn_conflict_mine"):
+        save_daily_data(guild_id, date_str, pending['mine'])
+        st.session_state['daily_conflicts'] = None
+        st.rerun()
+    if col_theirs.button("저장된 값 유지", key="btn_conflict_theirs"):
+        st.session_state['daily_conflicts'] = None
+        st.rerun()
+
+# 분석 그래프 기본 기간 (최근 N주 / N개월)
+ANALYSIS_DEFAULT_COUNT = {'week': 4, 'month': 3}
+
+@st.fragment
+@metered("분석", on_finish=remember_rerun_metrics)
+def analysis_section(guild_id):
+    # 데이터: 주간/월간 집계 문서 또는 기록 보관함 + 길드원 명단(이름 표시용)
+    import pandas as pd
+    members_df = get_guild_members(guild_id)
+
+    # 2. 분석 그래프 섹션 (주간/월간 집계 문서 기반)
+    st.header("📈 활동 분석 그래프")
+
+    col_unit, col_count = st.columns(2)
+    analysis_unit = col_unit.radio("분석 단위", ["주간", "월간", "기간 지정"], horizontal=True, key="analysis_unit")
+    if analysis_unit == "주간":
+        period, unit_label = 'week', "주"
+        period_count = col_count.slider("기간 (최근 N주)", min_value=1, max_value=52,
+                                        value=ANALYSIS_DEFAULT_COUNT['week'], key="analysis_weeks")
+    elif analysis_unit == "월간":
+        period, unit_label = 'month', "월"
+        period_count = col_count.slider("기간 (최근 N개월)", min_value=1, max_value=12,
+                                        value=ANALYSIS_DEFAULT_COUNT['month'], key="analysis_months")
+    else:
+        # 기간 지정: 짧은 기간은 DB 범위 조회, 긴 기간(시즌 전체, 1년 추이 등)은 월별 Parquet 보관함에서 조회
+        today = datetime.now().date()
+        date_range = col_count.date_input("기간", value=(today - timedelta(days=89), today), max_value=today)
+        if len(date_range) != 2:
+            st.info("시작일과 종료일을 선택하세요.")
+            return
+
+    if analysis_unit == "기간 지정":
+        period_df, unit_label = load_custom_period(guild_id, *date_range)
+        manifest = get_archive().load_manifest(guild_id)
+        st.caption(f"📦 기록 보관함: {len(get_archive().months(guild_id))}개월 · 마지막 동기화 {manifest.get('synced_at', '-')}")
+    else:
+        period_df = fetch_rollups(guild_id, period, period_count, datetime.now().date())
+
+    # 집계 완료 표시가 없으면 그래프에 빈 곳이 없어도 다시 만들기를 권함 (이전 기록이 일부만 집계됐을 수 있음)
+    rollups_built = analysis_unit == "기간 지정" or fetch_rollups_built(guild_id)
+    if not rollups_built:
+        st.warning("집계 기능 이전의 기록이 아직 주간/월간 집계에 들어가지 않았습니다. 한 번 다시 만들어 주세요.")
+
+    if period_df.empty:
+        st.info("데이터가 없습니다.")
+        if analysis_unit == "기간 지정":
+            if st.button("🔄 보관함 전체 다시 만들기"):
+                sync_archive.clear(guild_id)
+                sync_archive(guild_id, full=True)
+                st.rerun()
+    if analysis_unit != "기간 지정" and (not rollups_built or period_df.empty):
+        if st.button("🔄 기존 기록으로 집계 다시 만들기"):
+            with st.spinner("집계 중..."):
+                rebuilt = rebuild_rollups(guild_id)
+            if rebuilt is None:
+                st.warning(REBUILD_BUSY_MESSAGE)
+            else:
+                st.toast(f"집계 문서 {rebuilt}개 생성 완료", icon="📈")
+                st.rerun()
+    if not period_df.empty:
+        merged_df = pd.merge(period_df, members_df[['id', 'name']], left_on='member_id', right_on='id', how='left')
+
+        anal_tab1, anal_tab2 = st.tabs(["🔥 현자 도전", "💰 기부 현황"])
+
+        with anal_tab1:
+            st.subheader(f"{unit_label}별 현자 피해량 추이")
+            chart_data = merged_df[['label', 'name', 'sage_dmg']].rename(columns={'label': '기간', 'sage_dmg': '피해량'})
+            st.line_chart(chart_data, x='기간', y='피해량', color='name')
+
+        with anal_tab2:
+            st.subheader("기간 내 총 기부")
+            donation_sum = merged_df.groupby('name')[['don_basic', 'don_inter', 'don_adv', 'don_item']].sum().reset_index()
+            donation_melted = donation_sum.melt('name', var_name='기부유형', value_name='횟수')
+
+            import altair as alt
+            chart = alt.Chart(donation_melted).mark_bar().encode(
+                x='name', y='횟수', color='기부유형', tooltip=['name', '기부유형', '횟수']
+            ).interactive()
+            st.altair_chart(chart, use_container_width=True)
+
+
+# [새로 추가] 실시간 반영: 몇 초마다 공유 사본의 버전만 확인 (DB 읽기 없음)
+# 다른 운영진이 명단/오늘 기록을 바꾸면 앱을 다시 그립니다. 단, 표를 고치는 중이면
+# 입력한 내용이 날아가지 않도록 알림만 표시합니다.
+def has_unsaved_edits(keys=None):
+    for key in keys or ("member_editor", daily_editor_key()):
+        state = st.session_state.get(key) or {}
+        if state.get("edited_rows") or state.get("added_rows") or state.get("deleted_rows"):
+            return True
+    return False
+
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def live_sync_section(guild_id):
+    hub = get_live_hub()
+    if hub is None:
+        return
+    hub.touch(guild_id, live_session_id(), datetime.now().strftime("%Y-%m-%d"))
+    # 이 세션이 저장한 변경은 빼고 셈 (다른 운영진의 변경만 다시 그리기)
+    version = hub.version(guild_id, live_session_id())
+    if version != st.session_state.get('live_version'):
+        if has_unsaved_edits():
+            st.caption("🔄 다른 운영진이 수정한 내용이 있습니다. 저장하면 최신 내용으로 다시 불러옵니다.")
+            return
+        st.rerun(scope="app")
+    st.caption(f"🟢 실시간 동기화 중 · 접속 중인 운영진 {hub.session_count(guild_id)}명")
+
+# --- 7. 메인 애플리케이션 로직 ---
+# [새로 추가] 첫 화면 미리 읽기
+# 구역마다 읽는 데이터(명단, 선택한 날짜 기록, 활동 점수, 분석 집계, 랭킹)는 서로 관계가 없으므로
+# 구역을 그리기 전에 스레드 풀에서 동시에 읽어 각 헬퍼의 캐시를 채워 둡니다.
+# 구역들은 같은 헬퍼를 그대로 호출해서 캐시된 결과를 받으므로, 첫 화면까지 걸리는 시간은
+# 읽기 시간의 합이 아니라 가장 느린 읽기 하나만큼이 됩니다. (캐시가 차 있으면 거의 0)
+PREFETCH_WORKERS = 8
+
+@st.cache_resource
+def get_prefetch_pool():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+def _prefetch_job(ctx, label, func, *args):
+    # 미리 읽기 스레드에서 실행: 세션 컨텍스트를 붙이고(캐시 사용), 읽기/쓰기 수는 따로 모아서 반환
+    from streamlit.runtime.scriptrunner import add_script_run_ctx
+    add_script_run_ctx(threading.current_thread(), ctx)
+    with worker_scope(label) as meter:
+        func(*args)
+    return meter
+
+def prefetch_main_data(guild_id):
+    """
+    main_app 의 구역들이 읽을 데이터를 동시에 읽고, 모두 끝날 때까지 기다림
+    위젯 값(날짜, 분석 단위, 랭킹 주간)은 세션에 남은 값 기준 (처음엔 기본값)
+    실패한 읽기는 무시합니다. (해당 구역이 다시 읽으면서 그 자리에 오류를 표시)
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    today = datetime.now().date()
+    today_str = today.strftime("%Y-%m-%d")
+    daily_date = st.session_state.get('daily_date') or today
+    hub = get_live_hub()
+    session_id = live_session_id()
+
+    def from_live(func, *args):
+        # 실시간 공유 사본이 있으면 첫 스냅샷을 기다렸다가 씀 (준비되지 않으면 DB에서 읽음)
+        if hub is not None:
+            hub.touch(guild_id, session_id, today_str)
+        func(*args)
+
+    jobs = [
+        ("명단", from_live, get_guild_members, guild_id),
+        ("일일 기록", from_live, get_daily_data, guild_id, daily_date.strftime("%Y-%m-%d")),
+        ("활동 점수", fetch_activity, guild_id),
+        ("랭킹", fetch_leaderboard, leaderboard_week_label(st.session_state.get('leaderboard_week', "이번 주"), today)),
+    ]
+    period = {"주간": 'week', "월간": 'month'}.get(st.session_state.get('analysis_unit', "주간"))
+    if period is not None:
+        count = st.session_state.get(f"analysis_{period}s", ANALYSIS_DEFAULT_COUNT[period])
+        jobs.append(("분석 집계", fetch_rollups, guild_id, period, count, today))
+        jobs.append(("집계 완료 표시", fetch_rollups_built, guild_id))
+
+    ctx = get_script_run_ctx()
+    pool = get_prefetch_pool()
+    futures = [pool.submit(_prefetch_job, ctx, *job) for job in jobs]
+    meter = current_meter()
+    for (label, *_), future in zip(jobs, futures):
+        try:
+            worker_meter = future.result()
+        except Exception as e:
+            metrics_logger.warning("미리 읽기 실패 (%s): %s", label, e)
+            continue
+        if meter is not None:
+            meter.merge(worker_meter)
+
 def main_app():
 
 #테마 설정 상관없이 무조건 밝은색 화면으로 고정
@@ -361,289 +2052,61 @@ def main_app():
     """, unsafe_allow_html=True)
 
 
+    # 일일 숙제 탭을 열기 전에 OCR 모델이 준비되도록 미리 시작
+    start_ocr_warmup()
+
+    guild_id = st.session_state['guild_id']
+
+    # 구역들이 읽을 데이터를 먼저 동시에 읽어 둠
+    # (실시간 공유 사본 참여도 여기서: 길드당 감시 1개, 첫 세션이 열고 마지막 세션이 떠나면 닫힘)
+    with rerun_scope("미리 읽기"):
+        prefetch_main_data(guild_id)
+    hub = get_live_hub()
+    if hub is not None:
+        st.session_state['live_version'] = hub.version(guild_id, live_session_id())
+
     st.title(f"🏰 {st.session_state['guild_name']} 관리 시스템")
+    live_sync_section(guild_id)
     
     # 상단 메뉴
     tab1, tab2, tab3 = st.tabs(["📊 대시보드", "👥 멤버 관리", "📅 일일 숙제 & 분석"])
 
-    # --- TAB 1: 대시보드 (기존과 동일) ---
+    # --- TAB 1: 대시보드 ---
     with tab1:
-        st.header("길드 현황판")
-        df = get_guild_members(st.session_state['guild_id'])
-        if not df.empty:
-            col1, col2, col3 = st.columns(3)
-            col1.metric("총 길드원", f"{len(df)}명")
-            total_cp = df['cp'].sum()
-            col2.metric("총 전투력", f"{total_cp:,.0f}억")
-            avg_cp = total_cp / len(df)
-            col3.metric("평균 전투력", f"{avg_cp:,.1f}억")
-            st.divider()
-            if 'role' in df.columns:
-                role_counts = df['role'].value_counts().reset_index()
-                role_counts.columns = ['직책', '인원']
-                st.bar_chart(role_counts.set_index('직책'))
-        else:
-            st.info("아직 등록된 길드원이 없습니다.")
+        dashboard_section(guild_id)
+        st.divider()
+        activity_section(guild_id)
+        st.divider()
+        leaderboard_section(guild_id)
 
     # --- TAB 2: 멤버 관리 (수정 및 삭제) ---
     with tab2:
-        st.header("👥 길드원 명부 관리")
-        
-        # 1. 신규 등록 (접기/펼치기)
-        with st.expander("➕ 신규 멤버 등록하기 (클릭)", expanded=False):
-            with st.form("add_member_form"):
-                c1, c2, c3 = st.columns(3)
-                new_name = c1.text_input("닉네임")
-                new_cp = c2.number_input("전투력 (단위: 억)", min_value=0.0, step=0.1, format="%.1f") 
-                role_options = ["(선택 안 함)", "길드장", "부길드장", "정예"]
-                new_role = c3.selectbox("직책", role_options)
-                
-                if st.form_submit_button("신규 등록"):
-                    if new_name:
-                        success, msg = add_update_member(st.session_state['guild_id'], new_name, new_cp, new_role)
-                        if success:
-                            st.success(f"{new_name} 등록 완료!")
-                            time.sleep(0.5)
-                            st.rerun()
-                        else:
-                            st.error(msg)
-                    else:
-                        st.warning("닉네임을 입력하세요.")
-
-        st.divider()
-
-        # 2. 조회 및 빠른 수정 (핵심 기능!)
-        st.subheader("📋 멤버 목록 (엑셀처럼 수정 가능)")
-        
-        if not df.empty:
-            st.info("💡 닉네임, 전투력, 직책을 더블클릭해서 수정한 뒤, 아래 [저장] 버튼을 꼭 눌러주세요!")
-            
-            # 데이터 에디터 (수정 모드)
-            edited_df = st.data_editor(
-                df[['name', 'cp', 'role', 'id']],
-                column_config={
-                    "name": "닉네임",
-                    "cp": st.column_config.NumberColumn("전투력 (억)", format="%.1f억", min_value=0.0),
-                    "role": st.column_config.SelectboxColumn("직책", options=["길드장", "부길드장", "정예", "일반"], required=False),
-                    "id": st.column_config.TextColumn("ID (시스템용)", disabled=True) # ID는 수정 불가
-                },
-                hide_index=True,
-                use_container_width=True,
-                num_rows="fixed", # 행 추가/삭제는 위아래 별도 버튼으로 관리
-                key="member_editor"
-            )
-
-            # [핵심] 수정사항 일괄 저장 버튼
-            col_save, col_del = st.columns([1, 1])
-            
-            with col_save:
-                if st.button("💾 수정사항 저장", type="primary", use_container_width=True):
-                    with st.spinner("데이터베이스 업데이트 중..."):
-                        # 변경된 데이터프레임을 한 줄씩 읽어서 DB 업데이트
-                        for index, row in edited_df.iterrows():
-                            # ID를 찾아가서 내용 덮어쓰기
-                            db.collection('guilds').document(st.session_state['guild_id']).collection('members').document(row['id']).update({
-                                'name': row['name'],
-                                'cp': row['cp'],
-                                'role': row['role'],
-                                'updated_at': firestore.SERVER_TIMESTAMP
-                            })
-                        st.success("✅ 모든 수정사항이 저장되었습니다!")
-                        time.sleep(1)
-                        st.rerun()
+        member_editor_section(guild_id)
 
-            # 3. 삭제 기능
-            with col_del:
-                with st.popover("🗑️ 멤버 삭제하기", use_container_width=True):
-                    st.write("삭제할 멤버를 선택하세요 (복구 불가)")
-                    del_target = st.selectbox("삭제 대상", df['name'].tolist(), key="del_select")
-                    
-                    if st.button("🚨 영구 삭제", type="primary"):
-                        mem_id = df[df['name'] == del_target]['id'].values[0]
-                        delete_member(st.session_state['guild_id'], mem_id)
-                        st.warning(f"{del_target} 님이 삭제되었습니다.")
-                        time.sleep(1)
-                        st.rerun()
-        else:
-            st.info("등록된 길드원이 없습니다. 위에서 등록해주세요.")
-
-# --- TAB 3: 일일 숙제 & 분석 (수정된 버전) ---
+    # --- TAB 3: 일일 숙제 & 분석 ---
     with tab3:
-        st.header("📝 일일 활동 기록")
-        
-        col_date, col_upload = st.columns([1, 2])
-        selected_date = col_date.date_input("날짜 선택", datetime.now())
-        date_str = selected_date.strftime("%Y-%m-%d")
-        
-        # 스캔 데이터 세션 초기화
-        if 'scan_data' not in st.session_state: st.session_state['scan_data'] = {}
-        if 'scan_mode' not in st.session_state: st.session_state['scan_mode'] = None
-        
-        # [지운 자리에 그대로 붙여넣으세요]
-    # 날짜 선택 옆(오른쪽) 공간에 업로드 기능을 넣습니다.
-    with col_upload:
-        st.info("👇 스크린샷 종류에 맞는 탭을 선택해주세요.")
-        
-        # 여기서 작은 탭 2개를 또 만듭니다.
-        sub_tab1, sub_tab2 = st.tabs(["💰 기부 내역", "🔥 현자 도전"])
-
-        # [작은 탭 1] 기부 내역 올리는 곳
-        with sub_tab1:
-            uploaded_don = st.file_uploader("기부 스샷", type=['png', 'jpg'], key="up_don")
-            if uploaded_don and st.button("기부 분석", key="btn_don", type="primary"):
-                with st.spinner("분석 중..."):
-                    # [주의] 함수를 꼭! 수정해야 이 코드가 작동합니다.
-                    rtype, rdata, rmsg = run_ocr_scan(uploaded_don, "donation")
-                    
-                    if rtype == "donation":
-                        st.success(f"성공! {len(rdata)}명 발견")
-                        st.json(rdata)
-                        st.session_state['scan_mode'] = 'donation'
-                        st.session_state['scan_data'] = rdata
-                    else:
-                        st.error(rmsg)
-
-        # [작은 탭 2] 현자 도전 올리는 곳
-        with sub_tab2:
-            uploaded_sage = st.file_uploader("현자 스샷", type=['png', 'jpg'], key="up_sage")
-            if uploaded_sage and st.button("현자 분석", key="btn_sage", type="primary"):
-                with st.spinner("분석 중..."):
-                    rtype, rdata, rmsg = run_ocr_scan(uploaded_sage, "sage")
-                    
-                    if rtype == "sage":
-                        st.success(f"피해량: {rdata['dmg']}")
-                        st.session_state['scan_mode'] = 'sage'
-                        st.session_state['scan_data'] = rdata
-                    else:
-                        st.error(rmsg)
-
+        daily_record_section(guild_id)
+        st.divider()
+        analysis_section(guild_id)
 
-        # 1. 데이터 입력 표 (Data Editor)
-        members_df = get_guild_members(st.session_state['guild_id'])
-        if members_df.empty:
-            st.warning("먼저 [멤버 관리] 탭에서 길드원을 등록해주세요.")
-        else:
-            daily_record = get_daily_data(st.session_state['guild_id'], date_str)
-            # 스캔 데이터 준비
-            scanned = st.session_state['scan_data']
-            mode = st.session_state['scan_mode']
-            display_data = []
-            for index, row in members_df.iterrows():
-                mem_id = row['id']
-                mem_name = row['name']
-                
-            
-                record = daily_record.get(mem_id, {})
-                
-                
-                # DB 값 가져오기
-                d_basic = record.get("don_basic", 0)
-                d_inter = record.get("don_inter", 0)
-                d_adv = record.get("don_adv", 0)
-                d_item = record.get("don_item", 0)
-                s_dmg = record.get("sage_dmg", 0.0)
-                s_kill = record.get("sage_kill", 0)
-                
-                # 자동 입력 로직 (기부)
-                if mode == "donation" and mem_name in scanned:
-                    user_scan = scanned[mem_name]
-                    if user_scan['basic'] > 0: d_basic = user_scan['basic']
-                    if user_scan['inter'] > 0: d_inter = user_scan['inter']
-                    if user_scan['adv'] > 0: d_adv = user_scan['adv']
-                    if user_scan['item'] > 0: d_item = user_scan['item']
-                
-                display_data.append({
-                    "id": mem_id,
-                    "name": mem_name,
-                    "don_basic": d_basic,
-                    "don_inter": d_inter,
-                    "don_adv": d_adv,
-                    "don_item": d_item,
-                    "sage_dmg": s_dmg,
-                    "sage_kill": s_kill
-                })
-            
-            # 안내 메시지
-            if mode == "sage":
-                st.info(f"💡 현자 스캔 결과: 피해량 **{scanned['dmg']}억** / 격퇴 **{scanned['kill']}회** (해당하는 멤버에게 입력해주세요)")
-            elif mode == "donation":
-                st.info("💡 기부 내역이 닉네임에 맞춰 자동으로 입력되었습니다. (맞는지 확인 후 저장하세요)")
-
-            record_df = pd.DataFrame(display_data)
-            
-            # 표 출력
-            edited_record = st.data_editor(
-                record_df,
-                column_config={
-                    "id": None,
-                    "name": st.column_config.TextColumn("닉네임", disabled=True),
-                    "don_basic": st.column_config.NumberColumn("기부(초급)", min_value=0, max_value=10, step=1),
-                    "don_inter": st.column_config.NumberColumn("기부(중급)", min_value=0, max_value=5, step=1),
-                    "don_adv": st.column_config.NumberColumn("기부(고급)", min_value=0, max_value=5, step=1),
-                    "don_item": st.column_config.NumberColumn("기부(템)", min_value=0, max_value=10, step=1),
-                    "sage_dmg": st.column_config.NumberColumn("🔥 피해량(억)", format="%.1f"),
-                    "sage_kill": st.column_config.NumberColumn("☠️ 격퇴", step=1),
-                },
-                hide_index=True,
-                use_container_width=True,
-                height=500
-            )
-            
-            if st.button("💾 기록 저장", type="primary", use_container_width=True):
-                data_to_save = {}
-                for index, row in edited_record.iterrows():
-                    data_to_save[row['id']] = {
-                        "don_basic": row['don_basic'],
-                        "don_inter": row['don_inter'],
-                        "don_adv": row['don_adv'],
-                        "don_item": row['don_item'],
-                        "sage_dmg": row['sage_dmg'],
-                        "sage_kill": row['sage_kill']
-                    }
-                save_daily_data(st.session_state['guild_id'], date_str, data_to_save)
-                st.toast(f"✅ {date_str} 기록 저장 완료!", icon="💾")
+# --- 실행 흐름 제어 ---
+if __name__ == "__main__":
+    # 한 번의 실행 동안의 문서 읽기/쓰기와 시간을 모아서 끝날 때 로그 한 줄로 남김
+    with rerun_scope("전체 실행", on_finish=remember_rerun_metrics):
+        setup_page()
+        get_store()
+        init_session_state()
 
-        st.divider()
-        
-        
+        show_debug = debug_enabled()
+        if show_debug:
+            debug_panel_slot = st.sidebar.container()
 
-        # 2. 분석 그래프 섹션 (기존 기능 유지)
-        st.header("📈 활동 분석 그래프")
-        
-        analysis_range = st.radio("분석 기간", ["최근 7일 (주간)", "최근 30일 (월간)"], horizontal=True)
-        days_to_subtract = 7 if analysis_range == "최근 7일 (주간)" else 30
-        
-        end_date_anal = datetime.now().date()
-        start_date_anal = end_date_anal - timedelta(days=days_to_subtract-1)
-        
-        period_df = fetch_period_records(st.session_state['guild_id'], start_date_anal, end_date_anal)
-        
-        if period_df.empty:
-            st.info("데이터가 없습니다.")
+        if st.session_state['is_logged_in']:
+            main_app()
         else:
-            merged_df = pd.merge(period_df, members_df[['id', 'name']], left_on='member_id', right_on='id', how='left')
-            
-            anal_tab1, anal_tab2 = st.tabs(["🔥 현자 도전", "💰 기부 현황"])
-            
-            with anal_tab1:
-                st.subheader("일별 현자 피해량 추이")
-                chart_data = merged_df[['date', 'name', 'sage_dmg']].rename(columns={'sage_dmg': '피해량'})
-                st.line_chart(chart_data, x='date', y='피해량', color='name')
-
-            with anal_tab2:
-                st.subheader("기간 내 총 기부")
-                donation_sum = merged_df.groupby('name')[['don_basic', 'don_inter', 'don_adv', 'don_item']].sum().reset_index()
-                donation_melted = donation_sum.melt('name', var_name='기부유형', value_name='횟수')
-                
-                import altair as alt
-                chart = alt.Chart(donation_melted).mark_bar().encode(
-                    x='name', y='횟수', color='기부유형', tooltip=['name', '기부유형', '횟수']
-                ).interactive()
-                st.altair_chart(chart, use_container_width=True)
+            login_ui()
 
-# --- 실행 흐름 제어 ---
-if __name__ == "__main__":
-    if st.session_state['is_logged_in']:
-        main_app()
-    else:
-        login_ui()
\ No newline at end of file
+        # 패널은 위쪽 자리에 그리되, 내용은 모든 구역이 실행된 뒤의 값으로 채움
+        if show_debug:
+            with debug_panel_slot:
+                debug_panel()
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+길드원 활동 점수 (연속 활동일, 감쇠 점수, N일째 미활동)
+
+일일 기록을 저장할 때마다(save_daily) 이 모듈로 활동 상태 문서 하나만 고칩니다.
+지난 기록을 다시 훑지 않습니다.
+
+상태 문서 guilds/{id}/stats/activity:
+    {'anchor': '2024-03-31',          # 기준일 (지금까지 저장된 가장 늦은 날짜)
+     'half_life': 7,                  # 점수 반감기(일)
+     'built': True,                   # 지난 기록 전체로 만든 적이 있는지 (build_activity, 없으면 도입 전 기록이 빠져 있음)
+     'members': {멤버ID: {'bits': '1f3', 'score': 3.42}}}
+
+- bits: 기준일부터 거꾸로 하루 = 1비트 (0번 비트 = 기준일), 활동한 날은 1. 16진수 문자열로 저장
+        최근 ACTIVITY_WINDOW_DAYS일만 남깁니다. (멤버당 100글자 정도)
+- score: 기준일 시점의 감쇠 점수 = 활동한 날마다 2^(-(기준일 - 그날) / 반감기) 의 합
+        오늘 점수는 여기에 (오늘 - 기준일)만큼 한 번 더 감쇠만 하면 됩니다.
+연속 활동일, 마지막 활동일, 최근 N일 활동 수는 bits에서 정수 비트 연산 몇 번으로 바로 구합니다.
+"""
+from datetime import datetime, timedelta
+
+ACTIVITY_HALF_LIFE_DAYS = 7
+ACTIVITY_WINDOW_DAYS = 400
+# 매일 활동했을 때의 점수 상한 (점수를 0~100으로 보여줄 때 씀)
+_MAX_SCORE = 1 / (1 - 2 ** (-1 / ACTIVITY_HALF_LIFE_DAYS))
+
+
+def is_active(fields):
+    # 그날 기록 중 0보다 큰 값이 하나라도 있으면 활동한 날
+    return any(isinstance(v, (int, float)) and v > 0 for v in (fields or {}).values())
+
+
+def _parse(date_str):
+    return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+def _decay(days, half_life):
+    return 2 ** (-days / half_life)
+
+
+def _score_from_bits(bits, half_life):
+    score = 0.0
+    while bits:
+        low = bits & -bits
+        score += _decay(low.bit_length() - 1, half_life)
+        bits ^= low
+    return score
+
+
+def _load(state):
+    """저장된 상태 -> (기준일, {멤버ID: [bits(int), score]}) (반감기가 바뀌었으면 점수 다시 계산)"""
+    state = state or {}
+    anchor = _parse(state['anchor']) if state.get('anchor') else None
+    recompute = state.get('half_life') != ACTIVITY_HALF_LIFE_DAYS
+    members = {}
+    for mem_id, entry in (state.get('members') or {}).items():
+        bits = int(entry.get('bits') or '0', 16)
+        score = _score_from_bits(bits, ACTIVITY_HALF_LIFE_DAYS) if recompute else float(entry.get('score') or 0)
+        members[mem_id] = [bits, score]
+    return anchor, members
+
+
+def _dump(anchor, members, built):
+    return {
+        'anchor': anchor.strftime("%Y-%m-%d") if anchor is not None else None,
+        'half_life': ACTIVITY_HALF_LIFE_DAYS,
+        'built': built,
+        'members': {
+            mem_id: {'bits': format(bits, 'x'), 'score': round(score, 6)}
+            for mem_id, (bits, score) in members.items() if bits
+        },
+    }
+
+
+def _shift(members, days):
+    # 기준일을 days일 뒤로 옮기기: 비트를 밀고 점수를 그만큼 감쇠, 창 밖으로 나간 날은 버림
+    mask = (1 << ACTIVITY_WINDOW_DAYS) - 1
+    for entry in members.values():
+        entry[0] = (entry[0] << days) & mask
+        entry[1] = entry[1] * _decay(days, ACTIVITY_HALF_LIFE_DAYS) if entry[0] else 0.0
+
+
+def _apply_changes(anchor, members, day, changes):
+    """changes: {멤버ID: 활동 여부} 를 day 날짜에 반영 -> 새 기준일"""
+    if anchor is None:
+        anchor = day
+    elif day > anchor:
+        _shift(members, (day - anchor).days)
+        anchor = day
+    offset = (anchor - day).days
+    if offset >= ACTIVITY_WINDOW_DAYS:
+        return anchor  # 창보다 오래된 날짜는 점수에 영향 없음
+    bit = 1 << offset
+    weight = _decay(offset, ACTIVITY_HALF_LIFE_DAYS)
+    for mem_id, active in changes.items():
+        entry = members.setdefault(mem_id, [0, 0.0])
+        if active and not entry[0] & bit:
+            entry[0] |= bit
+            entry[1] += weight
+        elif not active and entry[0] & bit:
+            entry[0] &= ~bit
+            entry[1] = max(entry[1] - weight, 0.0)
+    return anchor
+
+
+def update_activity(state, date_str, old_record, new_record):
+    """
+    하루 기록이 old_record -> new_record 로 바뀐 것을 상태에 반영
+    활동 여부가 바뀐 멤버가 없으면 None (저장할 필요 없음), 있으면 새 상태 dict
+    """
+    changes = {}
+    for mem_id in set(old_record) | set(new_record):
+        active = is_active(new_record.get(mem_id))
+        if active != is_active(old_record.get(mem_id)):
+            changes[mem_id] = active
+    if not changes:
+        return None
+    try:
+        day = _parse(date_str)
+    except ValueError:
+        return None
+    anchor, members = _load(state)
+    anchor = _apply_changes(anchor, members, day, changes)
+    return _dump(anchor, members, bool((state or {}).get('built')))
+
+
+def build_activity(daily_docs):
+    """[(날짜, 기록), ...] 전체로 상태 새로 만들기 (도입 전 기록 반영용, 기록이 없어도 built 표시)"""
+    anchor, members = None, {}
+    for date_str, record in sorted(daily_docs, key=lambda item: item[0]):
+        try:
+            day = _parse(date_str)
+        except ValueError:
+            continue
+        changes = {mem_id: True for mem_id, fields in record.items() if is_active(fields)}
+        if changes:
+            anchor = _apply_changes(anchor, members, day, changes)
+    return _dump(anchor, members, True)
+
+
+def member_activity(state, member_ids, today, recent_days=30):
+    """
+    오늘 기준 멤버별 활동 지표 -> {멤버ID: {'score', 'streak', 'last_active', 'inactive_days', 'recent_active'}}
+    - score: 0~100 (매일 활동하면 100에 가까움)
+    - streak: 오늘(또는 어제)까지 이어지는 연속 활동일 (끊겼으면 0)
+    - inactive_days: 마지막 활동 후 지난 날 수 (기록이 없으면 None)
+    - recent_active: 최근 recent_days일 중 활동한 날 수
+    """
+    anchor, members = _load(state)
+    shift = (today - anchor).days if anchor is not None else 0
+    recent_mask = (1 << recent_days) - 1
+    result = {}
+    for mem_id in member_ids:
+        bits, score = members.get(mem_id, (0, 0.0))
+        # 오늘 기준으로 비트 정렬 (0번 비트 = 오늘)
+        today_bits = bits << shift if shift >= 0 else bits >> -shift
+        if today_bits:
+            low = (today_bits & -today_bits).bit_length() - 1
+            run = today_bits >> low
+            streak = (~run & (run + 1)).bit_length() - 1 if low <= 1 else 0
+            last_active = today - timedelta(days=low)
+            inactive_days = low
+        else:
+            streak, last_active, inactive_days = 0, None, None
+        if shift < 0:
+            score = _score_from_bits(today_bits, ACTIVITY_HALF_LIFE_DAYS)  # 오늘 이후 날짜 기록은 빼고 계산
+        else:
+            score *= _decay(shift, ACTIVITY_HALF_LIFE_DAYS)
+        result[mem_id] = {
+            'score': 100 * score / _MAX_SCORE,
+            'streak': streak,
+            'last_active': last_active,
+            'inactive_days': inactive_days,
+            'recent_active': (today_bits & recent_mask).bit_count(),
+        }
+    return result
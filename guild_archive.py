@@ -0,0 +1,199 @@
+"""
+일일 기록 / 명단 스냅샷 Parquet 보관함 (로컬 파일, 월별 파티션)
+
+분석 탭에서 시즌 전체, 1년 같은 긴 기간을 볼 때 날짜 문서를 매번 DB에서 읽지 않도록,
+daily_records를 월별 Parquet 파일로 모아 두고 pandas로 바로 조회합니다.
+
+폴더 구조 ({보관함}/{길드ID}/...):
+    daily/month=2024-03.parquet     - 그 달의 기록 (date, member_id, 기록 필드들)
+    members/month=2024-03.parquet   - 그 달 마지막 동기화 때의 명단 (snapshot_date, member_id, name, cp, role)
+    manifest.json                   - 어디까지 동기화했는지 + 다시 받아야 하는 달 목록
+
+동기화는 증분입니다: 마지막 동기화한 달부터 오늘까지 + 그 사이 수정된(dirty) 달만 다시 받습니다.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from guild_store import RECORD_FIELDS
+
+DAILY_COLUMNS = ["date", "member_id"] + RECORD_FIELDS
+MEMBER_COLUMNS = ["snapshot_date", "member_id", "name", "cp", "role"]
+
+
+def _month_of(date_str):
+    return date_str[:7]
+
+
+def _months_between(start, end):
+    # start~end(포함) 사이의 "YYYY-MM" 목록
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def records_to_frame(daily_docs):
+    """[(날짜, {멤버ID: {필드: 값}}), ...] -> 한 줄에 (날짜, 멤버) 하나인 DataFrame"""
+    import pandas as pd
+
+    rows = []
+    for date_str, record in daily_docs:
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d")
+        except ValueError:
+            continue  # 날짜 형식이 아닌 문서는 무시
+        for mem_id, fields in record.items():
+            if not isinstance(fields, dict):
+                continue
+            rows.append([day, mem_id] + [fields.get(f) for f in RECORD_FIELDS])
+
+    frame = pd.DataFrame(rows, columns=DAILY_COLUMNS)
+    frame[RECORD_FIELDS] = frame[RECORD_FIELDS].apply(pd.to_numeric, errors="coerce").fillna(0.0).astype("float64")
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["member_id"] = frame["member_id"].astype(str)
+    return frame
+
+
+class GuildArchive:
+    def __init__(self, root="archive"):
+        self.root = root
+        self._lock = threading.Lock()
+
+    # --- 파일 경로 / manifest ---
+    def _dir(self, guild_id, kind):
+        return os.path.join(self.root, guild_id, kind)
+
+    def _month_path(self, guild_id, kind, month):
+        return os.path.join(self._dir(guild_id, kind), f"month={month}.parquet")
+
+    def _manifest_path(self, guild_id):
+        return os.path.join(self.root, guild_id, "manifest.json")
+
+    def load_manifest(self, guild_id):
+        try:
+            with open(self._manifest_path(guild_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, guild_id, manifest):
+        path = self._manifest_path(guild_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _write_parquet(self, frame, path):
+        # 임시 파일에 쓰고 바꿔치기 (읽는 중인 세션이 반쯤 쓴 파일을 보지 않도록)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frame.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    def months(self, guild_id):
+        directory = self._dir(guild_id, "daily")
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[len("month="):-len(".parquet")] for name in os.listdir(directory)
+                      if name.startswith("month=") and name.endswith(".parquet"))
+
+    # --- 동기화 ---
+    def mark_dirty(self, guild_id, date_str):
+        # 이미 동기화한 달의 기록이 바뀌면 다음 동기화 때 그 달을 다시 받도록 표시
+        with self._lock:
+            manifest = self.load_manifest(guild_id)
+            synced_through = manifest.get("synced_through")
+            if not synced_through or _month_of(date_str) >= _month_of(synced_through):
+                return  # 다음 동기화 범위에 어차피 포함됨
+            dirty = set(manifest.get("dirty", []))
+            dirty.add(_month_of(date_str))
+            manifest["dirty"] = sorted(dirty)
+            self._save_manifest(guild_id, manifest)
+
+    def sync(self, store, guild_id, today, full=False):
+        """
+        저장소의 daily_records를 월별 Parquet으로 갱신 + 이번 달 명단 스냅샷 저장
+        처음이거나 full=True 면 전체를 받고, 아니면 마지막 동기화한 달~오늘 + dirty 달만 받습니다.
+        반환: {'months': [다시 쓴 달], 'days': 받은 날짜 문서 수}
+        """
+        today_str = today.strftime("%Y-%m-%d")
+        with self._lock:
+            manifest = self.load_manifest(guild_id)
+            synced_through = manifest.get("synced_through")
+
+            if full or not synced_through:
+                daily_docs = store.list_daily(guild_id)
+                months = set(self.months(guild_id)) | {_month_of(d) for d, _ in daily_docs}
+            else:
+                start = datetime.strptime(synced_through, "%Y-%m-%d").date().replace(day=1)
+                months = set(_months_between(start, today))
+                daily_docs = store.get_daily_range(guild_id, start.strftime("%Y-%m-%d"), today_str)
+                for month in sorted(set(manifest.get("dirty", [])) - months):
+                    daily_docs += store.get_daily_range(guild_id, f"{month}-01", f"{month}-31")
+                    months.add(month)
+
+            frame = records_to_frame(daily_docs)
+            frame_months = frame["date"].dt.strftime("%Y-%m")
+            for month in sorted(months):
+                month_frame = frame[frame_months == month].sort_values(["date", "member_id"], ignore_index=True)
+                path = self._month_path(guild_id, "daily", month)
+                if month_frame.empty:
+                    if os.path.exists(path):
+                        os.remove(path)  # 그 달 기록이 모두 지워진 경우
+                    continue
+                self._write_parquet(month_frame, path)
+
+            self._snapshot_members(store, guild_id, today)
+
+            manifest.update({
+                "synced_through": today_str,
+                "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "dirty": [],
+            })
+            self._save_manifest(guild_id, manifest)
+        return {"months": sorted(months), "days": len(daily_docs)}
+
+    def _snapshot_members(self, store, guild_id, today):
+        import pandas as pd
+        members = store.list_members(guild_id)
+        frame = pd.DataFrame(
+            [[pd.Timestamp(today), m["id"], m.get("name"), m.get("cp"), m.get("role")] for m in members],
+            columns=MEMBER_COLUMNS,
+        )
+        frame["cp"] = pd.to_numeric(frame["cp"], errors="coerce")
+        self._write_parquet(frame, self._month_path(guild_id, "members", today.strftime("%Y-%m")))
+
+    # --- 조회 ---
+    def query(self, guild_id, start, end, columns=None):
+        """start~end(포함) 기간의 기록 DataFrame (해당 달 파일만 읽음)"""
+        import pandas as pd
+
+        columns = ["date", "member_id"] + list(columns or RECORD_FIELDS)
+        paths = [self._month_path(guild_id, "daily", m) for m in _months_between(start, end)]
+        frames = [pd.read_parquet(p, columns=columns) for p in paths if os.path.exists(p)]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        frame = pd.concat(frames, ignore_index=True)
+        in_range = (frame["date"] >= pd.Timestamp(start)) & (frame["date"] <= pd.Timestamp(end))
+        return frame[in_range].reset_index(drop=True)
+
+    def member_snapshots(self, guild_id, start=None, end=None):
+        """월별 명단 스냅샷 (전투력 변화 등), 기간을 주면 그 사이 달만"""
+        import pandas as pd
+
+        directory = self._dir(guild_id, "members")
+        if not os.path.isdir(directory):
+            return pd.DataFrame(columns=MEMBER_COLUMNS)
+        months = None
+        if start is not None and end is not None:
+            months = set(_months_between(start, end))
+        paths = [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(".parquet") and (months is None or name[len("month="):-len(".parquet")] in months)
+        ]
+        if not paths:
+            return pd.DataFrame(columns=MEMBER_COLUMNS)
+        return pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
@@ -0,0 +1,142 @@
+"""
+길드원 전투력 기록 (멤버별 월간 압축 문서 + 미리 줄여 둔 길드 성장 그래프)
+
+명단의 cp는 고칠 때마다 덮어쓰므로, 저장소가 명단을 저장할 때(write_members) 이 모듈로
+바뀐 전투력을 따로 쌓아 둡니다. 지난 기록은 고치지 않고 덧붙이기만 합니다.
+
+멤버별 기록 guilds/{id}/cp_history/{멤버ID}_{YYYY-MM} (멤버당 한 달에 문서 1개):
+    {'member': 멤버ID, 'month': '2024-03', 'points': {'05143012': 123.5, ...}}
+    - points 키: 그 달 안의 저장 시각 '일시분초'(DDHHMMSS), 값: 그때의 전투력
+    - 같은 문서에 merge로 키만 더하므로 저장할 때 기존 기록을 읽지 않습니다.
+
+길드 성장 그래프 guilds/{id}/stats/cp_day, cp_week, cp_month (해상도별 문서 1개):
+    {'cp': {'2024-03-05': 12.5, ...}, 'members': {'2024-03-05': 1, ...}}
+    - 기간(일/주/월)마다 전투력 합계와 인원의 '변화량'만 더해 둠 (Firestore Increment, 읽기 없이 저장)
+    - 그래프는 해상도에 맞는 문서 1개와 지금 명단의 합계로 기간별 합계를 거꾸로 계산합니다.
+      (기간 b 끝의 합계 = 지금 합계 - b 이후 변화량의 합)
+      기록이 몇 년 쌓여도 스냅샷을 하나하나 읽지 않습니다.
+"""
+from datetime import datetime, timedelta
+
+CP_RESOLUTIONS = ('day', 'week', 'month')
+
+
+def cp_buckets(day):
+    # 날짜가 속한 해상도별 기간 라벨 (문자열 순서 = 시간 순서)
+    iso_year, iso_week, _ = day.isocalendar()
+    return {
+        'day': day.strftime("%Y-%m-%d"),
+        'week': f"{iso_year}-W{iso_week:02d}",
+        'month': day.strftime("%Y-%m"),
+    }
+
+
+def history_doc_id(mem_id, month):
+    return f"{mem_id}_{month}"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def cp_changes(moves, deleted=(), now=None):
+    """
+    명단 저장 내용 -> (멤버별 기록, 해상도별 변화량)
+    moves: 등록/수정 [(멤버ID, 신규 여부, 이전 cp, 새 cp), ...]  (cp를 고치지 않은 수정은 빼고 줘도 됨)
+    deleted: 삭제한 멤버들의 이전 cp 목록
+    - 멤버별 기록: {문서ID: {'member', 'month', 'points': {시각키: cp}}}  (merge로 저장)
+    - 변화량: {해상도: {'cp': {기간: 증가량}, 'members': {기간: 인원 증가}}}  (Increment로 저장)
+    전투력이 그대로인 멤버는 건너뛰고, 바뀐 것이 없으면 둘 다 빈 dict
+    """
+    now = now or datetime.now()
+    month = now.strftime("%Y-%m")
+    point_key = now.strftime("%d%H%M%S")
+    buckets = cp_buckets(now.date())
+
+    points = {}
+    cp_delta = -sum(cp for cp in deleted if _is_number(cp))
+    member_delta = -len(deleted)
+    for mem_id, is_new, old_cp, new_cp in moves:
+        if is_new:
+            member_delta += 1
+        if not _is_number(new_cp) or (not is_new and new_cp == old_cp):
+            continue
+        points[history_doc_id(mem_id, month)] = {'member': mem_id, 'month': month, 'points': {point_key: new_cp}}
+        cp_delta += new_cp - (old_cp if _is_number(old_cp) and not is_new else 0)
+
+    series = {}
+    if cp_delta or member_delta:
+        for resolution in CP_RESOLUTIONS:
+            entry = series[resolution] = {}
+            if cp_delta:
+                entry['cp'] = {buckets[resolution]: cp_delta}
+            if member_delta:
+                entry['members'] = {buckets[resolution]: member_delta}
+    return points, series
+
+
+def series_cp_delta(series):
+    # cp_changes 변화량 -> 이번 저장의 전투력 합계 변화 (해상도마다 같은 값이므로 하나만 봄)
+    return sum((series.get(CP_RESOLUTIONS[0]) or {}).get('cp', {}).values())
+
+
+def series_member_delta(series):
+    # cp_changes 변화량 -> 이번 저장의 인원 변화 (직책이 없는 멤버도 셈)
+    return sum((series.get(CP_RESOLUTIONS[0]) or {}).get('members', {}).values())
+
+
+def recent_buckets(resolution, count, today):
+    # 오늘이 속한 기간부터 거슬러 올라가며 최근 count개의 기간 라벨 (오래된 것부터)
+    labels = []
+    day = today
+    for _ in range(count):
+        labels.append(cp_buckets(day)[resolution])
+        if resolution == 'day':
+            day -= timedelta(days=1)
+        elif resolution == 'week':
+            day -= timedelta(days=7)
+        else:
+            day = day.replace(day=1) - timedelta(days=1)
+    return labels[::-1]
+
+
+def growth_series(series_doc, cp_total, members, labels):
+    """
+    해상도별 변화량 문서 + 지금 합계/인원 -> 각 기간 끝의 [{'label', 'cp_total', 'members'}, ...]
+    labels는 오래된 것부터 (recent_buckets)
+    """
+    cp_deltas = sorted((series_doc or {}).get('cp', {}).items(), reverse=True)
+    member_deltas = sorted((series_doc or {}).get('members', {}).items(), reverse=True)
+    rows = []
+    i = j = 0
+    for label in reversed(labels):
+        # label 이후 기간의 변화량을 지금 값에서 빼면 label 끝의 값
+        while i < len(cp_deltas) and cp_deltas[i][0] > label:
+            cp_total -= cp_deltas[i][1] or 0
+            i += 1
+        while j < len(member_deltas) and member_deltas[j][0] > label:
+            members -= member_deltas[j][1] or 0
+            j += 1
+        rows.append({'label': label, 'cp_total': cp_total, 'members': members})
+    return rows[::-1]
+
+
+def member_points(history_docs):
+    """멤버별 월간 문서 [(월, 문서), ...] -> 시간순 [(datetime, cp), ...]"""
+    points = []
+    for _, doc in history_docs:
+        month = doc.get('month')
+        for key, cp in (doc.get('points') or {}).items():
+            try:
+                points.append((datetime.strptime(f"{month}-{key}", "%Y-%m-%d%H%M%S"), cp))
+            except (TypeError, ValueError):
+                continue
+    return sorted(points)
+
+
+def downsample_points(points, resolution):
+    """시간순 [(datetime, cp), ...] -> 기간마다 마지막 값만 [(기간 라벨, cp), ...]"""
+    last = {}
+    for when, cp in points:
+        last[cp_buckets(when.date())[resolution]] = cp
+    return sorted(last.items())
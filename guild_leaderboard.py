@@ -0,0 +1,88 @@
+"""
+길드 간 랭킹 (전투력 합계/평균, 주간 기부/현자 활동)
+
+여러 길드가 같은 앱을 쓰므로 길드끼리 비교하는 랭킹을 만듭니다.
+길드가 늘어나도 모든 길드의 명단/기록을 내려받지 않도록:
+- 전투력: 길드 목록 조회 한 번으로 길드 문서에 쌓아 둔 인원(member_count)과 합계를 받고
+         (명단을 한 번도 고치지 않아 값이 없는 길드만 집계 쿼리 count/sum 한 번)
+- 주간 활동: 컬렉션 그룹 조회 한 번으로 모든 길드의 그 주 집계(rollup) 문서만 읽습니다.
+
+만든 결과는 leaderboards/week_2024-W05 같은 요약 문서 하나에 저장해 두고,
+화면은 그 문서 1건만 읽습니다. 오래되면(max_age) 랭킹 구역이 refresh_leaderboard로 다시 만듭니다.
+"""
+import threading
+from datetime import datetime, timezone
+
+DONATION_FIELDS = ["don_basic", "don_inter", "don_adv", "don_item"]
+LEADERBOARD_COLUMNS = ["guild_id", "name", "members", "cp_total", "cp_avg", "donations", "sage_dmg", "sage_kill"]
+
+# 요약 다시 만들기는 프로세스 안에서 한 번에 하나만 (여러 세션이 동시에 오래된 요약을 봐도)
+_refresh_lock = threading.Lock()
+
+
+def build_leaderboard(store, week_label, now=None):
+    """week_label("2024-W05") 주간 기준 길드별 합계 -> {'week', 'computed_at', 'guilds': [행, ...]}"""
+    now = now or datetime.now(timezone.utc)
+    rows = {}
+    for guild_id, guild in store.list_guilds():
+        if guild.get('cp_total') is not None and guild.get('member_count') is not None:
+            totals = {'members': int(guild['member_count']), 'cp_total': float(guild['cp_total'])}
+        else:
+            totals = store.member_totals(guild_id)
+        members = totals['members']
+        rows[guild_id] = {
+            'guild_id': guild_id,
+            'name': guild.get('name') or guild_id,
+            'members': members,
+            'cp_total': totals['cp_total'],
+            'cp_avg': totals['cp_total'] / members if members else 0.0,
+            'donations': 0.0,
+            'sage_dmg': 0.0,
+            'sage_kill': 0.0,
+        }
+
+    for guild_id, rollup in store.group_rollups(week_label):
+        row = rows.get(guild_id)
+        if row is None or rollup.get('period', 'week') != 'week':
+            continue
+        for totals in (rollup.get('members') or {}).values():
+            row['donations'] += sum(float(totals.get(f) or 0) for f in DONATION_FIELDS)
+            row['sage_dmg'] += float(totals.get('sage_dmg') or 0)
+            row['sage_kill'] += float(totals.get('sage_kill') or 0)
+
+    return {
+        'week': week_label,
+        'computed_at': now.isoformat(timespec="seconds"),
+        'guilds': [rows[guild_id] for guild_id in sorted(rows)],
+    }
+
+
+def leaderboard_doc_id(week_label):
+    return f"week_{week_label}"
+
+
+def is_stale(summary, max_age, now=None):
+    """요약이 없거나 max_age(timedelta)보다 오래됐거나 형식이 이상하면 True"""
+    if summary is None:
+        return True
+    now = now or datetime.now(timezone.utc)
+    try:
+        return now - datetime.fromisoformat(summary['computed_at']) > max_age
+    except (KeyError, TypeError, ValueError):
+        return True
+
+
+def refresh_leaderboard(store, week_label, max_age, now=None):
+    """
+    저장된 요약이 오래됐으면 다시 만들어 저장 -> 최신 요약
+    모든 길드를 훑는 작업이므로 프로세스 안에서는 한 번에 한 세션만 만들고,
+    기다린 세션은 방금 저장된 요약을 다시 읽어서 씁니다.
+    """
+    doc_id = leaderboard_doc_id(week_label)
+    with _refresh_lock:
+        summary = store.get_leaderboard(doc_id)
+        if not is_stale(summary, max_age, now):
+            return summary
+        summary = build_leaderboard(store, week_label, now)
+        store.put_leaderboard(doc_id, summary)
+        return summary
@@ -0,0 +1,172 @@
+"""
+길드별 실시간 공유 사본 (서버 프로세스 하나에 길드당 감시 1개)
+
+같은 길드 운영진 여러 명이 앱을 열어 두면, 세션마다 rerun 할 때마다 같은 명단과
+오늘 기록을 DB에서 다시 읽게 됩니다. 여기서는 길드마다 저장소 감시(watch_guild)를 하나만 열고,
+받은 명단/오늘 기록을 메모리에 두어 모든 세션이 DB 읽기 없이 같이 씁니다.
+
+- 세션은 rerun 할 때마다 touch()로 "아직 보고 있음"을 알립니다.
+- 일정 시간(idle_seconds) 동안 touch가 없는 세션은 빠지고, 세션이 하나도 없으면 감시를 닫습니다.
+- 날짜가 바뀌면 새 날짜의 기록으로 감시를 다시 엽니다.
+- 세션은 저장하기 전에 expect_change로 알립니다. 그 변경이 감시로 들어오기 전에는 공유 사본 대신
+  DB를 읽도록 None을 돌려주고, 들어온 변경은 그 세션의 것으로 세어 그 세션의 버전(version)에는 넣지 않습니다.
+  (자기 저장 때문에 앱 전체를 다시 그리지 않도록. 메모리/SQLite 저장소는 저장 도중에 감시 콜백을 부르므로
+   저장이 끝난 뒤에 알리면 늦습니다)
+"""
+import threading
+import time
+
+
+class LiveGuild:
+    """한 길드의 공유 사본"""
+
+    def __init__(self, guild_id, date_str):
+        self.guild_id = guild_id
+        self.date_str = date_str
+        self.members = None        # [{'id', 'name', ...}] (첫 스냅샷 전에는 None)
+        self.daily = None          # date_str 날짜 기록 {멤버ID: {필드: 값}}
+        self.version = 0           # 바뀔 때마다 +1 (세션이 새 변경을 알아채는 용도)
+        self.sessions = {}         # {세션ID: 마지막 touch 시각}
+        self.stale_until = {}      # {'members' | 'daily': 시각} 저장 직후 감시 반영 전까지
+        self.pending = {}          # {'members' | 'daily': 세션ID} 그 세션이 저장 중이고 아직 감시로 안 들어온 변경
+        self.own = {}              # {세션ID: 그 세션의 저장으로 생긴 버전 수}
+        self.unsubscribe = None
+        self.ready = threading.Event()
+
+    def fresh(self, kind):
+        return time.monotonic() >= self.stale_until.get(kind, 0)
+
+
+class LiveHub:
+    def __init__(self, store, idle_seconds=60, stale_seconds=10):
+        self.store = store
+        self.idle_seconds = idle_seconds
+        self.stale_seconds = stale_seconds
+        self._guilds = {}
+        self._lock = threading.RLock()
+        self._reaper = None
+
+    # --- 세션 ---
+    def touch(self, guild_id, session_id, date_str, wait=3.0):
+        """세션이 이 길드를 보고 있음을 알림 (감시가 없으면 시작). 반환: LiveGuild"""
+        with self._lock:
+            live = self._guilds.get(guild_id)
+            if live is not None and live.date_str != date_str:
+                self._stop(live)  # 날짜가 바뀜 -> 새 날짜 기록으로 다시 감시
+                live = None
+            if live is None:
+                live = self._start(guild_id, date_str)
+            live.sessions[session_id] = time.monotonic()
+            self._ensure_reaper()
+        live.ready.wait(wait)
+        return live
+
+    def release(self, guild_id, session_id):
+        # 로그아웃 등: 이 세션은 더 이상 길드를 보지 않음
+        with self._lock:
+            live = self._guilds.get(guild_id)
+            if live is not None:
+                live.sessions.pop(session_id, None)
+                live.own.pop(session_id, None)
+                if not live.sessions:
+                    self._stop(live)
+
+    def session_count(self, guild_id):
+        live = self._guilds.get(guild_id)
+        return len(live.sessions) if live is not None else 0
+
+    # --- 조회 (공유 사본을 쓸 수 없으면 None -> 호출한 쪽이 DB에서 읽음) ---
+    def members(self, guild_id):
+        live = self._guilds.get(guild_id)
+        if live is None or live.members is None or not live.fresh('members'):
+            return None
+        return live.members
+
+    def daily(self, guild_id, date_str):
+        live = self._guilds.get(guild_id)
+        if live is None or live.date_str != date_str or live.daily is None or not live.fresh('daily'):
+            return None
+        return live.daily
+
+    def version(self, guild_id, session_id=None):
+        # session_id를 주면 그 세션이 저장해서 생긴 변경은 빼고 셈
+        live = self._guilds.get(guild_id)
+        if live is None:
+            return None
+        with self._lock:
+            return live.version - live.own.get(session_id, 0)
+
+    def expect_change(self, guild_id, kind, session_id=None):
+        # 저장하기 직전에 부름 -> 감시로 새 값이 들어올 때까지(최대 stale_seconds) 공유 사본을 쓰지 않고,
+        # 들어온 변경은 session_id 세션의 것으로 셈
+        live = self._guilds.get(guild_id)
+        if live is not None:
+            with self._lock:
+                live.stale_until[kind] = time.monotonic() + self.stale_seconds
+                if session_id is not None:
+                    live.pending[kind] = session_id
+
+    def cancel_change(self, guild_id, kind):
+        # 저장이 실패해서 들어올 변경이 없음
+        live = self._guilds.get(guild_id)
+        if live is not None:
+            with self._lock:
+                live.stale_until.pop(kind, None)
+                live.pending.pop(kind, None)
+
+    # --- 감시 시작/종료 ---
+    def _start(self, guild_id, date_str):
+        live = LiveGuild(guild_id, date_str)
+        self._guilds[guild_id] = live
+
+        def on_members(members):
+            self._update(live, 'members', members)
+
+        def on_daily(record):
+            self._update(live, 'daily', record)
+
+        live.unsubscribe = self.store.watch_guild(guild_id, date_str, on_members, on_daily)
+        return live
+
+    def _update(self, live, kind, value):
+        with self._lock:
+            setattr(live, kind, value)
+            expected = not live.fresh(kind)
+            live.stale_until.pop(kind, None)
+            live.version += 1
+            # 저장이 아무것도 쓰지 않아 변경이 안 들어온 경우, stale_seconds가 지난 뒤의 변경은 다른 세션의 것
+            session_id = live.pending.pop(kind, None)
+            if session_id is not None and expected:
+                live.own[session_id] = live.own.get(session_id, 0) + 1
+            if live.members is not None and live.daily is not None:
+                live.ready.set()
+
+    def _stop(self, live):
+        if self._guilds.get(live.guild_id) is live:
+            del self._guilds[live.guild_id]
+        if live.unsubscribe is not None:
+            live.unsubscribe()
+            live.unsubscribe = None
+
+    def _ensure_reaper(self):
+        # 세션이 모두 떠난 길드의 감시를 닫는 백그라운드 스레드 (처음 touch 때 시작)
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name="live-guild-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(self.idle_seconds / 4, 1))
+            self.reap()
+
+    def reap(self):
+        now = time.monotonic()
+        with self._lock:
+            for live in list(self._guilds.values()):
+                for session_id, seen in list(live.sessions.items()):
+                    if now - seen > self.idle_seconds:
+                        del live.sessions[session_id]
+                        live.own.pop(session_id, None)
+                if not live.sessions:
+                    self._stop(live)
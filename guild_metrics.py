@@ -0,0 +1,160 @@
+"""
+실행(rerun)별 사용량 계측: 문서 읽기/쓰기 수 + 헬퍼 함수별 시간
+
+- 저장소(guild_store.py)가 문서를 읽고 쓸 때마다 count_reads / count_writes 로 알려줍니다.
+- 헬퍼 함수는 @timed("이름") 으로 감싸면 호출 횟수와 걸린 시간이 기록됩니다.
+- 앱은 한 번의 실행(전체 rerun 또는 fragment 단독 rerun)을 rerun_scope() 로 감싸고,
+  끝나면 한 줄짜리 JSON 로그를 남깁니다. (어느 탭/버튼이 읽기를 많이 쓰는지 추적용)
+
+계측값은 실행 중인 스레드 기준으로 모읍니다. (Streamlit은 세션마다 별도 스레드에서 스크립트를 실행)
+rerun_scope 밖(백그라운드 스레드, 벤치마크 등)에서의 호출은 아무것도 기록하지 않습니다.
+실행 중에 다른 스레드로 넘긴 작업(미리 읽기 등)은 worker_scope 로 따로 모았다가 merge 로 합칩니다.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("guild_metrics")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s [metrics] %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_local = threading.local()
+
+
+class RerunMeter:
+    """한 번의 실행 동안 모은 사용량"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.elapsed_ms = None
+        self.reads = 0
+        self.writes = 0
+        self.calls = {}      # {함수 이름: {'count', 'ms'}}
+        self.sections = {}   # {구역 이름: {'reads', 'writes', 'ms'}}
+        self._stack = []     # 현재 실행 중인 구역 (안쪽이 마지막)
+
+    def _section(self):
+        return self.sections.setdefault(self._stack[-1], {'reads': 0, 'writes': 0, 'ms': 0.0}) if self._stack else None
+
+    def add(self, reads=0, writes=0):
+        self.reads += reads
+        self.writes += writes
+        section = self._section()
+        if section is not None:
+            section['reads'] += reads
+            section['writes'] += writes
+
+    def merge(self, other):
+        # 다른 스레드에서 모은 사용량(worker_scope)을 현재 구역에 합치기
+        self.add(reads=other.reads, writes=other.writes)
+        for name, call in other.calls.items():
+            mine = self.calls.setdefault(name, {'count': 0, 'ms': 0.0})
+            mine['count'] += call['count']
+            mine['ms'] += call['ms']
+
+    def summary(self):
+        return {
+            'label': self.label,
+            'ms': round(self.elapsed_ms if self.elapsed_ms is not None else (time.perf_counter() - self.started) * 1000, 1),
+            'reads': self.reads,
+            'writes': self.writes,
+            'sections': {name: dict(s, ms=round(s['ms'], 1)) for name, s in self.sections.items()},
+            'calls': {name: {'count': c['count'], 'ms': round(c['ms'], 1)} for name, c in self.calls.items()},
+        }
+
+
+def current_meter():
+    return getattr(_local, 'meter', None)
+
+
+def count_reads(n=1):
+    meter = current_meter()
+    if meter is not None and n:
+        meter.add(reads=n)
+
+
+def count_writes(n=1):
+    meter = current_meter()
+    if meter is not None and n:
+        meter.add(writes=n)
+
+
+@contextmanager
+def rerun_scope(label, on_finish=None):
+    """
+    한 번의 실행 또는 그 안의 구역을 계측
+    가장 바깥 scope가 끝나면 JSON 로그 한 줄을 남기고 on_finish(summary)를 호출합니다.
+    안쪽 scope(전체 rerun 안에서 실행된 fragment 등)는 구역별 합계로만 쌓입니다.
+    """
+    meter = current_meter()
+    outermost = meter is None
+    if outermost:
+        meter = _local.meter = RerunMeter(label)
+    meter._stack.append(label)
+    section_start = time.perf_counter()
+    try:
+        yield meter
+    finally:
+        meter._section()['ms'] += (time.perf_counter() - section_start) * 1000
+        meter._stack.pop()
+        if outermost:
+            meter.elapsed_ms = (time.perf_counter() - meter.started) * 1000
+            _local.meter = None
+            summary = meter.summary()
+            logger.info(json.dumps(summary, ensure_ascii=False))
+            if on_finish is not None:
+                on_finish(summary)
+
+
+@contextmanager
+def worker_scope(label):
+    """
+    실행 스레드가 아닌 스레드(미리 읽기 등)의 사용량을 따로 모으기 (로그는 남기지 않음)
+    작업이 끝나면 실행 스레드에서 current_meter().merge(meter) 로 합칩니다.
+    """
+    previous = current_meter()
+    meter = _local.meter = RerunMeter(label)
+    meter._stack.append(label)
+    try:
+        yield meter
+    finally:
+        meter.elapsed_ms = (time.perf_counter() - meter.started) * 1000
+        _local.meter = previous
+
+
+def timed(name):
+    # 헬퍼 함수 호출 횟수/시간 기록 (st.cache_data 안쪽에 붙이면 캐시가 없을 때의 실제 실행만 기록)
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            meter = current_meter()
+            if meter is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                call = meter.calls.setdefault(name, {'count': 0, 'ms': 0.0})
+                call['count'] += 1
+                call['ms'] += (time.perf_counter() - start) * 1000
+        return wrapper
+    return decorator
+
+
+def metered(label, on_finish=None):
+    # 함수 전체를 rerun_scope로 감싸기 (fragment 구역용: 단독 rerun이면 그 자체가 한 번의 실행으로 기록됨)
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with rerun_scope(label, on_finish):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+"""
+길드 데이터 마이그레이션 도구
+
+사용법:
+    python guild_migrate.py daily-schema --guild my_guild --dry-run   # 바뀔 문서 수/크기만 확인
+    python guild_migrate.py daily-schema --guild my_guild             # 일일 기록을 v3 압축 형식으로 변환
+    python guild_migrate.py daily-schema --guild a b --backend sqlite --db guild.db
+
+--backend firestore 는 serviceAccountKey.json (또는 --key) 으로 실제 DB에 접속합니다.
+앱은 모든 형식을 읽으므로, 변환 도중이나 일부 길드만 변환한 상태에서도 그대로 동작합니다.
+"""
+import argparse
+import os
+import sys
+
+
+def open_store(args):
+    from guild_store import FirestoreStore, SQLiteStore
+    if args.backend == "sqlite":
+        return SQLiteStore(args.db)
+    if args.backend == "emulator":
+        if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            raise SystemExit("FIRESTORE_EMULATOR_HOST 를 먼저 지정하세요. (예: localhost:8080)")
+        from google.cloud import firestore as gcloud_firestore
+        return FirestoreStore(gcloud_firestore.Client(project=args.project))
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(args.key))
+    return FirestoreStore(firestore.client())
+
+
+def migrate_daily_schema(args):
+    store = open_store(args)
+    print(f"{'길드':<20}{'문서':>8}{'변환':>8}{'이전(KB)':>12}{'이후(KB)':>12}{'감소':>8}")
+    for guild_id in args.guild:
+        stats = store.compact_daily(guild_id, dry_run=args.dry_run)
+        saved = 1 - stats['bytes_after'] / stats['bytes_before'] if stats['bytes_before'] else 0
+        print(f"{guild_id:<20}{stats['docs']:>8}{stats['converted']:>8}"
+              f"{stats['bytes_before'] / 1024:>12.1f}{stats['bytes_after'] / 1024:>12.1f}{saved:>8.0%}")
+    if args.dry_run:
+        print("(--dry-run: 저장하지 않음)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="길드 데이터 마이그레이션")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_daily = sub.add_parser("daily-schema", help="일일 기록 문서를 v3 압축 형식으로 변환")
+    p_daily.add_argument("--guild", nargs="+", required=True, help="길드 ID (여러 개 가능)")
+    p_daily.add_argument("--backend", choices=["firestore", "sqlite", "emulator"], default="firestore")
+    p_daily.add_argument("--key", default="serviceAccountKey.json", help="Firestore 서비스 계정 키 파일")
+    p_daily.add_argument("--db", default="guild.db", help="sqlite 파일 경로")
+    p_daily.add_argument("--project", default="guild-bench", help="에뮬레이터 프로젝트 ID")
+    p_daily.add_argument("--dry-run", action="store_true")
+    p_daily.set_defaults(func=migrate_daily_schema)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1269 @@
+"""
+길드 데이터 저장소 (Firestore / 메모리 / SQLite)
+
+game_guild.py의 헬퍼 함수들은 DB를 직접 부르지 않고 이 저장소 인터페이스(GuildStore)만 씁니다.
+- FirestoreStore: 실제 서비스용 (기존 구조 그대로: guilds/{id}/members, daily_records, rollups)
+                  + 활동 점수 상태: guilds/{id}/stats/activity, 길드 간 랭킹 요약: leaderboards/{주간 문서ID}
+                  + 전투력 기록: guilds/{id}/cp_history/{멤버ID}_{월}, 성장 그래프: guilds/{id}/stats/cp_{해상도}
+- MemoryStore:    인증 정보 없이 개발/테스트할 때 (서버를 끄면 사라짐)
+- SQLiteStore:    로컬 파일에 저장 (오프라인 개발, 부하 테스트, 백엔드별 속도 비교)
+
+정원 체크, 집계 차이 계산 같은 규칙은 아래 공용 함수로 모든 저장소가 똑같이 씁니다.
+모든 저장소는 읽고 쓴 문서 수를 guild_metrics 에 알려줍니다. (Firestore 과금 기준과 같게 셈)
+"""
+import copy
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from guild_activity import update_activity
+from guild_cp_history import _is_number, cp_changes, series_cp_delta, series_member_delta
+from guild_metrics import count_reads, count_writes
+
+# 일일 기록 필드 (주간/월간 집계 대상)
+RECORD_FIELDS = ["don_basic", "don_inter", "don_adv", "don_item", "sage_dmg", "sage_kill"]
+
+# Firestore 일괄 쓰기(batch)는 한 번에 최대 500건까지만 가능
+FIRESTORE_BATCH_LIMIT = 500
+
+# 길드 목록(list_guilds)에서 받는 길드 문서 필드 (길드 간 랭킹용)
+GUILD_SUMMARY_FIELDS = ['name', 'role_counts', 'cp_total', 'member_count']
+
+
+class RoleQuotaExceeded(Exception):
+    """직책 정원 초과 (저장은 하나도 되지 않음)"""
+
+    def __init__(self, role):
+        super().__init__(role)
+        self.role = role
+
+
+class MemberNotFound(Exception):
+    """수정하려던 길드원이 그 사이 삭제됨 (저장은 하나도 되지 않음)"""
+
+    def __init__(self, member_ids):
+        super().__init__(member_ids)
+        self.member_ids = list(member_ids)
+
+
+# --- 공용 규칙 ---
+def to_native(value):
+    # pandas/numpy 값(int64, NaN 등)을 DB에 저장할 수 있는 파이썬 기본 타입으로 변환
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+    return value
+
+
+def apply_role_moves(counts, moves, limits):
+    """
+    직책 카운터에 [(이전 직책, 새 직책), ...] 변경을 반영 -> (새 카운터, 정원을 넘긴 직책 또는 None)
+    신규 등록은 이전 직책 None, 삭제는 새 직책 None.
+    모든 변경이 끝난 최종 인원 기준으로 체크하므로 서로 직책을 맞바꾸는 것은 허용됩니다.
+    """
+    before = dict(counts)
+    counts = dict(counts)
+    for old_role, new_role in moves:
+        if old_role == new_role:
+            continue
+        if old_role:
+            counts[old_role] = max(counts.get(old_role, 0) - 1, 0)
+        if new_role:
+            counts[new_role] = counts.get(new_role, 0) + 1
+
+    for role, limit in limits.items():
+        if counts.get(role, 0) > limit and counts.get(role, 0) > before.get(role, 0):
+            return counts, role
+    return counts, None
+
+
+def count_roles(members):
+    # 멤버 dict 목록으로 직책 카운터 만들기 (카운터가 없는 기존 길드 초기화용)
+    counts = {}
+    for member in members:
+        role = member.get('role')
+        if role:
+            counts[role] = counts.get(role, 0) + 1
+    return counts
+
+
+def roster_cp_total(members):
+    # 멤버 dict 목록의 전투력 합 (길드 문서 cp_total이 없는 기존 길드 초기화용)
+    # (cp_changes와 같은 기준: bool/NaN 등 숫자가 아닌 값은 빼고 셈)
+    return float(sum(m['cp'] for m in members if _is_number(m.get('cp'))))
+
+
+def record_deltas(old_record, new_record):
+    # 같은 날짜를 다시 저장할 때 집계에 더할 차이 {멤버ID: {필드: 증가량}}
+    deltas = {}
+    for mem_id, fields in new_record.items():
+        old_fields = old_record.get(mem_id, {})
+        for field in RECORD_FIELDS:
+            if field not in fields:
+                continue
+            delta = (to_native(fields[field]) or 0) - (old_fields.get(field) or 0)
+            if delta:
+                deltas.setdefault(mem_id, {})[field] = delta
+    return deltas
+
+
+def split_conflicts(current, changes, base):
+    """
+    바뀐 칸만 저장할 때의 낙관적 동시성 체크 (칸 단위)
+    changes: 저장할 칸 {멤버ID: {필드: 새 값}}, base: 그 칸들을 화면에 불러왔을 때의 값 (None이면 체크 안 함)
+    current(지금 DB 값)가 base와 다르면 그 사이 다른 사람이 고친 칸 -> 저장하지 않고 충돌로 돌려줌
+    -> (저장할 칸, 충돌 {멤버ID: {필드: 지금 DB 값}})
+    """
+    if base is None:
+        return changes, {}
+    to_save, conflicts = {}, {}
+    for mem_id, fields in changes.items():
+        now_fields = current.get(mem_id, {})
+        base_fields = base.get(mem_id, {})
+        for field, value in fields.items():
+            now = to_native(now_fields.get(field)) or 0
+            if now == (to_native(value) or 0):
+                continue  # 이미 같은 값 (다른 사람이 같은 값으로 고쳤거나 내가 방금 저장함)
+            if now != (to_native(base_fields.get(field)) or 0):
+                conflicts.setdefault(mem_id, {})[field] = now_fields.get(field)
+            else:
+                to_save.setdefault(mem_id, {})[field] = value
+    return to_save, conflicts
+
+
+# --- 일일 기록 문서 형식 ---
+# v1 (예전): {멤버ID: {'don_basic': 3, 'sage_dmg': 1.5, ...}, ...}
+#     멤버 수만큼 필드 이름이 반복되어 문서가 크고, 읽을 때 멤버마다 map을 풀어야 함
+# v3 (압축, 유일한 압축 형식): {'_schema': 3, 'fields': ['don_basic', ...], 'rows': {멤버ID: [3, ...], ...}}
+#     필드 이름은 fields에 한 번만, 멤버마다 fields 순서의 값 배열 (값이 없는 칸은 None)
+#     필드별 열 배열이 아니라 멤버별 행 배열인 이유: Firestore는 배열 안의 한 칸만 고칠 수 없으므로,
+#     멤버 단위로 나뉘어 있어야 저장할 때 바뀐 멤버의 행만 'rows.{멤버ID}' 경로로 고칠 수 있음 (daily_row_patch)
+#     (_schema 2는 배포된 적 없는 중간 형식이라 쓰지 않음)
+# 읽을 때는 두 형식 모두 v1 모양의 dict로 돌려주고, 저장은 항상 v3로 합니다.
+DAILY_SCHEMA_VERSION = 3
+
+
+def is_packed_daily(doc):
+    return bool(doc) and doc.get('_schema') == DAILY_SCHEMA_VERSION
+
+
+def _daily_fields(record):
+    # 기본 필드는 항상 같은 순서로 두어야 나중에 행만 고칠 때 열이 어긋나지 않음
+    present = set()
+    for fields in record.values():
+        present.update(fields)
+    return RECORD_FIELDS + sorted(present - set(RECORD_FIELDS))
+
+
+def _daily_row(fields, values):
+    return [to_native(values.get(field)) for field in fields]
+
+
+def pack_daily(record):
+    """{멤버ID: {필드: 값}} -> v3 압축 문서"""
+    fields = _daily_fields(record)
+    return {
+        '_schema': DAILY_SCHEMA_VERSION,
+        'fields': fields,
+        'rows': {mem_id: _daily_row(fields, values) for mem_id, values in sorted(record.items())},
+    }
+
+
+def daily_row_patch(doc, new_record, mem_ids):
+    """
+    저장된 v3 문서에서 mem_ids 멤버의 행만 바꿀 때 쓸 {멤버ID: 새 행}
+    문서가 없거나 예전 형식이거나, 문서에 없는 필드를 새로 쓰면 None (문서 전체를 pack_daily로 다시 써야 함)
+    """
+    if not is_packed_daily(doc):
+        return None
+    fields = doc['fields']
+    if any(set(new_record.get(mem_id, {})) - set(fields) for mem_id in mem_ids):
+        return None
+    return {mem_id: _daily_row(fields, new_record.get(mem_id, {})) for mem_id in mem_ids}
+
+
+def unpack_daily(doc):
+    """v1/v3 어느 쪽이든 {멤버ID: {필드: 값}} 로"""
+    if not doc:
+        return {}
+    if not is_packed_daily(doc):
+        return doc
+    fields = doc['fields']
+    return {
+        mem_id: {field: value for field, value in zip(fields, row) if value is not None}
+        for mem_id, row in doc['rows'].items()
+    }
+
+
+def merge_daily(old_record, record):
+    # Firestore set(merge=True)처럼 멤버별 필드 단위로 덮어쓰기 (새 dict 반환)
+    return _deep_merge(copy.deepcopy(old_record), record)
+
+
+def estimate_doc_size(data):
+    # Firestore 문서 크기 계산 규칙 근사치 (바이트): 문자열 길이+1, 숫자 8, 필드 이름 길이+1, 문서당 32
+    def size(value):
+        if isinstance(value, str):
+            return len(value.encode('utf-8')) + 1
+        if isinstance(value, bool) or value is None:
+            return 1
+        if isinstance(value, (int, float)):
+            return 8
+        if isinstance(value, dict):
+            return sum(len(k.encode('utf-8')) + 1 + size(v) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return sum(size(v) for v in value)
+        return 8
+    return size(data) + 32
+
+
+def _deep_merge(target, source):
+    # Firestore set(merge=True)와 같은 방식으로 중첩 dict 병합
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _deep_merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _rebuild_token(guild, kind):
+    # begin_rebuild가 길드 문서에 남긴 표시 (save_daily가 지웠으면 None)
+    return ((guild or {}).get('rebuilding') or {}).get(kind)
+
+
+class GuildStore(ABC):
+    """
+    저장소 인터페이스. 모든 메서드는 파이썬 기본 타입(dict/list/str/숫자)만 주고받습니다.
+    빠뜨린 메서드가 있는 저장소는 만들 때(인스턴스 생성 시) 바로 TypeError가 납니다.
+    """
+
+    # --- 길드 ---
+    @abstractmethod
+    def get_guild(self, guild_id):
+        """길드 문서 dict, 없으면 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_guild(self, guild_id, data):
+        """새 길드 만들기, 이미 있는 ID면 False"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_guild(self, guild_id, fields):
+        """길드 문서에 필드 덮어쓰기 (merge, 다른 필드는 그대로)"""
+        raise NotImplementedError
+
+    def begin_rebuild(self, guild_id, kind):
+        """
+        기존 기록으로 kind('rollups'/'activity')를 다시 만들기 시작 표시 (길드 문서 rebuilding.{kind})
+        반환: replace_rollups/replace_activity에 넘길 값
+        기록을 다 읽는 동안 save_daily가 기록을 고치면 표시가 지워지므로, 그 사이 바뀐 값을 덮어쓰지 않음
+        """
+        token = uuid.uuid4().hex
+        self.update_guild(guild_id, {'rebuilding': {kind: token}})
+        return token
+
+    # --- 길드원 ---
+    @abstractmethod
+    def list_members(self, guild_id):
+        """[{'id': 멤버ID, 'name', 'cp', 'role', ...}, ...]"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_members(self, guild_id, upserts=(), deletes=(), role_limits=None, now=None):
+        """
+        길드원 등록/수정/삭제를 한 번에(원자적으로) 저장하고 직책 카운터도 같이 갱신
+        upserts: [(멤버ID 또는 None(신규), 필드 dict)]  - 수정은 기존 필드에 덮어쓰기
+        deletes: [멤버ID]
+        전투력이 바뀌면 전투력 기록과 성장 그래프 변화량도 같이 저장 (now: 기록 시각, 기본은 지금)
+        정원을 넘기면 RoleQuotaExceeded, 수정할 멤버가 그 사이 삭제됐으면 MemberNotFound (둘 다 아무것도 저장 안 됨)
+        성공하면 저장된 멤버ID 목록
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cp_series(self, guild_id, resolution):
+        """성장 그래프 변화량 문서 stats/cp_{resolution} ('day' | 'week' | 'month'), 없으면 {}"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cp_history(self, guild_id, mem_id, start_month, end_month):
+        """한 멤버의 start~end(포함, 'YYYY-MM') 월간 전투력 기록 [(월, 문서), ...] 월순"""
+        raise NotImplementedError
+
+    # --- 일일 기록 ---
+    @abstractmethod
+    def get_daily(self, guild_id, date_str):
+        """{멤버ID: {필드: 값}}, 없으면 {} (v1/v3 문서 모두)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_daily(self, guild_id, date_str, record, rollups, base=None):
+        """
+        하루 기록 병합 저장 + 이전 값과의 차이를 집계 문서들에 더하기 + 활동 점수 상태 갱신 (원자적으로)
+        record: 저장할 칸 {멤버ID: {필드: 값}} (바뀐 칸만 줘도 됨, 나머지 칸은 그대로)
+        rollups: {집계 문서ID: {'period', 'label', 'start'}}
+        base: 그 칸들을 불러왔을 때의 값 -> 그 사이 다른 사람이 고친 칸은 저장하지 않음 (split_conflicts)
+        기록이 실제로 바뀌면 진행 중인 다시 만들기 표시(begin_rebuild)를 지움
+        반환: 저장하지 않은 충돌 칸 {멤버ID: {필드: 지금 DB 값}} (없으면 {})
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_daily_range(self, guild_id, start_str, end_str):
+        """start~end(포함) 날짜의 [(날짜, 기록), ...] 날짜순"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_daily(self, guild_id):
+        """전체 [(날짜, 기록), ...]"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def compact_daily(self, guild_id, dry_run=False):
+        """
+        v1 일일 기록 문서를 v3 압축 형식으로 바꾸기 (마이그레이션)
+        반환: {'docs', 'converted', 'bytes_before', 'bytes_after'} (크기는 추정치)
+        """
+        raise NotImplementedError
+
+    # --- 주간/월간 집계 ---
+    @abstractmethod
+    def get_rollups(self, guild_id, doc_ids):
+        """존재하는 집계 문서만 [(문서ID, 데이터), ...]"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace_rollups(self, guild_id, rollups, token):
+        """
+        집계 문서 전체를 rollups {문서ID: 데이터}로 바꾸고 (없는 문서는 삭제) 길드 문서에 rollups_built_at 기록
+        token: begin_rebuild(guild_id, 'rollups') 반환값. 그 사이 기록이 바뀌었으면 아무것도 쓰지 않고 False
+        """
+        raise NotImplementedError
+
+    # --- 활동 점수 (guild_activity.py) ---
+    @abstractmethod
+    def get_activity(self, guild_id):
+        """활동 점수 상태 문서, 없으면 {}"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_activity(self, guild_id, state):
+        """활동 점수 상태 통째로 덮어쓰기 (새 길드를 만들 때)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace_activity(self, guild_id, state, token):
+        """
+        기존 기록으로 다시 만든 활동 점수 상태 저장
+        token: begin_rebuild(guild_id, 'activity') 반환값. 그 사이 기록이 바뀌었으면 아무것도 쓰지 않고 False
+        """
+        raise NotImplementedError
+
+    # --- 실시간 감시 ---
+    @abstractmethod
+    def watch_guild(self, guild_id, date_str, on_members, on_daily):
+        """
+        명단과 date_str 날짜 기록이 바뀔 때마다 콜백 호출 (처음 한 번은 현재 값으로 바로 호출)
+        on_members([{'id', ...}, ...]), on_daily({멤버ID: {필드: 값}})
+        콜백은 다른 스레드에서 불릴 수 있습니다. 반환: 감시를 끝내는 함수
+        """
+        raise NotImplementedError
+
+    # --- 길드 간 랭킹 ---
+    @abstractmethod
+    def list_guilds(self):
+        """
+        모든 길드 [(길드ID, {'name', 'role_counts', 'cp_total', 'member_count'}), ...] (비밀번호 등 다른 필드는 받지 않음)
+        role_counts/cp_total/member_count는 write_members가 길드 문서에 쌓아 두는 값 (한 번도 명단을 고치지 않은 길드는 없음)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def member_totals(self, guild_id):
+        """{'members': 인원, 'cp_total': 전투력 합} (명단을 받지 않고 DB 쪽에서 집계)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def group_rollups(self, label):
+        """모든 길드의 label 기간 집계 문서 [(길드ID, 데이터), ...] (컬렉션 그룹 조회 1번)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_leaderboard(self, doc_id):
+        """저장된 랭킹 요약 문서, 없으면 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_leaderboard(self, doc_id, data):
+        raise NotImplementedError
+
+
+# --- Firestore ---
+class FirestoreStore(GuildStore):
+    def __init__(self, client):
+        self.db = client
+
+    def _guild_ref(self, guild_id):
+        return self.db.collection('guilds').document(guild_id)
+
+    def _commit_batched(self, ops):
+        """
+        (작업, 문서참조, 데이터) 목록을 500건 단위 batch로 묶어서 커밋
+        작업: 'set' / 'set_merge' / 'update' / 'delete'
+        """
+        for start in range(0, len(ops), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for op, ref, data in ops[start:start + FIRESTORE_BATCH_LIMIT]:
+                if op == 'set':
+                    batch.set(ref, data)
+                elif op == 'set_merge':
+                    batch.set(ref, data, merge=True)
+                elif op == 'update':
+                    batch.update(ref, data)
+                elif op == 'delete':
+                    batch.delete(ref)
+            batch.commit()
+            count_writes(len(ops[start:start + FIRESTORE_BATCH_LIMIT]))
+
+    @staticmethod
+    def _read_guild_totals(transaction, guild_ref):
+        """
+        길드 문서의 직책 카운터(role_counts), 전투력 합계(cp_total), 인원(member_count)을 트랜잭션 안에서 읽기
+        -> (카운터, 합계, 인원, 명단을 새로 셌는지, 읽은 문서 수)
+        셋 중 하나라도 아직 없는 기존 길드는 이때 한 번만 명단을 세서 초기화합니다.
+        """
+        guild_doc = guild_ref.get(transaction=transaction)
+        guild = guild_doc.to_dict() or {}
+        counts, cp_total, member_count = guild.get('role_counts'), guild.get('cp_total'), guild.get('member_count')
+        if counts is not None and cp_total is not None and member_count is not None:
+            return dict(counts), cp_total, member_count, False, 1
+        members = [doc.to_dict() for doc in guild_ref.collection('members').stream(transaction=transaction)]
+        return count_roles(members), roster_cp_total(members), len(members), True, 1 + max(len(members), 1)
+
+    def get_guild(self, guild_id):
+        doc = self._guild_ref(guild_id).get()
+        count_reads(1)
+        return doc.to_dict() if doc.exists else None
+
+    def create_guild(self, guild_id, data):
+        from firebase_admin import firestore
+        from google.api_core.exceptions import AlreadyExists
+        try:
+            # create()는 문서가 이미 있으면 실패하므로 중복 체크와 저장이 한 번에 처리됨
+            self._guild_ref(guild_id).create(dict(data, created_at=firestore.SERVER_TIMESTAMP))
+        except AlreadyExists:
+            return False
+        finally:
+            count_writes(1)
+        return True
+
+    def update_guild(self, guild_id, fields):
+        self._guild_ref(guild_id).set(dict(fields), merge=True)
+        count_writes(1)
+
+    def list_members(self, guild_id):
+        data = []
+        for doc in self._guild_ref(guild_id).collection('members').stream():
+            d = doc.to_dict()
+            d['id'] = doc.id
+            data.append(d)
+        count_reads(max(len(data), 1))  # 결과가 없는 쿼리도 1건으로 과금
+        return data
+
+    def write_members(self, guild_id, upserts=(), deletes=(), role_limits=None, now=None):
+        from firebase_admin import firestore
+        from google.api_core.exceptions import NotFound
+
+        guild_ref = self._guild_ref(guild_id)
+        collection_ref = guild_ref.collection('members')
+        history_ref = guild_ref.collection('cp_history')
+        stats_ref = guild_ref.collection('stats')
+        writes = []
+        for mem_id, fields in upserts:
+            ref = collection_ref.document(mem_id) if mem_id else collection_ref.document()
+            writes.append((ref, mem_id is None, dict(fields, updated_at=firestore.SERVER_TIMESTAMP)))
+        delete_refs = [collection_ref.document(mem_id) for mem_id in deletes]
+
+        # 직책/전투력이 안 바뀌면 카운터와 이전 전투력을 볼 필요가 없으므로 batch로 바로 저장
+        # (그 사이 삭제된 멤버가 있어 update가 실패하면 아래 트랜잭션에서 다시 읽고 MemberNotFound로 알림)
+        if not delete_refs and not any('role' in data or 'cp' in data for _, _, data in writes):
+            try:
+                self._commit_batched([('set' if is_new else 'update', ref, data) for ref, is_new, data in writes])
+                return [ref.id for ref, _, _ in writes]
+            except NotFound:
+                pass
+
+        # 정원 체크 + 저장 + 카운터 갱신 + 전투력 기록을 하나의 트랜잭션으로 처리
+        # (명단 전체를 읽지 않고 길드 문서 + 바뀌는 멤버 문서만 읽음.
+        #  두 운영진이 동시에 마지막 자리를 배정해도 한 명만 성공합니다)
+        # 충돌로 _apply가 다시 실행될 수 있으므로 읽기/쓰기 수는 돌려받아서 커밋 후에 한 번만 셈
+        @firestore.transactional
+        def _apply(transaction):
+            counts, cp_total, member_count, recounted, reads = self._read_guild_totals(transaction, guild_ref)
+            existing_refs = [ref for ref, is_new, _ in writes if not is_new] + delete_refs
+            old_docs = {}
+            if existing_refs:
+                for doc in transaction.get_all(existing_refs):
+                    old_docs[doc.id] = doc.to_dict() if doc.exists else None
+                reads += len(existing_refs)
+            # 다른 운영진이 삭제한 멤버를 update하면 Firestore가 NotFound로 실패하므로 미리 확인
+            missing = [ref.id for ref, is_new, _ in writes if not is_new and old_docs.get(ref.id) is None]
+            if missing:
+                raise MemberNotFound(missing)
+            old_roles = {mem_id: (old or {}).get('role') for mem_id, old in old_docs.items()}
+
+            moves = [(old_roles.get(ref.id) if not is_new else None, data.get('role', old_roles.get(ref.id)))
+                     for ref, is_new, data in writes]
+            moves += [(old_roles.get(ref.id), None) for ref in delete_refs]
+            counts, exceeded = apply_role_moves(counts, moves, role_limits or {})
+            if exceeded:
+                raise RoleQuotaExceeded(exceeded)
+
+            points, series = cp_changes(
+                [(ref.id, is_new, None if is_new else (old_docs.get(ref.id) or {}).get('cp'), data['cp'])
+                 for ref, is_new, data in writes if 'cp' in data],
+                deleted=[old_docs[ref.id].get('cp') for ref in delete_refs if old_docs.get(ref.id)],
+                now=now,
+            )
+
+            for ref, is_new, data in writes:
+                if is_new:
+                    transaction.set(ref, data)
+                else:
+                    transaction.update(ref, data)
+            for ref in delete_refs:
+                transaction.delete(ref)
+            # 전투력 합계/인원은 변화량만 더함 (방금 명단을 세서 초기화했으면 그 값에 더해서 저장)
+            cp_delta, member_delta = series_cp_delta(series), series_member_delta(series)
+            totals = {'role_counts': counts}
+            if recounted:
+                totals['cp_total'] = cp_total + cp_delta
+                totals['member_count'] = member_count + member_delta
+            else:
+                if cp_delta:
+                    totals['cp_total'] = firestore.Increment(cp_delta)
+                if member_delta:
+                    totals['member_count'] = firestore.Increment(member_delta)
+            transaction.set(guild_ref, totals, merge=True)
+            # 전투력 기록은 merge로 덧붙이고, 성장 그래프는 변화량만 더함 (둘 다 읽지 않음)
+            for doc_id, point in points.items():
+                transaction.set(history_ref.document(doc_id), point, merge=True)
+            for resolution, deltas in series.items():
+                increments = {
+                    key: {bucket: firestore.Increment(delta) for bucket, delta in values.items()}
+                    for key, values in deltas.items()
+                }
+                transaction.set(stats_ref.document(f"cp_{resolution}"), increments, merge=True)
+            return reads, len(writes) + len(delete_refs) + 1 + len(points) + len(series)
+
+        reads, written = _apply(self.db.transaction())
+        count_reads(reads)
+        count_writes(written)
+        return [ref.id for ref, _, _ in writes]
+
+    def get_cp_series(self, guild_id, resolution):
+        doc = self._guild_ref(guild_id).collection('stats').document(f"cp_{resolution}").get()
+        count_reads(1)
+        return doc.to_dict() if doc.exists else {}
+
+    def get_cp_history(self, guild_id, mem_id, start_month, end_month):
+        from firebase_admin import firestore
+
+        # 문서ID "{멤버ID}_{YYYY-MM}" 범위 조회 한 번 (있는 달 문서만 읽음)
+        history_ref = self._guild_ref(guild_id).collection('cp_history')
+        query = (
+            history_ref
+            .where(filter=firestore.FieldFilter('__name__', '>=', history_ref.document(f"{mem_id}_{start_month}")))
+            .where(filter=firestore.FieldFilter('__name__', '<=', history_ref.document(f"{mem_id}_{end_month}")))
+        )
+        docs = [(doc.to_dict().get('month'), doc.to_dict()) for doc in query.stream()]
+        count_reads(max(len(docs), 1))
+        return docs
+
+    def get_daily(self, guild_id, date_str):
+        doc = self._guild_ref(guild_id).collection('daily_records').document(date_str).get()
+        count_reads(1)
+        return unpack_daily(doc.to_dict()) if doc.exists else {}
+
+    def save_daily(self, guild_id, date_str, record, rollups, base=None):
+        from firebase_admin import firestore
+
+        guild_ref = self._guild_ref(guild_id)
+        doc_ref = guild_ref.collection('daily_records').document(date_str)
+        rollups_ref = guild_ref.collection('rollups')
+        activity_ref = guild_ref.collection('stats').document('activity')
+
+        # 기존 기록과의 차이만큼만 집계 문서에 더하기 (같은 날짜를 다시 저장해도 중복 합산 X)
+        # 트랜잭션 중에 다른 저장이 끼어들면 Firestore가 _apply를 다시 실행하므로 충돌 체크도 최신 값으로 다시 함
+        # (읽기/쓰기 수도 마지막 실행 것만 돌려받아서 커밋 후에 셈)
+        @firestore.transactional
+        def _apply(transaction):
+            old_doc = doc_ref.get(transaction=transaction).to_dict()
+            old_record = unpack_daily(old_doc)
+            activity = activity_ref.get(transaction=transaction).to_dict()
+            rebuilding = (guild_ref.get(transaction=transaction).to_dict() or {}).get('rebuilding')
+            changes, conflicts = split_conflicts(old_record, record, base)
+            if not changes:
+                return conflicts, 0
+            deltas = record_deltas(old_record, changes)
+            new_record = merge_daily(old_record, changes)
+
+            # 바뀐 멤버의 행만 필드 경로로 고침 (문서가 없거나 예전 형식이면 통째로 저장)
+            patch = daily_row_patch(old_doc, new_record, changes)
+            if patch is None:
+                transaction.set(doc_ref, pack_daily(new_record))
+            else:
+                transaction.update(doc_ref, {
+                    firestore.FieldPath('rows', mem_id).to_api_repr(): row for mem_id, row in patch.items()
+                })
+            # 활동 여부가 바뀐 멤버가 있을 때만 활동 점수 상태 저장
+            activity = update_activity(activity, date_str, old_record, new_record)
+            if activity is not None:
+                transaction.set(activity_ref, activity)
+            if deltas:
+                increments = {
+                    mem_id: {field: firestore.Increment(delta) for field, delta in fields.items()}
+                    for mem_id, fields in deltas.items()
+                }
+                for doc_id, meta in rollups.items():
+                    transaction.set(rollups_ref.document(doc_id), dict(meta, members=increments), merge=True)
+            # 진행 중인 다시 만들기는 이 저장 전의 기록을 읽었을 수 있으므로 결과를 쓰지 못하게 함
+            stale_rebuild = bool(rebuilding) and new_record != old_record
+            if stale_rebuild:
+                transaction.update(guild_ref, {'rebuilding': firestore.DELETE_FIELD})
+            return conflicts, 1 + (activity is not None) + (len(rollups) if deltas else 0) + stale_rebuild
+
+        conflicts, written = _apply(self.db.transaction())
+        count_reads(3)
+        count_writes(written)
+        return conflicts
+
+    def get_daily_range(self, guild_id, start_str, end_str):
+        from firebase_admin import firestore
+
+        # 날짜 문서 ID("YYYY-MM-DD")는 문자열 순서 = 날짜 순서이므로,
+        # 하루씩 get() 하지 않고 문서 ID 범위 쿼리 한 번으로 기간 전체를 가져옵니다.
+        # (7일이든 365일이든 왕복 1회, 존재하는 날짜 문서만 읽음)
+        records_ref = self._guild_ref(guild_id).collection('daily_records')
+        query = (
+            records_ref
+            .where(filter=firestore.FieldFilter('__name__', '>=', records_ref.document(start_str)))
+            .where(filter=firestore.FieldFilter('__name__', '<=', records_ref.document(end_str)))
+        )
+        docs = [(doc.id, unpack_daily(doc.to_dict())) for doc in query.stream()]
+        count_reads(max(len(docs), 1))
+        return docs
+
+    def list_daily(self, guild_id):
+        docs = [(doc.id, unpack_daily(doc.to_dict()))
+                for doc in self._guild_ref(guild_id).collection('daily_records').stream()]
+        count_reads(max(len(docs), 1))
+        return docs
+
+    def compact_daily(self, guild_id, dry_run=False):
+        from firebase_admin import firestore
+
+        records_ref = self._guild_ref(guild_id).collection('daily_records')
+        stats = {'docs': 0, 'converted': 0, 'bytes_before': 0, 'bytes_after': 0}
+        pending = []
+        for doc in records_ref.stream():
+            data = doc.to_dict()
+            packed = data if is_packed_daily(data) else pack_daily(unpack_daily(data))
+            stats['docs'] += 1
+            stats['bytes_before'] += estimate_doc_size(data)
+            stats['bytes_after'] += estimate_doc_size(packed)
+            if packed is not data:
+                stats['converted'] += 1
+                pending.append(records_ref.document(doc.id))
+        count_reads(max(stats['docs'], 1))
+        if dry_run:
+            return stats
+
+        # 목록을 읽은 뒤 다른 운영진이 같은 날짜를 저장했을 수 있으므로,
+        # 문서마다 트랜잭션 안에서 다시 읽어서 변환 (그 사이 바뀌면 Firestore가 _convert를 다시 실행)
+        @firestore.transactional
+        def _convert(transaction, doc_ref):
+            snapshot = doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict()
+            if not snapshot.exists or is_packed_daily(data):
+                return 0  # 지워졌거나 이미 압축 형식으로 저장됨
+            transaction.set(doc_ref, pack_daily(unpack_daily(data)))
+            return 1
+
+        for doc_ref in pending:
+            written = _convert(self.db.transaction(), doc_ref)
+            count_reads(1)
+            count_writes(written)
+        return stats
+
+    def get_rollups(self, guild_id, doc_ids):
+        rollups_ref = self._guild_ref(guild_id).collection('rollups')
+        docs = list(self.db.get_all([rollups_ref.document(doc_id) for doc_id in doc_ids]))
+        count_reads(len(docs))  # 없는 문서도 읽기 1건으로 과금
+        return [(doc.id, doc.to_dict()) for doc in docs if doc.exists]
+
+    def replace_rollups(self, guild_id, rollups, token):
+        from firebase_admin import firestore
+
+        guild_ref = self._guild_ref(guild_id)
+        rollups_ref = guild_ref.collection('rollups')
+
+        # 표시 확인 + 덮어쓰기 + 남은 문서 삭제를 한 트랜잭션으로 (쓰기 500건까지: 주간+월간 문서 약 7년치)
+        @firestore.transactional
+        def _apply(transaction):
+            guild = guild_ref.get(transaction=transaction).to_dict()
+            existing = [doc.id for doc in rollups_ref.select(['period']).stream(transaction=transaction)]
+            reads = 1 + max(len(existing), 1)
+            if _rebuild_token(guild, 'rollups') != token:
+                return False, reads, 0
+            for doc_id, data in rollups.items():
+                transaction.set(rollups_ref.document(doc_id), data)
+            stale = [doc_id for doc_id in existing if doc_id not in rollups]
+            for doc_id in stale:
+                transaction.delete(rollups_ref.document(doc_id))
+            transaction.update(guild_ref, {
+                'rollups_built_at': datetime.now().isoformat(timespec='seconds'),
+                'rebuilding.rollups': firestore.DELETE_FIELD,
+            })
+            return True, reads, len(rollups) + len(stale) + 1
+
+        replaced, reads, written = _apply(self.db.transaction())
+        count_reads(reads)
+        count_writes(written)
+        return replaced
+
+    def get_activity(self, guild_id):
+        doc = self._guild_ref(guild_id).collection('stats').document('activity').get()
+        count_reads(1)
+        return doc.to_dict() if doc.exists else {}
+
+    def put_activity(self, guild_id, state):
+        self._guild_ref(guild_id).collection('stats').document('activity').set(state)
+        count_writes(1)
+
+    def replace_activity(self, guild_id, state, token):
+        from firebase_admin import firestore
+
+        guild_ref = self._guild_ref(guild_id)
+
+        @firestore.transactional
+        def _apply(transaction):
+            if _rebuild_token(guild_ref.get(transaction=transaction).to_dict(), 'activity') != token:
+                return False
+            transaction.set(guild_ref.collection('stats').document('activity'), state)
+            transaction.update(guild_ref, {'rebuilding.activity': firestore.DELETE_FIELD})
+            return True
+
+        replaced = _apply(self.db.transaction())
+        count_reads(1)
+        count_writes(2 if replaced else 0)
+        return replaced
+
+    def watch_guild(self, guild_id, date_str, on_members, on_daily):
+        # Firestore on_snapshot: 처음에 전체 문서를 한 번 읽고, 이후에는 바뀐 문서만 받음
+        guild_ref = self._guild_ref(guild_id)
+
+        def members_changed(docs, changes, read_time):
+            on_members([dict(doc.to_dict(), id=doc.id) for doc in docs])
+
+        def daily_changed(docs, changes, read_time):
+            doc = docs[0] if docs else None
+            on_daily(unpack_daily(doc.to_dict()) if doc is not None and doc.exists else {})
+
+        watches = [
+            guild_ref.collection('members').on_snapshot(members_changed),
+            guild_ref.collection('daily_records').document(date_str).on_snapshot(daily_changed),
+        ]
+
+        def unsubscribe():
+            for watch in watches:
+                watch.unsubscribe()
+        return unsubscribe
+
+    def list_guilds(self):
+        docs = list(self.db.collection('guilds').select(GUILD_SUMMARY_FIELDS).stream())
+        count_reads(max(len(docs), 1))
+        return [(doc.id, doc.to_dict()) for doc in docs]
+
+    def member_totals(self, guild_id):
+        # 집계 쿼리: 멤버 문서를 내려받지 않고 서버에서 인원/합계만 계산 (인덱스 항목 1000개당 읽기 1건)
+        query = self._guild_ref(guild_id).collection('members').count(alias='members').sum('cp', alias='cp_total')
+        values = {agg.alias: agg.value for result in query.get() for agg in result}
+        members = int(values.get('members') or 0)
+        count_reads(max(-(-members // 1000), 1))
+        return {'members': members, 'cp_total': float(values.get('cp_total') or 0)}
+
+    def group_rollups(self, label):
+        from firebase_admin import firestore
+
+        # 모든 길드의 rollups 하위 컬렉션을 한 번에 조회
+        # (Firestore 콘솔에서 rollups.label 필드에 '컬렉션 그룹' 범위 색인을 켜 두어야 합니다)
+        query = self.db.collection_group('rollups').where(filter=firestore.FieldFilter('label', '==', label))
+        docs = list(query.stream())
+        count_reads(max(len(docs), 1))
+        return [(doc.reference.parent.parent.id, doc.to_dict()) for doc in docs]
+
+    def get_leaderboard(self, doc_id):
+        doc = self.db.collection('leaderboards').document(doc_id).get()
+        count_reads(1)
+        return doc.to_dict() if doc.exists else None
+
+    def put_leaderboard(self, doc_id, data):
+        self.db.collection('leaderboards').document(doc_id).set(data)
+        count_writes(1)
+
+
+# --- 로컬 저장소 공통 (메모리 / SQLite) ---
+class _LocalStore(GuildStore):
+    """
+    '컬렉션 경로 + 문서ID -> dict' 단순 저장 위에 GuildStore 규칙을 구현
+    하위 클래스는 _get / _put / _delete / _list / _list_group 만 구현하면 됩니다.
+    여러 세션이 동시에 써도 안전하도록 쓰기는 _atomic() 안에서 합니다.
+    읽기/쓰기 수는 아래 래퍼에서 Firestore와 같은 기준(문서 1개 = 1건)으로 셉니다.
+    _atomic()이 성공적으로 끝나면 바뀐 문서를 감시 중인 콜백(watch_guild)에 알려줍니다.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._changed = set()    # 진행 중인 _atomic 안에서 바뀐 (컬렉션, 문서ID)
+        self._watchers = {}      # {컬렉션: [(문서ID 또는 None(전체), 콜백)]}
+
+    # 트랜잭션 시작/확정/취소 (SQLite만 사용)
+    def _begin(self):
+        pass
+
+    def _commit(self):
+        pass
+
+    def _rollback(self):
+        pass
+
+    @contextmanager
+    def _atomic(self):
+        changed = set()
+        with self._lock:
+            self._depth += 1
+            outermost = self._depth == 1
+            if outermost:
+                self._begin()
+            try:
+                yield
+            except BaseException:
+                if outermost:
+                    self._rollback()
+                    self._changed.clear()
+                raise
+            else:
+                if outermost:
+                    self._commit()
+                    changed, self._changed = self._changed, set()
+            finally:
+                self._depth -= 1
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, changed):
+        with self._lock:
+            callbacks = []
+            for collection, doc_id in changed:
+                for watched_id, callback in self._watchers.get(collection, []):
+                    if (watched_id is None or watched_id == doc_id) and callback not in callbacks:
+                        callbacks.append(callback)
+        for callback in callbacks:
+            callback()
+
+    @abstractmethod
+    def _get(self, collection, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _put(self, collection, doc_id, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _delete(self, collection, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _list(self, collection, start=None, end=None):
+        # [(문서ID, 데이터), ...] 문서ID 순, start/end는 포함 범위
+        raise NotImplementedError
+
+    @abstractmethod
+    def _list_group(self, name):
+        # 경로가 .../{name} 인 모든 컬렉션의 문서 [(컬렉션 경로, 문서ID, 데이터), ...] (컬렉션 그룹 조회)
+        raise NotImplementedError
+
+    def _read(self, collection, doc_id):
+        count_reads(1)
+        return self._get(collection, doc_id)
+
+    def _write(self, collection, doc_id, data):
+        count_writes(1)
+        self._put(collection, doc_id, data)
+        self._changed.add((collection, doc_id))
+
+    def _remove(self, collection, doc_id):
+        count_writes(1)
+        self._delete(collection, doc_id)
+        self._changed.add((collection, doc_id))
+
+    def _query(self, collection, start=None, end=None):
+        docs = self._list(collection, start, end)
+        count_reads(max(len(docs), 1))
+        return docs
+
+    @staticmethod
+    def _now():
+        return datetime.now(timezone.utc).isoformat()
+
+    def _end_rebuild(self, guild_id, guild, kind, **fields):
+        # 길드 문서에서 rebuilding.{kind} 표시를 지우고 fields를 같이 저장
+        rebuilding = {k: v for k, v in guild['rebuilding'].items() if k != kind}
+        self._write('guilds', guild_id, dict(guild, rebuilding=rebuilding, **fields))
+
+    def get_guild(self, guild_id):
+        return self._read('guilds', guild_id)
+
+    def create_guild(self, guild_id, data):
+        with self._atomic():
+            if self._get('guilds', guild_id) is not None:
+                return False
+            self._write('guilds', guild_id, dict(data, created_at=self._now()))
+        return True
+
+    def update_guild(self, guild_id, fields):
+        with self._atomic():
+            self._write('guilds', guild_id, _deep_merge(self._get('guilds', guild_id) or {}, fields))
+
+    def list_members(self, guild_id):
+        return [dict(data, id=mem_id) for mem_id, data in self._query(f"guilds/{guild_id}/members")]
+
+    def write_members(self, guild_id, upserts=(), deletes=(), role_limits=None, now=None):
+        collection = f"guilds/{guild_id}/members"
+        with self._atomic():
+            guild = self._read('guilds', guild_id) or {}
+            counts, cp_total, member_count = guild.get('role_counts'), guild.get('cp_total'), guild.get('member_count')
+            if counts is None or cp_total is None or member_count is None:
+                roster = [data for _, data in self._query(collection)]
+                counts, cp_total, member_count = count_roles(roster), roster_cp_total(roster), len(roster)
+
+            writes = []
+            moves = []
+            cp_moves = []
+            deleted_cps = []
+            missing = []
+            for mem_id, fields in upserts:
+                old = self._read(collection, mem_id) if mem_id else {}
+                if old is None:
+                    missing.append(mem_id)
+                    continue
+                old_role = old.get('role')
+                old_cp = old.get('cp')
+                new_id = mem_id or uuid.uuid4().hex[:20]
+                data = _deep_merge(old, dict(fields, updated_at=self._now()))
+                writes.append((new_id, data))
+                moves.append((old_role, data.get('role')))
+                if 'cp' in fields:
+                    cp_moves.append((new_id, mem_id is None, old_cp, data['cp']))
+            for mem_id in deletes:
+                old = self._read(collection, mem_id)
+                if old is not None:
+                    moves.append((old.get('role'), None))
+                    deleted_cps.append(old.get('cp'))
+            # Firestore와 같게: 삭제된 멤버를 다시 만들지 않고 저장 전체를 취소
+            if missing:
+                raise MemberNotFound(missing)
+
+            counts, exceeded = apply_role_moves(counts, moves, role_limits or {})
+            if exceeded:
+                raise RoleQuotaExceeded(exceeded)
+
+            for mem_id, data in writes:
+                self._write(collection, mem_id, data)
+            for mem_id in deletes:
+                self._remove(collection, mem_id)
+            points, series = cp_changes(cp_moves, deleted=deleted_cps, now=now)
+            self._write('guilds', guild_id, dict(guild, role_counts=counts, cp_total=cp_total + series_cp_delta(series),
+                                                 member_count=member_count + series_member_delta(series)))
+
+            # Firestore는 merge/Increment로 읽지 않고 저장하므로 기록 문서 읽기는 세지 않음
+            for doc_id, point in points.items():
+                history = f"guilds/{guild_id}/cp_history"
+                self._write(history, doc_id, _deep_merge(self._get(history, doc_id) or {}, point))
+            for resolution, deltas in series.items():
+                stats = f"guilds/{guild_id}/stats"
+                doc = self._get(stats, f"cp_{resolution}") or {}
+                for key, values in deltas.items():
+                    totals = doc.setdefault(key, {})
+                    for bucket, delta in values.items():
+                        totals[bucket] = (totals.get(bucket) or 0) + delta
+                self._write(stats, f"cp_{resolution}", doc)
+        return [mem_id for mem_id, _ in writes]
+
+    def get_cp_series(self, guild_id, resolution):
+        return self._read(f"guilds/{guild_id}/stats", f"cp_{resolution}") or {}
+
+    def get_cp_history(self, guild_id, mem_id, start_month, end_month):
+        docs = self._query(f"guilds/{guild_id}/cp_history", f"{mem_id}_{start_month}", f"{mem_id}_{end_month}")
+        return [(doc.get('month'), doc) for _, doc in docs]
+
+    def get_daily(self, guild_id, date_str):
+        return unpack_daily(self._read(f"guilds/{guild_id}/daily_records", date_str))
+
+    def save_daily(self, guild_id, date_str, record, rollups, base=None):
+        records = f"guilds/{guild_id}/daily_records"
+        with self._atomic():
+            old_doc = self._read(records, date_str)
+            old_record = unpack_daily(old_doc)
+            guild = self._read('guilds', guild_id)
+            changes, conflicts = split_conflicts(old_record, record, base)
+            if not changes:
+                return conflicts
+            deltas = record_deltas(old_record, changes)
+            new_record = merge_daily(old_record, changes)
+            if guild and guild.get('rebuilding') and new_record != old_record:
+                # 진행 중인 다시 만들기는 이 저장 전의 기록을 읽었을 수 있으므로 결과를 쓰지 못하게 함
+                self._write('guilds', guild_id, {k: v for k, v in guild.items() if k != 'rebuilding'})
+            patch = daily_row_patch(old_doc, new_record, changes)
+            if patch is None:
+                self._write(records, date_str, pack_daily(new_record))
+            else:
+                old_doc['rows'].update(patch)
+                self._write(records, date_str, old_doc)
+            activity = update_activity(self._read(f"guilds/{guild_id}/stats", 'activity'), date_str, old_record, new_record)
+            if activity is not None:
+                self._write(f"guilds/{guild_id}/stats", 'activity', activity)
+            if not deltas:
+                return conflicts
+            for doc_id, meta in rollups.items():
+                # Firestore는 Increment로 읽지 않고 더하므로 집계 문서 읽기는 세지 않음
+                rollup = self._get(f"guilds/{guild_id}/rollups", doc_id) or {}
+                rollup.update(meta)
+                members = rollup.setdefault('members', {})
+                for mem_id, fields in deltas.items():
+                    totals = members.setdefault(mem_id, {})
+                    for field, delta in fields.items():
+                        totals[field] = (totals.get(field) or 0) + delta
+                self._write(f"guilds/{guild_id}/rollups", doc_id, rollup)
+        return conflicts
+
+    def get_daily_range(self, guild_id, start_str, end_str):
+        return [(d, unpack_daily(doc)) for d, doc in self._query(f"guilds/{guild_id}/daily_records", start_str, end_str)]
+
+    def list_daily(self, guild_id):
+        return [(d, unpack_daily(doc)) for d, doc in self._query(f"guilds/{guild_id}/daily_records")]
+
+    def compact_daily(self, guild_id, dry_run=False):
+        collection = f"guilds/{guild_id}/daily_records"
+        stats = {'docs': 0, 'converted': 0, 'bytes_before': 0, 'bytes_after': 0}
+        with self._atomic():
+            for date_str, data in self._query(collection):
+                packed = data if is_packed_daily(data) else pack_daily(unpack_daily(data))
+                stats['docs'] += 1
+                stats['bytes_before'] += estimate_doc_size(data)
+                stats['bytes_after'] += estimate_doc_size(packed)
+                if packed is not data:
+                    stats['converted'] += 1
+                    if not dry_run:
+                        self._write(collection, date_str, packed)
+        return stats
+
+    def get_rollups(self, guild_id, doc_ids):
+        collection = f"guilds/{guild_id}/rollups"
+        found = []
+        for doc_id in doc_ids:
+            data = self._read(collection, doc_id)
+            if data is not None:
+                found.append((doc_id, data))
+        return found
+
+    def replace_rollups(self, guild_id, rollups, token):
+        collection = f"guilds/{guild_id}/rollups"
+        with self._atomic():
+            guild = self._read('guilds', guild_id)
+            existing = self._query(collection)
+            if _rebuild_token(guild, 'rollups') != token:
+                return False
+            for doc_id, data in rollups.items():
+                self._write(collection, doc_id, data)
+            for doc_id, _ in existing:
+                if doc_id not in rollups:
+                    self._remove(collection, doc_id)
+            self._end_rebuild(guild_id, guild, 'rollups',
+                              rollups_built_at=datetime.now().isoformat(timespec='seconds'))
+        return True
+
+    def get_activity(self, guild_id):
+        return self._read(f"guilds/{guild_id}/stats", 'activity') or {}
+
+    def put_activity(self, guild_id, state):
+        with self._atomic():
+            self._write(f"guilds/{guild_id}/stats", 'activity', state)
+
+    def replace_activity(self, guild_id, state, token):
+        with self._atomic():
+            guild = self._read('guilds', guild_id)
+            if _rebuild_token(guild, 'activity') != token:
+                return False
+            self._write(f"guilds/{guild_id}/stats", 'activity', state)
+            self._end_rebuild(guild_id, guild, 'activity')
+        return True
+
+    def watch_guild(self, guild_id, date_str, on_members, on_daily):
+        # 같은 프로세스 안의 쓰기만 있으므로, _atomic()이 끝날 때 바뀐 문서를 보고 콜백 호출
+        members = f"guilds/{guild_id}/members"
+        records = f"guilds/{guild_id}/daily_records"
+
+        def members_changed():
+            on_members([dict(data, id=mem_id) for mem_id, data in self._list(members)])
+
+        def daily_changed():
+            on_daily(unpack_daily(self._get(records, date_str)))
+
+        watches = [(members, None, members_changed), (records, date_str, daily_changed)]
+        with self._lock:
+            for collection, doc_id, callback in watches:
+                self._watchers.setdefault(collection, []).append((doc_id, callback))
+        members_changed()
+        daily_changed()
+
+        def unsubscribe():
+            with self._lock:
+                for collection, doc_id, callback in watches:
+                    if (doc_id, callback) in self._watchers.get(collection, []):
+                        self._watchers[collection].remove((doc_id, callback))
+        return unsubscribe
+
+    def list_guilds(self):
+        return [(guild_id, {key: data[key] for key in GUILD_SUMMARY_FIELDS if key in data})
+                for guild_id, data in self._query('guilds')]
+
+    def member_totals(self, guild_id):
+        # Firestore 집계 쿼리와 같은 기준으로 셈 (멤버 1000명당 읽기 1건)
+        members = [data for _, data in self._list(f"guilds/{guild_id}/members")]
+        count_reads(max(-(-len(members) // 1000), 1))
+        return {'members': len(members), 'cp_total': roster_cp_total(members)}
+
+    def group_rollups(self, label):
+        docs = [(collection.split('/')[1], data) for collection, _, data in self._list_group('rollups')
+                if data.get('label') == label]
+        count_reads(max(len(docs), 1))
+        return docs
+
+    def get_leaderboard(self, doc_id):
+        return self._read('leaderboards', doc_id)
+
+    def put_leaderboard(self, doc_id, data):
+        with self._atomic():
+            self._write('leaderboards', doc_id, data)
+
+
+class MemoryStore(_LocalStore):
+    """서버 프로세스 메모리에만 저장 (재시작하면 사라짐)"""
+
+    def __init__(self):
+        super().__init__()
+        self._collections = {}
+
+    def _get(self, collection, doc_id):
+        with self._lock:
+            data = self._collections.get(collection, {}).get(doc_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def _put(self, collection, doc_id, data):
+        with self._lock:
+            self._collections.setdefault(collection, {})[doc_id] = copy.deepcopy(data)
+
+    def _delete(self, collection, doc_id):
+        with self._lock:
+            self._collections.get(collection, {}).pop(doc_id, None)
+
+    def _list(self, collection, start=None, end=None):
+        with self._lock:
+            docs = self._collections.get(collection, {})
+            return [
+                (doc_id, copy.deepcopy(docs[doc_id])) for doc_id in sorted(docs)
+                if (start is None or doc_id >= start) and (end is None or doc_id <= end)
+            ]
+
+    def _list_group(self, name):
+        with self._lock:
+            return [
+                (collection, doc_id, copy.deepcopy(data))
+                for collection, docs in sorted(self._collections.items()) if collection.rsplit('/', 1)[-1] == name
+                for doc_id, data in sorted(docs.items())
+            ]
+
+
+class SQLiteStore(_LocalStore):
+    """로컬 SQLite 파일에 문서를 JSON으로 저장 (컬렉션+문서ID 기본키로 범위 조회)"""
+
+    def __init__(self, path="guild.db"):
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, id)) WITHOUT ROWID"
+        )
+
+    def _begin(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def _commit(self):
+        self._conn.execute("COMMIT")
+
+    def _rollback(self):
+        self._conn.execute("ROLLBACK")
+
+    def _get(self, collection, doc_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM docs WHERE collection = ? AND id = ?", (collection, doc_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, collection, doc_id, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO docs (collection, id, data) VALUES (?, ?, ?)",
+                (collection, doc_id, json.dumps(data, ensure_ascii=False))
+            )
+
+    def _delete(self, collection, doc_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE collection = ? AND id = ?", (collection, doc_id))
+
+    def _list(self, collection, start=None, end=None):
+        sql = "SELECT id, data FROM docs WHERE collection = ?"
+        params = [collection]
+        if start is not None:
+            sql += " AND id >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND id <= ?"
+            params.append(end)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id", params).fetchall()
+        return [(doc_id, json.loads(data)) for doc_id, data in rows]
+
+    def _list_group(self, name):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collection, id, data FROM docs WHERE collection LIKE ? ORDER BY collection, id",
+                (f"%/{name}",)
+            ).fetchall()
+        return [(collection, doc_id, json.loads(data)) for collection, doc_id, data in rows]
@@ -0,0 +1,277 @@
+"""
+OCR 작업자 프로세스 풀 (EasyOCR을 Streamlit 서버 밖에서 실행)
+
+EasyOCR은 CPU를 오래 쓰기 때문에 서버 프로세스 안에서 돌리면, 한 운영진의 스캔이 끝날 때까지
+같은 서버의 다른 세션 화면까지 느려집니다. 여기서는 작업자 프로세스 몇 개를 따로 띄우고
+(각자 ['ko', 'en'] 모델을 한 번만 불러옴), 앱은 작업을 넣고(submit) 결과를 확인(poll)만 합니다.
+
+- 동시에 도는 작업 수 = 작업자 수, 그 이상은 대기열에서 순서대로 기다립니다.
+- 대기열도 max_jobs 개까지만 받고, 넘치면 QueueFull (화면에서 잠시 후 다시 시도 안내)
+- 작업자마다 CPU 코어를 나눠 쓰도록 torch 스레드 수를 (코어 수 / 작업자 수)로 맞춥니다.
+
+이미지 전처리(패널 자르기, 축소, 대비 보정)도 작업자 안에서 합니다.
+앱(game_guild.py)은 결과 캐시 확인과 인식 글자 분석만 합니다.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+# [새로 추가] OCR 전처리 설정 (모드별 프리셋)
+# crop_panel: 게임 화면에서 밝은 팝업 패널(길드 내역 / 현자 결과창)만 잘라내기
+# text_height: 글자 줄 높이를 이 픽셀 정도로 축소 (원본 폰 스크린샷은 글자가 필요 이상으로 큼)
+# clahe_clip: 대비 보정 강도
+OCR_PRESETS = {
+    "donation": {"crop_panel": True, "min_panel_ratio": 0.15, "text_height": 22, "clahe_clip": 2.0},
+    "sage": {"crop_panel": True, "min_panel_ratio": 0.08, "text_height": 28, "clahe_clip": 2.0},
+}
+
+
+def _find_panel(gray, min_ratio):
+    import cv2
+    import numpy as np
+    # 어두운 배경 위의 밝은 팝업창 중 가장 큰 것의 영역 (x, y, w, h), 못 찾으면 None
+    _, mask = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    if w * h < gray.size * min_ratio:
+        return None
+    return x, y, w, h
+
+
+def _estimate_text_height(gray):
+    import cv2
+    import numpy as np
+    # 가로 방향 글자 밀도로 글자 줄을 찾아서, 줄 높이의 중앙값을 반환
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    rows = (ink > 0).mean(axis=1) > 0.08
+    runs = []
+    start = None
+    for i, is_text in enumerate(list(rows) + [False]):
+        if is_text and start is None:
+            start = i
+        elif not is_text and start is not None:
+            runs.append(i - start)
+            start = None
+    # 너무 얇은 선(테두리)이나 너무 두꺼운 덩어리(제목 배너)는 제외
+    runs = [r for r in runs if 8 <= r <= gray.shape[0] / 5]
+    return float(np.median(runs)) if runs else None
+
+
+def preprocess_for_ocr(image_bytes, scan_mode):
+    """
+    EasyOCR에 넣기 전 이미지 정리: 흑백 -> 패널 잘라내기 -> 글자 크기 맞춰 축소 -> 대비 보정
+    이미지를 읽지 못하면 None (원본 그대로 OCR)
+    """
+    import cv2
+    import numpy as np
+    preset = OCR_PRESETS.get(scan_mode, OCR_PRESETS["donation"])
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None
+
+    if preset["crop_panel"]:
+        panel = _find_panel(gray, preset["min_panel_ratio"])
+        if panel:
+            x, y, w, h = panel
+            gray = gray[y:y + h, x:x + w]
+
+    text_h = _estimate_text_height(gray)
+    if text_h and text_h > preset["text_height"]:
+        scale = preset["text_height"] / text_h
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    clahe = cv2.createCLAHE(clipLimit=preset["clahe_clip"], tileGridSize=(8, 8))
+    return clahe.apply(gray)
+
+
+def _pad_to_same_size(images):
+    import cv2
+    # 배치 인식은 같은 크기 이미지만 받으므로, 가장 큰 크기에 맞춰 흰 여백 추가
+    max_h = max(img.shape[0] for img in images)
+    max_w = max(img.shape[1] for img in images)
+    return [
+        cv2.copyMakeBorder(img, 0, max_h - img.shape[0], 0, max_w - img.shape[1],
+                           cv2.BORDER_CONSTANT, value=255)
+        for img in images
+    ]
+
+
+def recognize_pages(pages, scan_mode, reader):
+    """
+    스크린샷 여러 장(bytes) -> 장마다 인식한 글자를 공백으로 이은 문자열 (읽지 못한 장은 None)
+    기부 내역은 여러 장을 한 번의 배치 인식으로, 현자 결과는 전처리에 실패하면 원본으로 인식합니다.
+    """
+    texts = [None] * len(pages)
+    images = {}
+    for i, image_bytes in enumerate(pages):
+        image = preprocess_for_ocr(image_bytes, scan_mode)
+        if image is not None:
+            images[i] = image
+        elif scan_mode != "donation":
+            images[i] = image_bytes
+
+    if scan_mode == "donation" and images:
+        results = reader.readtext_batched(_pad_to_same_size(list(images.values())), detail=0)
+    else:
+        results = [reader.readtext(image, detail=0) for image in images.values()]
+    for i, result in zip(images.keys(), results):
+        texts[i] = " ".join(result)
+    return texts
+
+
+# --- 작업자 프로세스 안에서 실행되는 부분 ---
+_reader = None
+
+
+def _load_reader():
+    global _reader
+    if _reader is None:
+        import easyocr
+        _reader = easyocr.Reader(['ko', 'en'], gpu=False)
+    return _reader
+
+
+def _init_worker(threads):
+    # 작업자 시작 시 1번: CPU 코어 나눠 쓰기 + 모델 미리 불러오기 (실패하면 첫 작업 때 다시 시도)
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+        import torch
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    try:
+        _load_reader()
+    except Exception as e:
+        print(f"⚠️ OCR 작업자({os.getpid()}) 모델 불러오기 실패: {e}")
+
+
+def _recognize_job(pages, scan_mode):
+    start = time.perf_counter()
+    texts = recognize_pages(pages, scan_mode, _load_reader())
+    return {"texts": texts, "ms": (time.perf_counter() - start) * 1000, "pid": os.getpid()}
+
+
+def _ping():
+    return os.getpid()
+
+
+def usable_cpus():
+    # 이 프로세스가 실제로 쓸 수 있는 코어 수 (컨테이너/taskset 제한 반영, 지원 안 하는 OS는 전체 코어 수)
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+class QueueFull(Exception):
+    """대기 중인 OCR 작업이 너무 많음 (잠시 후 다시 시도)"""
+
+
+class OcrPool:
+    def __init__(self, workers, max_jobs=None, keep_seconds=600):
+        self.workers = workers
+        self.max_jobs = max_jobs or workers * 4
+        self.keep_seconds = keep_seconds
+        self.threads = max(usable_cpus() // workers, 1)
+        self._executor = None
+        self._jobs = {}    # {작업ID: {'future', 'submitted', 'finished'}}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # 작업자는 spawn으로 띄움 (스레드가 많은 Streamlit 서버를 fork 하지 않도록)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context("spawn"),
+                initializer=_init_worker, initargs=(self.threads,),
+            )
+        return self._executor
+
+    def _submit(self, func, *args):
+        try:
+            return self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            # 작업자가 죽었으면(메모리 부족 등) 풀을 새로 만들어서 한 번 더
+            self._executor = None
+            return self._get_executor().submit(func, *args)
+
+    def warm_up(self):
+        # 작업자를 모두 미리 띄워서 모델을 불러 두기 (첫 스캔이 모델 로딩을 기다리지 않도록)
+        with self._lock:
+            for _ in range(self.workers):
+                self._submit(_ping)
+
+    def submit(self, pages, scan_mode):
+        """스크린샷 bytes 목록을 인식 작업으로 넣기 -> 작업ID (대기열이 가득 차면 QueueFull)"""
+        with self._lock:
+            self._forget_finished()
+            active = sum(1 for job in self._jobs.values() if not job['future'].done())
+            if active >= self.max_jobs:
+                raise QueueFull(active)
+            job_id = uuid.uuid4().hex
+            job = {'future': self._submit(_recognize_job, list(pages), scan_mode),
+                   'submitted': time.monotonic(), 'finished': None}
+            job['future'].add_done_callback(lambda _: job.update(finished=time.monotonic()))
+            self._jobs[job_id] = job
+        return job_id
+
+    def poll(self, job_id):
+        """
+        작업 상태 -> {'state': 'queued' | 'running' | 'done' | 'error' | 'missing', ...}
+        queued는 'ahead'(앞에 기다리는 작업 수), done은 'texts', error는 'error' 포함
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {'state': 'missing'}
+            future = job['future']
+            elapsed = time.monotonic() - job['submitted']
+            if future.done():
+                error = future.exception()
+                if error is not None:
+                    return {'state': 'error', 'error': str(error) or type(error).__name__, 'elapsed': elapsed}
+                return dict(future.result(), state='done', elapsed=elapsed)
+            ahead = sum(1 for other in self._jobs.values()
+                        if not other['future'].done() and other['submitted'] < job['submitted'])
+            if ahead < self.workers:
+                return {'state': 'running', 'elapsed': elapsed}
+            return {'state': 'queued', 'ahead': ahead - self.workers + 1, 'elapsed': elapsed}
+
+    def wait(self, job_id, timeout=None):
+        """작업이 끝날 때까지 기다렸다가 poll() 결과 반환 (벤치마크/동기 호출용)"""
+        with self._lock:
+            future = self._jobs[job_id]['future']
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+        return self.poll(job_id)
+
+    def forget(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _forget_finished(self):
+        # 결과를 가져가지 않은 채 오래된 작업 정리
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job['finished'] is not None and now - job['finished'] > self.keep_seconds:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job['future'].done())
+        return {'workers': self.workers, 'running': min(pending, self.workers),
+                'queued': max(pending - self.workers, 0)}
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
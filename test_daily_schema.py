@@ -0,0 +1,95 @@
+"""
+일일 기록 문서 형식(v1/v3)과 compact_daily 마이그레이션 테스트
+
+    python -m pytest -q test_daily_schema.py
+"""
+import pytest
+
+from guild_store import (
+    DAILY_SCHEMA_VERSION, MemoryStore, SQLiteStore, daily_row_patch, is_packed_daily, merge_daily,
+    pack_daily, unpack_daily,
+)
+
+RECORD = {
+    'mem_a': {'don_basic': 3, 'don_inter': 1, 'sage_dmg': 1.5, 'sage_kill': 2},
+    'mem_b': {'don_item': 7},
+    'mem_c': {'don_basic': 0, 'sage_dmg': 12.25, 'memo_flag': 1},  # 기본 필드가 아닌 필드도 그대로
+}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(":memory:")
+
+
+def test_v1_round_trip():
+    packed = pack_daily(RECORD)
+    assert is_packed_daily(packed)
+    assert packed['_schema'] == DAILY_SCHEMA_VERSION
+    assert unpack_daily(packed) == RECORD
+    # v1 문서는 읽을 때 그대로
+    assert unpack_daily(RECORD) == RECORD
+
+
+def test_empty_docs():
+    assert unpack_daily(None) == {}
+    assert unpack_daily({}) == {}
+    assert unpack_daily(pack_daily({})) == {}
+
+
+def test_pack_keeps_base_field_order():
+    # 행만 고칠 때 열이 어긋나지 않도록 기본 필드는 항상 앞에 같은 순서
+    assert pack_daily({'m': {'sage_kill': 1}})['fields'][:6] == pack_daily(RECORD)['fields'][:6]
+
+
+def test_row_patch_equals_full_repack():
+    doc = pack_daily(RECORD)
+    changes = {'mem_b': {'don_item': 8, 'sage_dmg': 3.0}, 'mem_new': {'don_basic': 1}}
+    new_record = merge_daily(RECORD, changes)
+
+    patch = daily_row_patch(doc, new_record, changes)
+    assert set(patch) == {'mem_b', 'mem_new'}
+    doc['rows'].update(patch)
+    assert doc == pack_daily(new_record)
+    assert unpack_daily(doc) == new_record
+
+
+def test_row_patch_needs_full_write():
+    new_record = merge_daily(RECORD, {'mem_a': {'new_field': 1}})
+    # 문서에 없는 필드를 새로 씀
+    assert daily_row_patch(pack_daily(RECORD), new_record, ['mem_a']) is None
+    # 문서가 없거나 예전 형식
+    assert daily_row_patch(None, RECORD, ['mem_a']) is None
+    assert daily_row_patch(RECORD, RECORD, ['mem_a']) is None
+
+
+def test_save_daily_patch_matches_full_pack(store):
+    store.save_daily('g', '2024-03-05', RECORD, {})
+    store.save_daily('g', '2024-03-05', {'mem_a': {'don_basic': 5}}, {})
+    expected = merge_daily(RECORD, {'mem_a': {'don_basic': 5}})
+    assert store._get('guilds/g/daily_records', '2024-03-05') == pack_daily(expected)
+    assert store.get_daily('g', '2024-03-05') == expected
+
+
+def test_compact_daily_converts_and_is_idempotent(store):
+    records = 'guilds/g/daily_records'
+    store._put(records, '2024-03-01', RECORD)
+    store._put(records, '2024-03-02', {'mem_b': {'don_item': 7}})
+    store._put(records, '2024-03-03', pack_daily(RECORD))
+    before = store.list_daily('g')
+
+    dry = store.compact_daily('g', dry_run=True)
+    assert (dry['docs'], dry['converted']) == (3, 2)
+    assert store._get(records, '2024-03-01') == RECORD  # dry_run은 저장하지 않음
+
+    stats = store.compact_daily('g')
+    assert (stats['docs'], stats['converted']) == (3, 2)
+    assert all(is_packed_daily(store._get(records, d)) for d in ('2024-03-01', '2024-03-02', '2024-03-03'))
+    assert store.list_daily('g') == before
+
+    again = store.compact_daily('g')
+    assert (again['docs'], again['converted']) == (3, 0)
+    assert again['bytes_before'] == again['bytes_after']
+    assert store.list_daily('g') == before
@@ -0,0 +1,194 @@
+"""
+저장소 공용 규칙 테스트 (메모리 / SQLite 저장소에서 똑같이 동작하는지)
+
+    python -m pytest -q test_guild_store.py
+"""
+import pytest
+
+from guild_store import (
+    MemberNotFound, MemoryStore, RoleQuotaExceeded, SQLiteStore, count_roles, roster_cp_total,
+)
+
+LIMITS = {'길드장': 1, '부길드장': 2}
+DAY = '2024-03-05'
+ROLLUPS = {
+    'week_2024-W10': {'period': 'week', 'label': '2024-W10', 'start': '2024-03-04'},
+    'month_2024-03': {'period': 'month', 'label': '2024-03', 'start': '2024-03-01'},
+}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request):
+    store = MemoryStore() if request.param == "memory" else SQLiteStore(":memory:")
+    store.create_guild('g', {'name': "테스트"})
+    return store
+
+
+def add(store, name, role, cp=100):
+    return store.write_members('g', upserts=[(None, {'name': name, 'role': role, 'cp': cp})],
+                               role_limits=LIMITS)[0]
+
+
+def assert_totals_match_roster(store):
+    # 길드 문서에 쌓아 둔 카운터/합계/인원이 명단을 직접 센 값과 같아야 함
+    guild = store.get_guild('g')
+    roster = store.list_members('g')
+    # 직책을 옮기면 빈 직책이 0으로 남을 수 있음
+    assert {role: n for role, n in guild['role_counts'].items() if n} == count_roles(roster)
+    assert guild['cp_total'] == roster_cp_total(roster)
+    assert guild['member_count'] == len(roster)
+    assert store.member_totals('g') == {'members': len(roster), 'cp_total': roster_cp_total(roster)}
+
+
+# --- 길드원 ---
+def test_quota_rejects_and_saves_nothing(store):
+    add(store, "장", '길드장')
+    with pytest.raises(RoleQuotaExceeded) as e:
+        store.write_members('g', upserts=[(None, {'name': "일반1", 'role': '일반', 'cp': 10}),
+                                          (None, {'name': "장2", 'role': '길드장', 'cp': 10})],
+                            role_limits=LIMITS)
+    assert e.value.role == '길드장'
+    assert [m['name'] for m in store.list_members('g')] == ["장"]
+    assert_totals_match_roster(store)
+
+
+def test_member_not_found_saves_nothing(store):
+    mem_id = add(store, "a", '일반', cp=50)
+    gone = add(store, "b", '일반', cp=70)
+    store.write_members('g', deletes=[gone])
+    with pytest.raises(MemberNotFound) as e:
+        store.write_members('g', upserts=[(mem_id, {'cp': 999}), (gone, {'cp': 1})], role_limits=LIMITS)
+    assert e.value.member_ids == [gone]
+    assert [(m['id'], m['cp']) for m in store.list_members('g')] == [(mem_id, 50)]
+    assert_totals_match_roster(store)
+
+
+def test_role_swap_at_limit(store):
+    leader = add(store, "장", '길드장')
+    vice = add(store, "부", '부길드장')
+    store.write_members('g', upserts=[(leader, {'role': '부길드장'}), (vice, {'role': '길드장'})],
+                        role_limits=LIMITS)
+    roles = {m['id']: m['role'] for m in store.list_members('g')}
+    assert roles == {leader: '부길드장', vice: '길드장'}
+    assert store.get_guild('g')['role_counts'] == {'길드장': 1, '부길드장': 1}
+
+
+def test_update_keeps_other_fields(store):
+    mem_id = add(store, "a", '부길드장', cp=10)
+    store.write_members('g', upserts=[(mem_id, {'cp': 20})], role_limits=LIMITS)
+    member = store.list_members('g')[0]
+    assert (member['name'], member['role'], member['cp']) == ("a", '부길드장', 20)
+
+
+def test_totals_follow_adds_updates_deletes(store):
+    a = add(store, "a", '길드장', cp=100)
+    b = add(store, "b", None, cp=300)   # 직책 없는 멤버도 인원에 셈
+    add(store, "c", '일반', cp=True)     # 숫자가 아닌 전투력은 합계에서 뺌
+    assert_totals_match_roster(store)
+    assert store.member_totals('g')['cp_total'] == 400
+
+    store.write_members('g', upserts=[(a, {'cp': 150, 'role': '일반'})], deletes=[b], role_limits=LIMITS)
+    assert_totals_match_roster(store)
+    guild = store.get_guild('g')
+    assert (guild['cp_total'], guild['member_count']) == (150, 2)
+
+
+def test_counters_initialized_from_existing_roster(store):
+    # 카운터 도입 전에 만든 길드: 처음 저장할 때 명단을 한 번 세서 초기화
+    store.create_guild('old', {'name': "예전 길드"})
+    store._put('guilds/old/members', 'm1', {'name': "a", 'role': '길드장', 'cp': 10})
+    store._put('guilds/old/members', 'm2', {'name': "b", 'role': None, 'cp': 20})
+    store.write_members('old', upserts=[(None, {'name': "c", 'role': '길드장', 'cp': 5})],
+                        role_limits={'길드장': 2})
+    guild = store.get_guild('old')
+    assert guild['role_counts'] == {'길드장': 2}
+    assert (guild['cp_total'], guild['member_count']) == (35, 3)
+    with pytest.raises(RoleQuotaExceeded):
+        store.write_members('old', upserts=[(None, {'name': "d", 'role': '길드장', 'cp': 1})],
+                            role_limits={'길드장': 2})
+
+
+# --- 일일 기록 ---
+def test_save_daily_merges_cells(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3, 'sage_dmg': 1.5}}, ROLLUPS)
+    store.save_daily('g', DAY, {'m1': {'don_inter': 2}, 'm2': {'don_item': 1}}, ROLLUPS)
+    assert store.get_daily('g', DAY) == {
+        'm1': {'don_basic': 3, 'sage_dmg': 1.5, 'don_inter': 2},
+        'm2': {'don_item': 1},
+    }
+
+
+def test_save_daily_skips_conflicting_cells(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3, 'don_inter': 1}}, ROLLUPS)
+    base = {'m1': {'don_basic': 3, 'don_inter': 1}}
+    # 다른 운영진이 그 사이 don_basic을 고침
+    store.save_daily('g', DAY, {'m1': {'don_basic': 5}}, ROLLUPS, base={'m1': {'don_basic': 3}})
+
+    conflicts = store.save_daily('g', DAY, {'m1': {'don_basic': 4, 'don_inter': 2}}, ROLLUPS, base=base)
+    assert conflicts == {'m1': {'don_basic': 5}}
+    assert store.get_daily('g', DAY) == {'m1': {'don_basic': 5, 'don_inter': 2}}
+
+
+def test_save_daily_same_value_is_not_a_conflict(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+    store.save_daily('g', DAY, {'m1': {'don_basic': 5}}, ROLLUPS, base={'m1': {'don_basic': 3}})
+    assert store.save_daily('g', DAY, {'m1': {'don_basic': 5}}, ROLLUPS, base={'m1': {'don_basic': 3}}) == {}
+
+
+def test_rollups_add_only_deltas(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3, 'sage_dmg': 1.5}}, ROLLUPS)
+    # 같은 날짜를 다시 저장해도 중복 합산하지 않음
+    store.save_daily('g', DAY, {'m1': {'don_basic': 4}}, ROLLUPS)
+    store.save_daily('g', '2024-03-06', {'m1': {'don_basic': 2}, 'm2': {'sage_kill': 1}}, ROLLUPS)
+
+    rollups = dict(store.get_rollups('g', list(ROLLUPS)))
+    for doc_id, meta in ROLLUPS.items():
+        assert {k: rollups[doc_id][k] for k in meta} == meta
+        assert rollups[doc_id]['members'] == {
+            'm1': {'don_basic': 6, 'sage_dmg': 1.5},
+            'm2': {'sage_kill': 1},
+        }
+
+
+def test_conflicting_cells_do_not_touch_rollups(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+    store.save_daily('g', DAY, {'m1': {'don_basic': 5}}, ROLLUPS, base={'m1': {'don_basic': 3}})
+    store.save_daily('g', DAY, {'m1': {'don_basic': 9}}, ROLLUPS, base={'m1': {'don_basic': 3}})
+    rollup = dict(store.get_rollups('g', ['week_2024-W10']))['week_2024-W10']
+    assert rollup['members'] == {'m1': {'don_basic': 5}}
+
+
+# --- 다시 만들기 ---
+def test_replace_rollups_deletes_periods_without_data(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+    store.save_daily('g', '2023-12-01', {'m1': {'don_basic': 1}},
+                     {'month_2023-12': {'period': 'month', 'label': '2023-12', 'start': '2023-12-01'}})
+    rebuilt = {'week_2024-W10': dict(ROLLUPS['week_2024-W10'], members={'m1': {'don_basic': 3}})}
+
+    token = store.begin_rebuild('g', 'rollups')
+    assert store.replace_rollups('g', rebuilt, token)
+    assert dict(store.get_rollups('g', ['week_2024-W10', 'month_2024-03', 'month_2023-12'])) == rebuilt
+    guild = store.get_guild('g')
+    assert guild['rollups_built_at'] and not guild['rebuilding']
+
+
+def test_save_during_rebuild_rejects_stale_result(store):
+    token = store.begin_rebuild('g', 'rollups')
+    activity_token = store.begin_rebuild('g', 'activity')
+    # 다시 만들기가 기록을 다 읽은 뒤에 다른 운영진이 저장
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+
+    assert not store.replace_rollups('g', {}, token)
+    assert not store.replace_activity('g', {'built': True, 'members': {}}, activity_token)
+    assert len(store.get_rollups('g', list(ROLLUPS))) == 2
+    assert 'rollups_built_at' not in store.get_guild('g')
+    assert store.get_activity('g').get('members')
+
+
+def test_save_without_changes_keeps_rebuild(store):
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+    token = store.begin_rebuild('g', 'activity')
+    store.save_daily('g', DAY, {'m1': {'don_basic': 3}}, ROLLUPS)
+    state = {'built': True, 'members': {}}
+    assert store.replace_activity('g', state, token)
+    assert store.get_activity('g') == state